@@ -1,2 +1,9 @@
 from src.api.fees import get_fees
-from src.api.electrum import electrum_request, parse_electrum_url, ElectrumMethod
+from src.api.electrum import (
+    electrum_request,
+    electrum_batch_request,
+    electrum_raw_batch_request,
+    electrum_scripthash_batch_request,
+    parse_electrum_url,
+    ElectrumMethod,
+)
@@ -1,14 +1,23 @@
 from enum import Enum
-from typing import List, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal
 from dataclasses import dataclass
 from bitcoinlib.transactions import Transaction
 import structlog
-import json
 import socket
 import asyncio
 
+from src.api.electrum_client import ElectrumRequestError
+from src.api.electrum_limiter import get_concurrency_limiter
+from src.api.electrum_pool import get_connection_pool
+
 LOGGER = structlog.get_logger()
 
+# how many requests to send in a single json-rpc batch
+DEFAULT_BATCH_CHUNK_SIZE = 50
+# scripthash requests and most of their responses are small,
+# therefore many more of them fit in a single batch.
+DEFAULT_SCRIPTHASH_BATCH_CHUNK_SIZE = 250
+
 
 def parse_electrum_url(electrum_url: str) -> tuple[Optional[str], Optional[str]]:
     try:
@@ -22,6 +31,9 @@ def parse_electrum_url(electrum_url: str) -> tuple[Optional[str], Optional[str]]
 
 class ElectrumMethod(Enum):
     GET_TRANSACTIONS = "blockchain.transaction.get"
+    GET_SCRIPTHASH_HISTORY = "blockchain.scripthash.get_history"
+    SUBSCRIBE_SCRIPTHASH = "blockchain.scripthash.subscribe"
+    SUBSCRIBE_HEADERS = "blockchain.headers.subscribe"
 
 
 @dataclass
@@ -51,60 +63,226 @@ async def electrum_request(
     port: int,
     electrum_method: ElectrumMethod,
     params: Optional[ALL_UTXOS_REQUEST_PARAMS],
-    request_id: Optional[int] = 1,
+    timeout: Optional[float] = None,
 ) -> ElectrumResponse:
-    writer = None
+    """Send a single request over a shared, multiplexed electrum connection.
+
+    The json-rpc id is assigned by the client and is used to route
+    the response back to this caller.
+    """
     try:
-        # Use asyncio to manage the socket connection
-        reader, writer = await asyncio.open_connection(url, port)
-
-        request = json.dumps(
-            {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "method": electrum_method.value,
-                "params": params.create_params_list() if params else [],
-            }
+        client = await get_connection_pool(url, port).get_client()
+        LOGGER.info(
+            f"Sending electrum request: {electrum_method.value} {params}")
+        result = await client.request(
+            electrum_method.value,
+            params.create_params_list() if params else [],
+            timeout=timeout,
         )
 
-        LOGGER.info(f"Sending electrum request: {request}")
-        writer.write((request + "\n").encode("utf-8"))
-        await writer.drain()
-
-        # Read the response asynchronously
-        response = b""
-        while True:
-            part = await reader.read(4096)
-            response += part
-            if len(part) < 4096:
-                break
-
-        # Decode and parse the JSON response
-        raw_response_data = json.loads(response.decode("utf-8").strip())
-
-        # Assuming handle_raw_electrum_response is an existing function
-        response_data = handle_raw_electrum_response(
-            electrum_method, raw_response_data)
+        response_data = handle_electrum_result(electrum_method, result)
         return ElectrumResponse(status="success", data=response_data)
+    except asyncio.TimeoutError:
+        LOGGER.error(f"Electrum request timed out: {electrum_method.value}")
+        return ElectrumResponse(status="error", data=None)
     except socket.error as e:
         LOGGER.error(f"Socket error: {e}")
         return ElectrumResponse(status="error", data=None)
-    except json.JSONDecodeError as e:
-        LOGGER.error(f"JSON decode error: {e}")
-        return ElectrumResponse(status="error", data=None)
     except Exception as e:
         LOGGER.error(f"An error occurred: {e}")
         return ElectrumResponse(status="error", data=None)
-    finally:
-        # Close the writer/reader
-        if writer:
-            writer.close()
-            await writer.wait_closed()
 
 
-def handle_raw_electrum_response(
-    electrum_method: ElectrumMethod, raw_response: dict
+async def electrum_batch_request(
+    url: str,
+    port: int,
+    params_list: List[GetTransactionsRequestParams],
+    chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE,
+    timeout: Optional[float] = None,
+) -> Dict[str, GetTransactionsResponse]:
+    """Get many transactions using json-rpc batches of chunk_size requests.
+
+    The successfully fetched and parsed transactions are returned keyed by their txid,
+    any transaction that could not be fetched is left out of the result.
+    """
+    raw_transactions = await electrum_raw_batch_request(
+        url, port, params_list, chunk_size, timeout
+    )
+
+    results: Dict[str, GetTransactionsResponse] = {}
+    for txid, raw_transaction in raw_transactions.items():
+        try:
+            results[txid] = handle_electrum_result(
+                ElectrumMethod.GET_TRANSACTIONS, raw_transaction
+            )
+        except Exception as e:
+            LOGGER.error(f"Error parsing electrum batch response {txid}: {e}")
+    return results
+
+
+async def electrum_raw_batch_request(
+    url: str,
+    port: int,
+    params_list: List[GetTransactionsRequestParams],
+    chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE,
+    timeout: Optional[float] = None,
+) -> Dict[str, bytes]:
+    """Get many raw transactions using json-rpc batches of chunk_size requests,
+    leaving the parsing to the caller.
+
+    The chunks are pipelined over the pooled, multiplexed connections,
+    the number of chunks in flight is limited by the server's adaptive
+    concurrency limiter.
+
+    The successfully fetched raw transactions are returned keyed by their txid,
+    any transaction that could not be fetched is left out of the result.
+    """
+    unique_params = list({params.txid: params for params in params_list}.values())
+    chunks = [
+        unique_params[chunk_start: chunk_start + chunk_size]
+        for chunk_start in range(0, len(unique_params), chunk_size)
+    ]
+
+    results: Dict[str, bytes] = {}
+    await asyncio.gather(
+        *[
+            _electrum_batch_request_chunk(url, port, chunk, results, timeout)
+            for chunk in chunks
+        ]
+    )
+
+    if len(results) != len(unique_params):
+        LOGGER.error(
+            "Not all transactions in the electrum batch request were fetched",
+            requested=len(unique_params),
+            fetched=len(results),
+        )
+    LOGGER.info(
+        "Electrum batch request finished",
+        requested=len(unique_params),
+        fetched=len(results),
+        **get_concurrency_limiter(url, port).stats(),
+    )
+    return results
+
+
+async def _electrum_batch_request_chunk(
+    url: str,
+    port: int,
+    chunk: List[GetTransactionsRequestParams],
+    results: Dict[str, bytes],
+    timeout: Optional[float],
+) -> None:
+    electrum_method = ElectrumMethod.GET_TRANSACTIONS
+    try:
+        client = await get_connection_pool(url, port).get_client()
+        LOGGER.info(f"Sending electrum batch request of {len(chunk)} requests")
+        batch_results = await client.batch_request(
+            [(electrum_method.value, params.create_params_list()) for params in chunk],
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        LOGGER.error(f"Electrum batch request of {len(chunk)} requests timed out")
+        return
+    except socket.error as e:
+        LOGGER.error(f"Socket error: {e}")
+        return
+    except Exception as e:
+        LOGGER.error(f"An error occurred: {e}")
+        return
+
+    for params, result in zip(chunk, batch_results):
+        if isinstance(result, ElectrumRequestError):
+            LOGGER.error(f"Electrum batch request error for {params.txid}: {result}")
+            continue
+        try:
+            results[params.txid] = bytes.fromhex(result)
+        except (TypeError, ValueError) as e:
+            LOGGER.error(f"Invalid electrum batch response {params.txid}: {e}")
+
+
+async def electrum_scripthash_batch_request(
+    url: str,
+    port: int,
+    electrum_method: ElectrumMethod,
+    scripthashes: List[str],
+    chunk_size: int = DEFAULT_SCRIPTHASH_BATCH_CHUNK_SIZE,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Send an electrum_method request for every scripthash,
+    using json-rpc batches of chunk_size requests.
+
+    The chunks are pipelined over the pooled connections the same way
+    as electrum_raw_batch_request's are.
+
+    The results are returned keyed by their scripthash, any scripthash
+    whose request failed is left out of the result.
+    """
+    unique_scripthashes = list(dict.fromkeys(scripthashes))
+    chunks = [
+        unique_scripthashes[chunk_start: chunk_start + chunk_size]
+        for chunk_start in range(0, len(unique_scripthashes), chunk_size)
+    ]
+
+    results: Dict[str, Any] = {}
+    await asyncio.gather(
+        *[
+            _electrum_scripthash_batch_request_chunk(
+                url, port, electrum_method, chunk, results, timeout
+            )
+            for chunk in chunks
+        ]
+    )
+
+    if len(results) != len(unique_scripthashes):
+        LOGGER.error(
+            "Not all scripthashes in the electrum batch request were fetched",
+            method=electrum_method.value,
+            requested=len(unique_scripthashes),
+            fetched=len(results),
+        )
+    return results
+
+
+async def _electrum_scripthash_batch_request_chunk(
+    url: str,
+    port: int,
+    electrum_method: ElectrumMethod,
+    chunk: List[str],
+    results: Dict[str, Any],
+    timeout: Optional[float],
+) -> None:
+    try:
+        client = await get_connection_pool(url, port).get_client()
+        LOGGER.info(
+            f"Sending electrum batch request of {len(chunk)} {electrum_method.value} requests"
+        )
+        batch_results = await client.batch_request(
+            [(electrum_method.value, [scripthash]) for scripthash in chunk],
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        LOGGER.error(f"Electrum batch request of {len(chunk)} requests timed out")
+        return
+    except socket.error as e:
+        LOGGER.error(f"Socket error: {e}")
+        return
+    except Exception as e:
+        LOGGER.error(f"An error occurred: {e}")
+        return
+
+    for scripthash, result in zip(chunk, batch_results):
+        if isinstance(result, ElectrumRequestError):
+            LOGGER.error(
+                f"Electrum batch request error for scripthash {scripthash}: {result}"
+            )
+            continue
+        results[scripthash] = result
+
+
+def handle_electrum_result(
+    electrum_method: ElectrumMethod, result: Any
 ) -> ElectrumDataResponses:
     if electrum_method == ElectrumMethod.GET_TRANSACTIONS:
-        transaction = Transaction.parse(raw_response["result"], strict=True)
+        transaction = Transaction.parse(result, strict=True)
         return transaction
@@ -0,0 +1,299 @@
+from contextlib import nullcontext
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import time
+
+import structlog
+
+from src.api.electrum_frame_reader import DEFAULT_MAX_FRAME_SIZE, ElectrumFrameReader
+from src.api.electrum_limiter import AdaptiveConcurrencyLimiter
+
+LOGGER = structlog.get_logger()
+
+DEFAULT_MAX_INFLIGHT = 50
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 30.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 10.0
+
+ElectrumNotificationHandler = Callable[[str, List[Any]], None]
+
+
+class ElectrumRequestError(Exception):
+    """The electrum server responded to a request with an error."""
+
+    def __init__(self, error: Any):
+        super().__init__(f"Electrum request error: {error}")
+        self.error = error
+
+
+class ElectrumConnectionClosedError(ConnectionError):
+    """The connection to the electrum server was closed while requests were in flight."""
+
+
+class ElectrumClient:
+    """An electrum json-rpc client that multiplexes many requests over a single socket.
+
+    Requests are written as soon as there is room in the max_inflight window
+    and the responses are routed back to the waiting caller by their json-rpc id,
+    therefore the responses can come back in any order.
+
+    Messages from the server without an id (subscription notifications) are
+    passed to the notification_handler if one is set.
+
+    If a limiter is given, every message that is written must also fit under
+    the limiter's adaptive concurrency limit, which is usually shared by every
+    connection to the same server. A batch counts as each of its requests.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        port: int,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT_SECONDS,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT_SECONDS,
+        notification_handler: Optional[ElectrumNotificationHandler] = None,
+        max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ):
+        if max_inflight < 1:
+            raise ValueError("max_inflight must be at least 1")
+
+        self.url = url
+        self.port = port
+        self.max_inflight = max_inflight
+        self.request_timeout = request_timeout
+        self.connect_timeout = connect_timeout
+        self.notification_handler = notification_handler
+        self.max_frame_size = max_frame_size
+        self.limiter = limiter
+        self.last_used_at = time.monotonic()
+
+        self._request_ids = count()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._inflight_window: Optional[asyncio.Semaphore] = None
+        self._inflight_count = 0
+        self._frame_reader: Optional[ElectrumFrameReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+
+    @property
+    def inflight_count(self) -> int:
+        return self._inflight_count
+
+    @property
+    def has_free_inflight_slot(self) -> bool:
+        return self._inflight_count < self.max_inflight
+
+    def is_healthy(self) -> bool:
+        return (
+            self._writer is not None
+            and not self._writer.is_closing()
+            and self._read_task is not None
+            and not self._read_task.done()
+        )
+
+    async def connect(self) -> None:
+        reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.url, self.port), self.connect_timeout
+        )
+        self._frame_reader = ElectrumFrameReader(reader, self.max_frame_size)
+        self._inflight_window = asyncio.Semaphore(self.max_inflight)
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    async def request(
+        self, method: str, params: List[Any], timeout: Optional[float] = None
+    ) -> Any:
+        """Send a single request and return its result.
+
+        Raise an ElectrumRequestError if the server responds with an error
+        and an asyncio.TimeoutError if no response arrives within the timeout.
+        """
+        request_id, future = self._register_request()
+        message = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": method,
+            "params": params,
+        }
+        (result,) = await self._send([request_id], [future], message, timeout)
+        if isinstance(result, ElectrumRequestError):
+            raise result
+        return result
+
+    async def batch_request(
+        self, requests: List[Tuple[str, List[Any]]], timeout: Optional[float] = None
+    ) -> List[Any]:
+        """Send (method, params) requests as a single json-rpc batch.
+
+        The results are returned in the same order as the requests,
+        a request the server responded to with an error has an
+        ElectrumRequestError in place of its result.
+        A batch takes up a single slot of the inflight window.
+        """
+        if len(requests) == 0:
+            return []
+
+        request_ids: List[int] = []
+        futures: List[asyncio.Future] = []
+        messages = []
+        for method, params in requests:
+            request_id, future = self._register_request()
+            request_ids.append(request_id)
+            futures.append(future)
+            messages.append(
+                {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "method": method,
+                    "params": params,
+                }
+            )
+
+        return await self._send(request_ids, futures, messages, timeout)
+
+    async def close(self) -> None:
+        if self._read_task is not None:
+            self._read_task.cancel()
+        if self._writer is not None:
+            try:
+                self._writer.close()
+                await self._writer.wait_closed()
+            except (ConnectionError, RuntimeError):
+                pass
+        self._fail_pending(ElectrumConnectionClosedError("Electrum client closed"))
+
+    def abort(self) -> None:
+        """Close the socket without waiting, safe to call after the event loop has closed."""
+        try:
+            if self._read_task is not None:
+                self._read_task.cancel()
+            if self._writer is not None:
+                self._writer.close()
+        except RuntimeError:
+            # the event loop the connection was opened on has already been closed
+            pass
+
+    def _register_request(self) -> Tuple[int, asyncio.Future]:
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        return request_id, future
+
+    async def _send(
+        self,
+        request_ids: List[int],
+        futures: List[asyncio.Future],
+        message: Any,
+        timeout: Optional[float],
+    ) -> List[Any]:
+        if self._writer is None or self._inflight_window is None:
+            raise ElectrumConnectionClosedError("Electrum client is not connected")
+
+        timeout = self.request_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        # the timeout covers waiting for room to send the request as well
+        deadline = loop.time() + timeout
+        self.last_used_at = time.monotonic()
+        self._inflight_count += 1
+        try:
+            await asyncio.wait_for(
+                self._inflight_window.acquire(), deadline - loop.time()
+            )
+            try:
+                if not self.is_healthy():
+                    raise ElectrumConnectionClosedError(
+                        "Electrum connection is closed"
+                    )
+                # only wait for the limiter once the request can be written,
+                # so that it only times requests the server is working on,
+                # and a request that timed out waiting here does not count as
+                # a failure of the server.
+                limiter_slot = (
+                    self.limiter.acquire(
+                        deadline - loop.time(), weight=len(request_ids)
+                    )
+                    if self.limiter
+                    else nullcontext()
+                )
+                async with limiter_slot as slot:
+                    self._writer.write((json.dumps(message) + "\n").encode("utf-8"))
+                    await self._writer.drain()
+                    results = await asyncio.wait_for(
+                        asyncio.gather(*futures), deadline - loop.time()
+                    )
+                    if slot is not None and any(
+                        isinstance(result, ElectrumRequestError) for result in results
+                    ):
+                        slot.fail()
+                    return results
+            finally:
+                self._inflight_window.release()
+        finally:
+            self._inflight_count -= 1
+            self.last_used_at = time.monotonic()
+            # forget any requests that were not answered (timeout or error)
+            # so that a late response is ignored.
+            for request_id in request_ids:
+                self._pending.pop(request_id, None)
+
+    async def _read_loop(self) -> None:
+        assert self._frame_reader is not None
+        try:
+            while True:
+                frame = await self._frame_reader.read_frame()
+                if frame is None:
+                    raise ElectrumConnectionClosedError(
+                        "Electrum server closed the connection"
+                    )
+                if frame.strip() == b"":
+                    continue
+                # json.loads decodes the utf-8 bytes directly
+                self._handle_message(json.loads(frame))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOGGER.error(
+                "Electrum connection failed", url=self.url, port=self.port, error=e
+            )
+            self._fail_pending(
+                e
+                if isinstance(e, ConnectionError)
+                else ElectrumConnectionClosedError(str(e))
+            )
+            if self._writer is not None:
+                self._writer.close()
+
+    def _handle_message(self, message: Any) -> None:
+        if isinstance(message, list):
+            for item in message:
+                self._handle_message(item)
+            return
+
+        if not isinstance(message, dict):
+            LOGGER.error(f"Unexpected electrum message: {message}")
+            return
+
+        request_id = message.get("id")
+        if request_id is None:
+            if message.get("method") and self.notification_handler is not None:
+                self.notification_handler(message["method"], message.get("params", []))
+            return
+
+        future = self._pending.pop(request_id, None)
+        if future is None or future.done():
+            # the request already timed out
+            return
+
+        if message.get("error") is not None:
+            future.set_result(ElectrumRequestError(message["error"]))
+        else:
+            future.set_result(message.get("result"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        pending = self._pending
+        self._pending = {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,66 @@
+from typing import Optional
+import asyncio
+
+# large coinjoin transactions (and batches of them) can be several megabytes
+DEFAULT_MAX_FRAME_SIZE = 32 * 1024 * 1024
+DEFAULT_READ_SIZE = 64 * 1024
+
+
+class ElectrumFrameTooLargeError(Exception):
+    """A message from the electrum server was larger than the max frame size."""
+
+
+class ElectrumFrameTruncatedError(ConnectionError):
+    """The electrum server closed the connection part way through a message."""
+
+
+class ElectrumFrameReader:
+    """Read the newline terminated messages (frames) sent by an electrum server.
+
+    Incoming data is appended to a single growing buffer and only the newly
+    read bytes are scanned for the newline, so reading a frame of n bytes
+    is O(n) no matter how many reads it arrives in.
+    A frame is only returned once its terminating newline has arrived,
+    therefore a slow connection can never produce a truncated message.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+        read_size: int = DEFAULT_READ_SIZE,
+    ):
+        self.reader = reader
+        self.max_frame_size = max_frame_size
+        self.read_size = read_size
+        self._buffer = bytearray()
+        # everything before this index has already been checked for a newline
+        self._scanned_up_to = 0
+
+    async def read_frame(self) -> Optional[bytes]:
+        """Read the next frame without its terminating newline.
+
+        Return None if the connection was closed cleanly between frames.
+        """
+        while True:
+            newline_index = self._buffer.find(b"\n", self._scanned_up_to)
+            if newline_index != -1:
+                frame = bytes(self._buffer[:newline_index])
+                del self._buffer[: newline_index + 1]
+                self._scanned_up_to = 0
+                return frame
+
+            self._scanned_up_to = len(self._buffer)
+            if self._scanned_up_to > self.max_frame_size:
+                raise ElectrumFrameTooLargeError(
+                    f"Electrum message is larger than {self.max_frame_size} bytes"
+                )
+
+            chunk = await self.reader.read(self.read_size)
+            if not chunk:
+                if self._buffer.strip():
+                    raise ElectrumFrameTruncatedError(
+                        "Electrum connection closed part way through a message"
+                    )
+                return None
+            self._buffer.extend(chunk)
@@ -0,0 +1,224 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+from weakref import WeakKeyDictionary
+import asyncio
+import time
+
+import structlog
+
+LOGGER = structlog.get_logger()
+
+# the limits count requests, a json-rpc batch counts as each of its requests,
+# therefore the initial limit lets a full batch through.
+DEFAULT_INITIAL_LIMIT = 50
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 2000
+# a response slower than this is treated as a sign the server is overloaded
+DEFAULT_LATENCY_TARGET_SECONDS = 5.0
+DEFAULT_DECREASE_FACTOR = 0.5
+
+
+@dataclass
+class _LoopSlots:
+    """The requests of a single event loop that are in flight or waiting."""
+
+    inflight: int = 0
+    waiters: Deque[asyncio.Future] = field(default_factory=deque)
+
+
+@dataclass
+class LimiterSlot:
+    """The room a request took under the limit,
+    see AdaptiveConcurrencyLimiter.acquire."""
+
+    started_at: float
+    is_failed: bool = False
+
+    def fail(self) -> None:
+        """Count the request as failed without raising,
+        for example when the server answered it with an error."""
+        self.is_failed = True
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limit how many requests are in flight to an electrum server using AIMD
+    (additive increase, multiplicative decrease).
+
+    Every request that succeeds within the latency target grows the limit by
+    1 / limit, so the limit grows by about one for each full window of healthy
+    requests. A json-rpc batch takes, and counts as, one request for each of
+    the requests in it, though a batch that is larger than the limit is still
+    sent on its own. A failed request (error, timeout or dropped connection) or
+    a response slower than the latency target cuts the limit by the
+    decrease factor. Only one cut is made per window, the requests that were
+    already in flight when the limit was cut do not cut it again.
+
+    This lets the concurrency settle at what each server can actually sustain,
+    a self hosted server can run many requests in parallel while a public
+    server that rate limits quickly pushes the limit back down.
+
+    The learned limit is shared, but the requests of each event loop are
+    limited separately, since a waiting request can only be woken up
+    from its own event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = DEFAULT_INITIAL_LIMIT,
+        min_limit: int = DEFAULT_MIN_LIMIT,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+        latency_target_seconds: float = DEFAULT_LATENCY_TARGET_SECONDS,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+    ):
+        if not min_limit <= initial_limit <= max_limit:
+            raise ValueError("initial_limit must be between min_limit and max_limit")
+
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target_seconds = latency_target_seconds
+        self.decrease_factor = decrease_factor
+
+        self._limit = float(initial_limit)
+        self._successes = 0
+        self._failures = 0
+        # requests started before this time do not cut the limit again
+        self._last_decrease_at = 0.0
+        self._loop_slots: WeakKeyDictionary[
+            asyncio.AbstractEventLoop, _LoopSlots
+        ] = WeakKeyDictionary()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        """The number of requests in flight, of every event loop."""
+        return sum(slots.inflight for slots in list(self._loop_slots.values()))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "inflight": self.inflight,
+            "successes": self._successes,
+            "failures": self._failures,
+        }
+
+    @asynccontextmanager
+    async def acquire(
+        self, timeout: Optional[float] = None, weight: int = 1
+    ) -> AsyncIterator[LimiterSlot]:
+        """Wait for room for weight requests under the current limit,
+        then time them.
+
+        Raise an asyncio.TimeoutError if there is no room within the timeout.
+        An exception raised inside the context, or a slot marked as failed,
+        counts as a failed request."""
+        slots = self._get_loop_slots()
+        await self._wait_for_slot(slots, timeout, weight)
+        slot = LimiterSlot(started_at=time.monotonic())
+        try:
+            yield slot
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                self.record_failure(slot.started_at, weight)
+            raise
+        else:
+            if slot.is_failed:
+                self.record_failure(slot.started_at, weight)
+            else:
+                self.record_success(
+                    slot.started_at, time.monotonic() - slot.started_at, weight
+                )
+        finally:
+            slots.inflight -= weight
+            self._wake_waiters(slots)
+
+    def record_success(
+        self, started_at: float, latency: float, weight: int = 1
+    ) -> None:
+        self._successes += weight
+        if latency > self.latency_target_seconds:
+            self._decrease(started_at, reason="slow response", latency=latency)
+            return
+
+        previous_limit = self.limit
+        self._limit = min(self.max_limit, self._limit + weight / self._limit)
+        if self.limit != previous_limit:
+            LOGGER.info(
+                "Electrum concurrency limit increased",
+                server=self.name,
+                limit=self.limit,
+            )
+
+    def record_failure(self, started_at: float, weight: int = 1) -> None:
+        self._failures += weight
+        self._decrease(started_at, reason="failed request")
+
+    def _decrease(self, started_at: float, reason: str, **log_details) -> None:
+        if started_at < self._last_decrease_at:
+            # this request was already in flight when the limit was last cut
+            return
+        self._last_decrease_at = time.monotonic()
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        LOGGER.info(
+            "Electrum concurrency limit decreased",
+            server=self.name,
+            limit=self.limit,
+            reason=reason,
+            **log_details,
+        )
+
+    async def _wait_for_slot(
+        self, slots: _LoopSlots, timeout: Optional[float], weight: int
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        # a request larger than the limit waits until nothing else is in flight
+        while slots.inflight > 0 and slots.inflight + weight > self.limit:
+            waiter = loop.create_future()
+            slots.waiters.append(waiter)
+            try:
+                if deadline is None:
+                    await waiter
+                else:
+                    await asyncio.wait_for(waiter, deadline - loop.time())
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                if waiter in slots.waiters:
+                    slots.waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # this waiter was woken up for a free slot, pass it on
+                    self._wake_waiters(slots)
+                raise
+        slots.inflight += weight
+
+    def _wake_waiters(self, slots: _LoopSlots) -> None:
+        free_slots = self.limit - slots.inflight
+        while free_slots > 0 and slots.waiters:
+            waiter = slots.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free_slots -= 1
+
+    def _get_loop_slots(self) -> _LoopSlots:
+        return self._loop_slots.setdefault(asyncio.get_running_loop(), _LoopSlots())
+
+
+_concurrency_limiters: Dict[Tuple[str, int], AdaptiveConcurrencyLimiter] = {}
+
+
+def get_concurrency_limiter(url: str, port: int) -> AdaptiveConcurrencyLimiter:
+    """Get the shared concurrency limiter for an electrum server, creating it if needed.
+
+    The limiter outlives the connection pool so that the learned limit is kept
+    across requests."""
+    key = (url, int(port))
+    limiter = _concurrency_limiters.get(key)
+    if limiter is None:
+        limiter = AdaptiveConcurrencyLimiter(f"{url}:{port}")
+        _concurrency_limiters[key] = limiter
+    return limiter
@@ -0,0 +1,209 @@
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import time
+
+import structlog
+
+from src.api.electrum_client import ElectrumClient
+from src.api.electrum_limiter import get_concurrency_limiter
+
+LOGGER = structlog.get_logger()
+
+# every client multiplexes many requests over its socket, therefore
+# only open another socket once every client's inflight window is full.
+DEFAULT_MAX_POOL_SIZE = 2
+DEFAULT_IDLE_TIMEOUT_SECONDS = 60.0
+
+
+class ElectrumConnectionPool:
+    """A pool of long lived, multiplexed connections to a single electrum server.
+
+    get_client returns the least busy healthy client in the pool.
+    A new connection is only opened when every client's inflight window
+    is full and the pool has not reached max_size, so a burst of requests
+    (for example enriching every transaction in a wallet) is pipelined
+    over a handful of sockets instead of paying a handshake per request.
+    Idle clients are evicted once they have not been used for idle_timeout
+    seconds and unhealthy clients are dropped instead of being reused.
+
+    asyncio streams are bound to the event loop they were opened on,
+    therefore a pool is only used from the event loop it was first used on,
+    see get_connection_pool for a pool of each event loop.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        port: int,
+        max_size: int = DEFAULT_MAX_POOL_SIZE,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT_SECONDS,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.url = url
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        self._clients: List[ElectrumClient] = []
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._clients)
+
+    async def get_client(self) -> ElectrumClient:
+        """Get a connected client, opening a new connection if needed."""
+        connect_lock = self._bind_to_running_loop()
+        self.evict_idle_connections()
+
+        client = self._least_busy_client()
+        if client is not None and (
+            client.has_free_inflight_slot or self.size >= self.max_size
+        ):
+            return client
+
+        async with connect_lock:
+            # another caller may have opened a connection while we waited
+            client = self._least_busy_client()
+            if client is not None and (
+                client.has_free_inflight_slot or self.size >= self.max_size
+            ):
+                return client
+
+            LOGGER.info(
+                "Opening new electrum connection", url=self.url, port=self.port
+            )
+            client = ElectrumClient(
+                self.url,
+                self.port,
+                limiter=get_concurrency_limiter(self.url, self.port),
+            )
+            await client.connect()
+            self._clients.append(client)
+            return client
+
+    def evict_idle_connections(self) -> int:
+        """Close every client that has been idle for too long or is unhealthy.
+
+        Returns the number of clients that were evicted."""
+        kept: List[ElectrumClient] = []
+        evicted_count = 0
+        now = time.monotonic()
+        for client in self._clients:
+            is_idle_expired = (
+                client.inflight_count == 0
+                and now - client.last_used_at > self.idle_timeout
+            )
+            if client.is_healthy() and not is_idle_expired:
+                kept.append(client)
+            else:
+                client.abort()
+                evicted_count += 1
+
+        self._clients = kept
+        return evicted_count
+
+    def close(self) -> None:
+        """Close all of the connections in the pool."""
+        for client in self._clients:
+            client.abort()
+        self._clients = []
+
+    def _least_busy_client(self) -> Optional[ElectrumClient]:
+        healthy_clients = [client for client in self._clients if client.is_healthy()]
+        if len(healthy_clients) == 0:
+            return None
+        return min(healthy_clients, key=lambda client: client.inflight_count)
+
+    def _bind_to_running_loop(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+            self._connect_lock = asyncio.Lock()
+        elif self._loop is not loop:
+            raise RuntimeError(
+                "The electrum connection pool is bound to another event loop"
+            )
+        assert self._connect_lock is not None
+        return self._connect_lock
+
+    def close_from_any_thread(self) -> None:
+        """Close the pool from outside of its event loop, on its event loop
+        if it is still running, since its connections belong to it."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            self.close()
+            return
+        try:
+            is_own_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            is_own_loop = False
+        if is_own_loop:
+            self.close()
+            return
+        try:
+            loop.call_soon_threadsafe(self.close)
+        except RuntimeError:
+            # the event loop closed in the meantime
+            self.close()
+
+
+# every event loop has pools of its own, since each asyncio.run call
+# (a request, a wallet scan in the sync thread) runs a loop of its own.
+_connection_pools: Dict[
+    Tuple[asyncio.AbstractEventLoop, str, int], ElectrumConnectionPool
+] = {}
+# the task of each event loop with pools that closes them, see _close_pools_on_exit
+_pool_closers: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+_connection_pools_lock = Lock()
+
+
+async def _close_pools_on_exit(loop: asyncio.AbstractEventLoop) -> None:
+    """Close the pools of the event loop once it is done.
+
+    asyncio.run cancels the tasks that are left when its coroutine returns,
+    while the loop is still running, therefore the connections of a request's
+    loop are closed before asyncio.run returns instead of leaking their sockets
+    once the loop is closed."""
+    try:
+        await loop.create_future()
+    finally:
+        with _connection_pools_lock:
+            loop_keys = [key for key in _connection_pools if key[0] is loop]
+            pools = [_connection_pools.pop(key) for key in loop_keys]
+            _pool_closers.pop(loop, None)
+        for pool in pools:
+            pool.close()
+
+
+def get_connection_pool(
+    url: str, port: int, max_size: int = DEFAULT_MAX_POOL_SIZE
+) -> ElectrumConnectionPool:
+    """Get the connection pool of the running event loop for an electrum server,
+    creating it if needed.
+
+    The pools of an event loop are closed and forgotten when asyncio.run
+    finishes with it, see _close_pools_on_exit."""
+    loop = asyncio.get_running_loop()
+    key = (loop, url, int(port))
+    with _connection_pools_lock:
+        pool = _connection_pools.get(key)
+        if pool is None:
+            pool = ElectrumConnectionPool(url, int(port), max_size=max_size)
+            _connection_pools[key] = pool
+        if loop not in _pool_closers:
+            _pool_closers[loop] = loop.create_task(_close_pools_on_exit(loop))
+    return pool
+
+
+def close_connection_pools() -> None:
+    """Close and forget every electrum connection pool, of every event loop."""
+    with _connection_pools_lock:
+        pools = list(_connection_pools.values())
+        _connection_pools.clear()
+    for pool in pools:
+        pool.close_from_any_thread()
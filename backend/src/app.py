@@ -1,6 +1,15 @@
 from flask import Flask, request
 from flask_cors import CORS
-from src.database import DB, populate_labels, populate_privacy_metrics
+from src.database import (
+    DB,
+    get_database_uri,
+    init_database,
+    optimize_database,
+    populate_labels,
+    populate_privacy_metrics,
+    set_current_wallet_id,
+)
+from src.utils.app_data import is_testing_environment
 
 # initialize structlog
 from src.utils import logging  # noqa: F401, E261
@@ -90,17 +99,33 @@ def create_app(*args, **kwargs) -> Flask:
 
 
 def setup_database(app):
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///global_data_store.db"
+    from src.migrations import migrate_database
+    from src.models.hardware_wallet import HardwareWallet
+    from src.models.wallet import Wallet
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = get_database_uri()
     # Disable modification tracking
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    DB.init_app(app)
+    init_database(app)
     with app.app_context():
-        # Drop all existing tables
-        DB.drop_all()  # Clear the database, incase anything was left over.
+        if is_testing_environment():
+            # every test run starts from an empty db
+            DB.drop_all()
 
-        DB.create_all()
+        # the db is kept between restarts, so that everything already
+        # computed for a wallet is reused, therefore only upgrade its schema.
+        migrate_database()
         populate_labels()
         populate_privacy_metrics()
+        optimize_database()
+
+        # the connected hardware wallets are only known to the previous run,
+        # whose passphrase encryption key is gone.
+        DB.session.query(HardwareWallet).delete()
+        DB.session.commit()
+
+        current_wallet = Wallet.get_current_wallet()
+        set_current_wallet_id(current_wallet.id if current_wallet else None)
 
 
 # for some reason the frontend doesn't run the executable with app.y being __main__
@@ -5,7 +5,6 @@ from src.services import WalletService
 from dependency_injector.wiring import inject, Provide
 from src.containers.service_container import ServiceContainer
 import structlog
-import asyncio
 
 from src.my_types import (
     GetAllTransactionsResponseDto,
@@ -36,21 +35,9 @@ def get_txos(
     Get all transactions in the wallet.
     """
     try:
-        transactions = asyncio.run(wallet_service.get_all_transactions())
-        transactions_dtos = []
-        for transaction_tuple in transactions:
-            transaction, transaction_details = transaction_tuple
-            dict_dto = transaction.as_dict()
-            dict_dto["user_spent_amount"] = transaction_details.sent
-            dict_dto["user_received_amount"] = transaction_details.received
-            total = round(transaction_details.received -
-                          transaction_details.sent, 8)
-            dict_dto["user_total_amount"] = total
-            transactions_dtos.append(dict_dto)
-
-        return GetAllTransactionsResponseDto.model_validate(
-            dict(transactions=transactions_dtos)
-        ).model_dump()
+        transactions = wallet_service.get_all_transaction_details()
+
+        return GetAllTransactionsResponseDto(transactions=transactions).model_dump()
 
     except Exception as e:
         LOGGER.error("error getting txos", error=e)
@@ -68,9 +55,7 @@ def get_outputs(
     try:
         outputs = wallet_service.get_all_outputs()
 
-        return GetAllOutputsResponseDto.model_validate(
-            dict(outputs=[output.as_dict() for output in outputs])
-        ).model_dump()
+        return GetAllOutputsResponseDto(outputs=outputs).model_dump()
 
     except Exception as e:
         LOGGER.error("error getting outputs", error=e)
@@ -1,7 +1,8 @@
 from typing import Annotated, Optional
 from bdkpython import bdk
 from bitcoinlib.transactions import functools
-from flask import Blueprint, request
+from flask import Blueprint, Response, request
+import json
 from time import sleep
 
 from dependency_injector.wiring import inject, Provide
@@ -10,6 +11,8 @@ import structlog
 from src.testbridge.ngiri import mine_a_block_to_miner, randomly_fund_mock_wallet
 from src.my_types import ScriptType
 from src.services import WalletService
+from src.services.wallet.wallet_events import WalletEvent
+from src.services.wallet.wallet_sync import WalletSyncJob
 from src.containers.service_container import ServiceContainer
 
 from pydantic import BaseModel, ValidationError, field_validator
@@ -33,6 +36,10 @@ wallet_api = Blueprint("wallet", __name__, url_prefix="/wallet")
 
 LOGGER = structlog.get_logger()
 
+# the server handles one request at a time, therefore an event stream is
+# closed right away, after which the client reconnects, see get_wallet_events.
+WALLET_EVENTS_RETRY_MILLISECONDS = 5000
+
 
 class CreateWalletRequestDto(BaseModel):
     descriptor: str
@@ -40,6 +47,10 @@ class CreateWalletRequestDto(BaseModel):
     network: Annotated[bdk.Network, str]
     electrumUrl: str
     gapLimit: Optional[int] = None
+    # skip the wallet's history before this block height
+    birthdayHeight: Optional[int] = None
+    # scan the wallet in large electrum batches, for large or long lived wallets
+    fastImport: bool = False
 
     @field_validator("network", mode="before")
     def parse_enum(cls, value) -> Optional[bdk.Network]:
@@ -67,6 +78,23 @@ class DeleteWalletResponseDto(BaseModel):
     message: str
 
 
+class WalletSyncJobDto(BaseModel):
+    id: int
+    state: str
+    progress: float
+    message: Optional[str] = None
+    error: Optional[str] = None
+    queuedAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+
+
+class WalletSyncResponseDto(BaseModel):
+    message: str
+    job: Optional[WalletSyncJobDto] = None
+    lastSyncedAt: Optional[float] = None
+
+
 class CreateSpendableWalletRequestDto(BaseModel):
     network: str
     type: ScriptType
@@ -97,9 +125,13 @@ def create_wallet():
             data.network,
             data.electrumUrl,
             data.gapLimit,
+            birthday_height=data.birthdayHeight,
+            fast_import=data.fastImport,
         )
 
-        WalletService()
+        # sync the new wallet in the background instead of blocking the request,
+        # GET /wallet/sync reports how far along it is.
+        WalletService.start_wallet_sync()
 
         return CreateWalletResponseDto(
             message="wallet created successfully",
@@ -124,8 +156,7 @@ def delete_wallet():
     Remove the current wallet data from the db and bdk wallet connection.
     """
     try:
-        WalletService.remove_global_wallet_and_details()
-        WalletService.remove_output_and_related_label_data()
+        WalletService.remove_wallet()
 
         return DeleteWalletResponseDto(
             message="wallet and related data successfully deleted",
@@ -140,6 +171,98 @@ def delete_wallet():
         )
 
 
+def to_wallet_sync_job_dto(job: Optional[WalletSyncJob]) -> Optional[WalletSyncJobDto]:
+    if job is None:
+        return None
+    return WalletSyncJobDto(
+        id=job.id,
+        state=job.state,
+        progress=job.progress,
+        message=job.message,
+        error=job.error,
+        queuedAt=job.queued_at,
+        startedAt=job.started_at,
+        finishedAt=job.finished_at,
+    )
+
+
+@wallet_api.route("/sync", methods=["GET"])
+def get_wallet_sync():
+    """
+    Get the status of the wallet's current, or else last, background sync.
+    """
+    return WalletSyncResponseDto(
+        message="Wallet sync status",
+        job=to_wallet_sync_job_dto(WalletService.get_wallet_sync_job()),
+        lastSyncedAt=WalletService.get_wallet_last_synced_at(),
+    ).model_dump()
+
+
+@wallet_api.route("/sync", methods=["POST"])
+def request_wallet_sync():
+    """
+    Sync the wallet in the background as soon as possible.
+    """
+    job = WalletService.request_wallet_sync()
+    if job is None:
+        return (
+            SimpleErrorResponse(message="No wallet to sync").model_dump(),
+            400,
+        )
+
+    return WalletSyncResponseDto(
+        message="Wallet sync requested",
+        job=to_wallet_sync_job_dto(job),
+        lastSyncedAt=WalletService.get_wallet_last_synced_at(),
+    ).model_dump()
+
+
+def to_server_sent_event(event: WalletEvent) -> str:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+
+@wallet_api.route("/events", methods=["GET"])
+def get_wallet_events():
+    """
+    Stream the wallet's change events as server-sent events,
+    wallet_synced once the wallet's transactions or utxos changed
+    and new_block once the electrum server sees a new block,
+    so that clients only refetch the wallet when it actually changed.
+
+    Since the server handles a single request at a time, the stream does not
+    wait for events, it is closed after the events that are already waiting
+    and the client reconnects WALLET_EVENTS_RETRY_MILLISECONDS later with the
+    Last-Event-ID of the last event it got, so no events are missed in between.
+    """
+    last_event_id = WalletService.get_last_wallet_event_id()
+    after_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    try:
+        after_id = int(after_id) if after_id is not None else None
+    except ValueError:
+        after_id = None
+
+    is_new_client = after_id is None or after_id > last_event_id
+    if is_new_client:
+        # a new client (or one from before the server restarted) fetches
+        # the wallet anyway, therefore it only needs the events from now on.
+        after_id = last_event_id
+
+    def stream():
+        yield f"retry: {WALLET_EVENTS_RETRY_MILLISECONDS}\n\n"
+        if is_new_client:
+            # an id without data is not dispatched as an event,
+            # but it is sent back as the Last-Event-ID when reconnecting.
+            yield f"id: {after_id}\n\n"
+        for event in WalletService.get_wallet_events(after_id):
+            yield to_server_sent_event(event)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 @wallet_api.route("/type", methods=["GET"])
 @inject
 def get_wallet_type(
@@ -1,5 +1,18 @@
+from os import path
+from typing import Any, Dict, Optional
+import sqlite3
+
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import Column, Connection, String, event, text
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    ORMExecuteState,
+    Session,
+    with_loader_criteria,
+)
+
+from src.utils.app_data import get_app_data_dir, is_testing_environment
 
 
 class Base(DeclarativeBase):
@@ -8,6 +21,117 @@ class Base(DeclarativeBase):
 
 DB = SQLAlchemy()
 
+DATABASE_FILE_NAME = "global_data_store.db"
+
+# set on every new sqlite connection, see set_sqlite_pragmas
+SQLITE_PRAGMAS: Dict[str, Any] = {
+    # readers do not wait for the writer, and a commit only appends to the log
+    "journal_mode": "WAL",
+    # in WAL mode a commit is still safe if the app crashes,
+    # only an os crash or power loss can undo the latest commits.
+    "synchronous": "NORMAL",
+    # read the db through a 256 MiB memory map instead of read calls
+    "mmap_size": 256 * 1024 * 1024,
+    # a negative cache size is in KiB, 64 MiB of cached pages per connection
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# the id of the wallet whose data is read and written,
+# an empty string while no wallet is connected.
+_current_wallet_id = ""
+
+
+def get_database_uri() -> str:
+    """Get the uri of the db, which is kept in the app data dir so that it
+    survives restarts, except while testing where it is in flask's instance folder."""
+    if is_testing_environment():
+        return f"sqlite:///{DATABASE_FILE_NAME}"
+    return f"sqlite:///{path.join(get_app_data_dir(), DATABASE_FILE_NAME)}"
+
+
+def optimize_database() -> None:
+    """Refresh the table statistics the sqlite query planner uses to choose
+    between indexes, without them it can not tell how selective an index is.
+
+    Only the tables that changed enough since they were last analyzed are analyzed."""
+    # 0x10002 also analyzes tables that no query of this connection used yet
+    DB.session.execute(text("PRAGMA optimize=0x10002"))
+    DB.session.commit()
+
+
+def get_current_wallet_id() -> str:
+    return _current_wallet_id
+
+
+def set_current_wallet_id(wallet_id: Optional[str]) -> None:
+    global _current_wallet_id
+    _current_wallet_id = wallet_id or ""
+
+
+class WalletScoped:
+    """Mixin for the models that hold data of a single wallet.
+
+    Every row is stamped with the id of the wallet it belongs to, and every
+    orm select, update and delete of these models only sees the rows of the
+    current wallet, therefore the data of every wallet the user has opened
+    is kept side by side and opening a wallet again reuses what was already
+    computed for it.
+    """
+
+    wallet_id = Column(
+        String(),
+        nullable=False,
+        index=True,
+        default=lambda: get_current_wallet_id(),
+    )
+
+
+def init_database(app: Flask) -> None:
+    """Set up the app's db, applying the sqlite settings of set_sqlite_pragmas
+    and begin_sqlite_transaction to its engines only, the engines of the
+    libraries that keep a db of their own, like bitcoinlib, are left as they are."""
+    DB.init_app(app)
+    with app.app_context():
+        for engine in DB.engines.values():
+            event.listen(engine, "connect", set_sqlite_pragmas)
+            event.listen(engine, "begin", begin_sqlite_transaction)
+
+
+def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+    # pysqlite only begins a transaction right before the first write, therefore
+    # a savepoint made before it is a transaction of its own that is committed
+    # when it is released. Let sqlalchemy begin the transactions instead,
+    # see begin_sqlite_transaction.
+    dbapi_connection.isolation_level = None
+
+
+def begin_sqlite_transaction(connection: Connection) -> None:
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN")
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_to_current_wallet(execute_state: ORMExecuteState) -> None:
+    if not (
+        execute_state.is_select or execute_state.is_update or execute_state.is_delete
+    ):
+        return
+    wallet_id = get_current_wallet_id()
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(
+            WalletScoped,
+            lambda cls: cls.wallet_id == wallet_id,
+            include_aliases=True,
+        )
+    )
+
 
 def populate_labels():
     try:
@@ -0,0 +1,225 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import structlog
+from sqlalchemy import Connection, func, inspect, insert, text
+
+from src.database import DB
+from src.models.change_output_position import ChangeOutputPosition
+from src.models.column_types import TXID_BYTES
+from src.models.schema_migration import SchemaMigration
+
+LOGGER = structlog.get_logger()
+
+
+@dataclass(frozen=True)
+class Migration:
+    """A forward only change to the schema of an existing db,
+    applied once the db is at the version before it."""
+
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def add_hot_path_indexes(connection: Connection) -> None:
+    """Index the columns that the wallet's frequent queries filter by,
+    which were otherwise full table scans."""
+    for statement in [
+        "CREATE INDEX IF NOT EXISTS ix_outputs_wallet_id_address "
+        "ON outputs (wallet_id, address)",
+        "CREATE INDEX IF NOT EXISTS ix_outputs_wallet_id_spent_txid "
+        "ON outputs (wallet_id, spent_txid)",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_wallet_id_confirmed_block_height "
+        "ON transactions (wallet_id, confirmed_block_height)",
+    ]:
+        connection.execute(text(statement))
+
+
+# the columns of each table that hold a txid, see Txid
+TXID_COLUMNS = {
+    "transactions": ["txid"],
+    "outputs": ["txid", "spent_txid"],
+    "all_inputs": ["txid"],
+    "tx_inputs": ["txid", "prev_txid"],
+    "tx_outputs": ["txid"],
+}
+
+
+def store_txids_as_bytes(connection: Connection) -> None:
+    """Convert the hex txids to the 32 bytes the Txid column type stores.
+
+    sqlite keeps a blob as is in a column that was declared as a string,
+    therefore the tables are not recreated, only their txids are converted.
+    A row whose txid is not a valid txid can not be stored anymore and is removed."""
+    for table_name, column_names in TXID_COLUMNS.items():
+        for column_name in column_names:
+            rows = connection.execute(
+                text(
+                    f"SELECT id, {column_name} FROM {table_name} "
+                    f"WHERE typeof({column_name}) = 'text'"
+                )
+            ).all()
+            converted_rows = []
+            invalid_ids = []
+            for row_id, txid in rows:
+                try:
+                    txid_bytes = bytes.fromhex(txid)
+                except ValueError:
+                    txid_bytes = b""
+                if len(txid_bytes) == TXID_BYTES:
+                    converted_rows.append({"id": row_id, "txid": txid_bytes})
+                else:
+                    invalid_ids.append({"id": row_id})
+
+            if len(converted_rows) > 0:
+                connection.execute(
+                    text(
+                        f"UPDATE {table_name} SET {column_name} = :txid "
+                        "WHERE id = :id"
+                    ),
+                    converted_rows,
+                )
+            if len(invalid_ids) > 0:
+                LOGGER.error(
+                    "Removing rows with an invalid txid",
+                    table=table_name,
+                    column=column_name,
+                    count=len(invalid_ids),
+                )
+                if table_name == "outputs":
+                    connection.execute(
+                        text("DELETE FROM output_labels WHERE output_id = :id"),
+                        invalid_ids,
+                    )
+                connection.execute(
+                    text(f"DELETE FROM {table_name} WHERE id = :id"), invalid_ids
+                )
+
+
+def add_simple_change_outputs(connection: Connection) -> None:
+    """Store whether each output is simple change, which was a property that
+    loaded the output's transaction and its outputs, and count the wallet's
+    change outputs at each vout into the change output positions."""
+    if "is_simple_change" not in [
+        column["name"] for column in inspect(connection).get_columns("outputs")
+    ]:
+        connection.execute(
+            text(
+                "ALTER TABLE outputs "
+                "ADD COLUMN is_simple_change BOOLEAN NOT NULL DEFAULT 0"
+            )
+        )
+    connection.execute(
+        text(
+            """
+            UPDATE outputs SET is_simple_change = 1
+            WHERE script IS NOT NULL
+            AND EXISTS (
+                SELECT 1 FROM transactions
+                WHERE transactions.wallet_id = outputs.wallet_id
+                AND transactions.txid = outputs.txid
+                AND transactions.sent_amount > 0
+                AND transactions.received_amount > 0
+            )
+            AND (
+                SELECT count(*) FROM outputs AS transaction_outputs
+                WHERE transaction_outputs.wallet_id = outputs.wallet_id
+                AND transaction_outputs.txid = outputs.txid
+                AND transaction_outputs.script IS NOT NULL
+            ) = 1
+            """
+        )
+    )
+    ChangeOutputPosition.__table__.create(connection, checkfirst=True)
+    connection.execute(text("DELETE FROM change_output_positions"))
+    connection.execute(
+        text(
+            "INSERT INTO change_output_positions (wallet_id, vout, count) "
+            "SELECT wallet_id, vout, count(*) FROM outputs "
+            "WHERE is_simple_change GROUP BY wallet_id, vout"
+        )
+    )
+
+
+# the version of a db created from the models before any migration was added
+BASELINE_SCHEMA_VERSION = 1
+BASELINE_SCHEMA_NAME = "baseline"
+
+# the migrations in the order they are applied.
+# When the models change, append a migration with the next version that
+# makes the same change to an existing db, a db created from the models
+# is stamped with the latest version and therefore never runs them.
+MIGRATIONS: List[Migration] = [
+    Migration(2, "hot path indexes", add_hot_path_indexes),
+    Migration(3, "txids as bytes", store_txids_as_bytes),
+    Migration(4, "simple change outputs", add_simple_change_outputs),
+]
+
+
+def get_latest_schema_version() -> int:
+    if len(MIGRATIONS) == 0:
+        return BASELINE_SCHEMA_VERSION
+    return MIGRATIONS[-1].version
+
+
+def get_schema_version() -> Optional[int]:
+    """Get the schema version of the db, None if it is not versioned."""
+    if SchemaMigration.__tablename__ not in inspect(DB.engine).get_table_names():
+        return None
+    return DB.session.query(func.max(SchemaMigration.version)).scalar()
+
+
+def create_schema() -> None:
+    """Create every table from the models, stamped with the latest version."""
+    DB.create_all()
+    latest_name = MIGRATIONS[-1].name if MIGRATIONS else BASELINE_SCHEMA_NAME
+    DB.session.add(
+        SchemaMigration(version=get_latest_schema_version(), name=latest_name)
+    )
+    DB.session.commit()
+
+
+def migrate_database() -> None:
+    """Bring the db up to the latest schema version, keeping the data in it.
+
+    A db from before the schema was versioned, or from a newer version
+    of the app, can not be migrated, therefore it is rebuilt instead.
+    """
+    version = get_schema_version()
+    latest_version = get_latest_schema_version()
+    # end the session's db transaction, the migrations
+    # are made in transactions of their own.
+    DB.session.commit()
+
+    if version is None or version > latest_version:
+        if len(inspect(DB.engine).get_table_names()) > 0:
+            LOGGER.error(
+                "The db schema can not be migrated, therefore the db is rebuilt",
+                version=version,
+                latest_version=latest_version,
+            )
+            DB.drop_all()
+        create_schema()
+        return
+
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        LOGGER.info(
+            "Migrating the db schema",
+            version=migration.version,
+            name=migration.name,
+        )
+        # each migration and its stamp are committed together,
+        # so a failed migration is retried on the next start.
+        with DB.engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(
+                insert(SchemaMigration).values(
+                    version=migration.version,
+                    name=migration.name,
+                    applied_at=datetime.now(),
+                )
+            )
@@ -1,8 +1,9 @@
 from sqlalchemy import Integer
-from src.database import DB
+from src.database import DB, WalletScoped
+from src.models.column_types import Txid
 
 
-class AllInput(DB.Model):
+class AllInput(DB.Model, WalletScoped):
     """Input for all inputs of related transactions, even if it is not the users input"""
 
     __tablename__ = "all_inputs"  # Specify the table name
@@ -10,7 +11,7 @@ class AllInput(DB.Model):
     # Auto-incrementing integer
     id = DB.Column(Integer, primary_key=True, autoincrement=True)
 
-    txid = DB.Column(DB.String(), nullable=False)
+    txid = DB.Column(Txid, nullable=False)
 
     vout = DB.Column(DB.Integer, nullable=False, default=0)
 
@@ -19,3 +20,10 @@ class AllInput(DB.Model):
     value = DB.Column(DB.Integer, nullable=True)  # in sats
     # is this input the users input for this wallet or not?
     is_mine = DB.Column(DB.Boolean, nullable=False, default=False)
+
+    # Unique constraint on the combination of txid and vout
+    __table_args__ = (
+        DB.UniqueConstraint(
+            "wallet_id", "txid", "vout", name="uq_all_inputs_txid_vout"
+        ),
+    )
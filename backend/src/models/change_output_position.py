@@ -0,0 +1,23 @@
+from sqlalchemy import Integer
+from src.database import DB, WalletScoped
+
+
+class ChangeOutputPosition(DB.Model, WalletScoped):
+    """The number of the wallet's simple change outputs at each vout,
+    see Output.is_simple_change.
+
+    Kept up to date as the outputs are synced, so that how common a change
+    position is for the wallet does not have to be counted from its outputs.
+    """
+
+    __tablename__ = "change_output_positions"
+
+    id = DB.Column(Integer, primary_key=True, autoincrement=True)
+    vout = DB.Column(DB.Integer, nullable=False)
+    count = DB.Column(DB.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        DB.UniqueConstraint(
+            "wallet_id", "vout", name="uq_change_output_positions_wallet_id_vout"
+        ),
+    )
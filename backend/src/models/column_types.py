@@ -0,0 +1,32 @@
+from typing import Any, Optional
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+TXID_BYTES = 32
+
+
+class Txid(TypeDecorator):
+    """A transaction id, which is a hex string in python
+    and its 32 bytes in the db, half the size of the hex string,
+    which keeps the rows and indexes that are joined on txids small."""
+
+    impl = LargeBinary(TXID_BYTES)
+    cache_ok = True
+
+    def process_bind_param(
+        self, value: Optional[str], dialect: Any
+    ) -> Optional[bytes]:
+        if value is None:
+            return None
+        txid = bytes.fromhex(value)
+        if len(txid) != TXID_BYTES:
+            raise ValueError(f"A txid is {TXID_BYTES} bytes, not {len(txid)}: {value}")
+        return txid
+
+    def process_result_value(
+        self, value: Optional[bytes], dialect: Any
+    ) -> Optional[str]:
+        if value is None:
+            return None
+        return value.hex()
@@ -2,7 +2,7 @@ from sqlalchemy import Enum, Integer
 from enum import Enum as PyEnum
 
 
-from src.database import DB
+from src.database import DB, WalletScoped
 
 
 class LastFetchedType(PyEnum):
@@ -10,9 +10,13 @@ class LastFetchedType(PyEnum):
     TRANSACTIONS = "transactions"
 
 
-class LastFetched(DB.Model):
+class LastFetched(DB.Model, WalletScoped):
     __tablename__ = "last_fetched"
 
     id = DB.Column(Integer, primary_key=True, autoincrement=True)
-    type = DB.Column(Enum(LastFetchedType), unique=True, nullable=False)
+    type = DB.Column(Enum(LastFetchedType), nullable=False)
     timestamp = DB.Column(DB.DateTime, nullable=False, default=None)
+
+    __table_args__ = (
+        DB.UniqueConstraint("wallet_id", "type", name="uq_last_fetched_wallet_id_type"),
+    )
@@ -1,38 +1,37 @@
 from sqlalchemy import Integer
-from src.database import DB
+from src.database import DB, WalletScoped
+from src.models.column_types import Txid
 from .output_labels import output_labels
 
 
-class Output(DB.Model):
+class Output(DB.Model, WalletScoped):
     __tablename__ = "outputs"  # Specify the table name
 
     # Auto-incrementing integer
     id = DB.Column(Integer, primary_key=True, autoincrement=True)
 
     # Foreign key to the 'Transaction' model (creating transaction)
-    txid = DB.Column(DB.String(), DB.ForeignKey(
-        "transactions.txid"), nullable=False)
+    txid = DB.Column(Txid, nullable=False)
 
     # Relationship to the 'Transaction' model for the creating transaction
     transaction = DB.relationship(
         "Transaction",
         back_populates="outputs",
         # Explicitly tell SQLAlchemy which foreign key to use
-        foreign_keys=[txid],
+        foreign_keys="[Output.wallet_id, Output.txid]",
+        overlaps="inputs,spent_transaction",
     )
 
     # Foreign key to the 'Transaction' model (spending transaction)
-    spent_txid = DB.Column(
-        DB.String(), DB.ForeignKey("transactions.txid"), nullable=True
-    )
+    spent_txid = DB.Column(Txid, nullable=True)
 
     # Relationship to the 'Transaction' model for the spending transaction
     spent_transaction = DB.relationship(
         "Transaction",
         back_populates="inputs",
-        foreign_keys=[
-            spent_txid
-        ],  # Explicitly tell SQLAlchemy which foreign key to use
+        # Explicitly tell SQLAlchemy which foreign key to use
+        foreign_keys="[Output.wallet_id, Output.spent_txid]",
+        overlaps="outputs,transaction",
     )
     vout = DB.Column(DB.Integer, nullable=False, default=0)
 
@@ -41,29 +40,43 @@ class Output(DB.Model):
     # nullable to make populating outputs from output label population easier
     value = DB.Column(DB.Integer, nullable=True)  # in sats
 
+    # the rest of the output's details, so that the wallet's outputs can be
+    # served from the db without refetching and parsing their transactions.
+    # nullable since an output added from the output label population
+    # only gets these once its transaction has been synced.
+    script = DB.Column(DB.String(), nullable=True)  # hex
+    script_type = DB.Column(DB.String(), nullable=True)
+    public_key = DB.Column(DB.String(), nullable=True)  # hex
+    public_hash = DB.Column(DB.String(), nullable=True)  # hex
+    # the number of outputs in the creating transaction with the same value
+    annominity_set = DB.Column(DB.Integer, nullable=True)
+    # the index of the input that spends this output in the spending transaction
+    spending_index_n = DB.Column(DB.Integer, nullable=True)
+
     # Relationship to labels
     labels = DB.relationship(
         "Label", secondary=output_labels, back_populates="outputs")
 
-    @property
-    def is_simple_change(self) -> bool:
-        """Check if the output is a simple change output
-
-
-        # If the transaction it was created in the user has included inputs and also outputs
-        # it is change but only
-        # if it does not have more than one output though
-        # since that means it is a more complex transaction, not just simple change.
-        """
-        is_there_change = (
-            self.transaction.sent_amount > 0 and self.transaction.received_amount > 0
-        )
-        # if the user only has one output in the tx it has an input in
-        # then consider it change
-        is_simple_change = is_there_change and len(
-            self.transaction.outputs) == 1
-        return is_simple_change
+    # whether the output is the only one of the wallet in a transaction that the
+    # wallet both sent and received funds in, in which case it is change,
+    # a transaction with more of the wallet's outputs is more than simple change.
+    # Set when the outputs are synced, see sync_local_db_with_incoming_outputs.
+    is_simple_change = DB.Column(
+        DB.Boolean, nullable=False, default=False, server_default="0"
+    )
 
-    # Unique constraint on the combination of txid and vout
-    __table_args__ = (DB.UniqueConstraint(
-        "txid", "vout", name="uq_txid_vout"),)
+    # Unique constraint on the combination of txid and vout of each wallet
+    __table_args__ = (
+        DB.UniqueConstraint("wallet_id", "txid", "vout", name="uq_txid_vout"),
+        DB.ForeignKeyConstraint(
+            ["wallet_id", "txid"], ["transactions.wallet_id", "transactions.txid"]
+        ),
+        DB.ForeignKeyConstraint(
+            ["wallet_id", "spent_txid"],
+            ["transactions.wallet_id", "transactions.txid"],
+        ),
+        # for finding reused addresses, see is_address_reused
+        DB.Index("ix_outputs_wallet_id_address", "wallet_id", "address"),
+        # for finding the outputs a transaction spends
+        DB.Index("ix_outputs_wallet_id_spent_txid", "wallet_id", "spent_txid"),
+    )
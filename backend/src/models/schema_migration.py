@@ -0,0 +1,15 @@
+from datetime import datetime
+
+from sqlalchemy import Integer
+
+from src.database import DB
+
+
+class SchemaMigration(DB.Model):
+    """A schema version the db has been brought to, see src.migrations"""
+
+    __tablename__ = "schema_migrations"
+
+    version = DB.Column(Integer, primary_key=True, autoincrement=False)
+    name = DB.Column(DB.String(), nullable=False)
+    applied_at = DB.Column(DB.DateTime, nullable=False, default=datetime.now)
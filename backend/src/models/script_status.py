@@ -0,0 +1,31 @@
+from sqlalchemy import Integer
+from src.database import DB
+
+
+class ScriptStatus(DB.Model):
+    """The electrum status of one of the wallet's derived scripts, as of its last scan.
+
+    The status is a hash of the script's history, therefore a script whose
+    status has not changed since it was scanned does not need its history refetched.
+    """
+
+    __tablename__ = "script_statuses"
+
+    id = DB.Column(Integer, primary_key=True, autoincrement=True)
+
+    wallet_id = DB.Column(DB.String(), nullable=False, index=True)
+    # the bdk.KeychainKind name
+    keychain = DB.Column(DB.String(), nullable=False)
+    index = DB.Column(DB.Integer, nullable=False)
+    scripthash = DB.Column(DB.String(), nullable=False)
+    # null while the script has no history
+    status = DB.Column(DB.String(), nullable=True)
+    # the script's history since the wallet's birthday,
+    # a list of {"tx_hash": str, "height": int}
+    history = DB.Column(DB.JSON, nullable=False, default=list)
+
+    __table_args__ = (
+        DB.UniqueConstraint(
+            "wallet_id", "scripthash", name="uq_script_statuses_wallet_id_scripthash"
+        ),
+    )
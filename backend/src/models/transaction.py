@@ -1,27 +1,36 @@
-from sqlalchemy import String, Integer, DateTime
+from sqlalchemy import Integer, DateTime
 
 
-from src.database import DB
+from src.database import DB, WalletScoped
+from src.models.column_types import Txid
 from src.models.outputs import Output
+from src.models.tx_inputs import TxInput
+from src.models.tx_outputs import TxOutput
 
 
-class Transaction(DB.Model):
+class Transaction(DB.Model, WalletScoped):
     __tablename__ = "transactions"
 
     id = DB.Column(Integer, primary_key=True, autoincrement=True)
-    txid = DB.Column(String, unique=True, nullable=False)
+    txid = DB.Column(Txid, nullable=False)
     received_amount = DB.Column(Integer, nullable=False)
     sent_amount = DB.Column(Integer, nullable=False)
-    fee = DB.Column(Integer, nullable=False)
+    # bdk does not know the fee of a transaction whose inputs are not all the users
+    fee = DB.Column(Integer, nullable=True)
     confirmed_block_height = DB.Column(Integer, nullable=True)
     confirmed_date_time = DB.Column(DateTime, nullable=True)
+    # the decoded transaction, as returned by bitcoinlib's Transaction.as_dict,
+    # without its inputs and outputs which are in the tx_inputs and tx_outputs tables.
+    # null until the transaction has been decoded.
+    details = DB.Column(DB.JSON(none_as_null=True), nullable=True)
 
     # Relationship to Output (outputs created by this transaction)
     outputs = DB.relationship(
         "Output",
         back_populates="transaction",
         # Explicitly reference the 'txid' column in Output
-        foreign_keys=[Output.txid],
+        foreign_keys=[Output.wallet_id, Output.txid],
+        overlaps="inputs,spent_transaction",
     )
 
     # Relationship to Input (inputs spent by this transaction)
@@ -29,6 +38,32 @@ class Transaction(DB.Model):
         "Output",
         back_populates="spent_transaction",
         foreign_keys=[
-            Output.spent_txid
+            Output.wallet_id,
+            Output.spent_txid,
         ],  # Explicitly reference the 'spent_txid' column in Output
+        overlaps="outputs,transaction",
+    )
+
+    # every decoded input and output of the transaction
+    tx_inputs = DB.relationship(
+        "TxInput",
+        back_populates="transaction",
+        foreign_keys=[TxInput.wallet_id, TxInput.txid],
+        order_by=TxInput.index_n,
+    )
+    tx_outputs = DB.relationship(
+        "TxOutput",
+        back_populates="transaction",
+        foreign_keys=[TxOutput.wallet_id, TxOutput.txid],
+        order_by=TxOutput.output_n,
+    )
+
+    __table_args__ = (
+        DB.UniqueConstraint("wallet_id", "txid", name="uq_transactions_wallet_id_txid"),
+        # for finding the outputs that were unspent at a block height
+        DB.Index(
+            "ix_transactions_wallet_id_confirmed_block_height",
+            "wallet_id",
+            "confirmed_block_height",
+        ),
     )
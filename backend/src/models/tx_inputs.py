@@ -0,0 +1,60 @@
+from typing import Any
+from sqlalchemy import Integer
+from src.database import DB, WalletScoped
+from src.models.column_types import Txid
+
+
+class TxInput(DB.Model, WalletScoped):
+    """Decoded input of a wallet transaction, whether or not it is the users input"""
+
+    __tablename__ = "tx_inputs"  # Specify the table name
+
+    # Auto-incrementing integer
+    id = DB.Column(Integer, primary_key=True, autoincrement=True)
+
+    # the wallet transaction spending this input
+    txid = DB.Column(Txid, nullable=False, index=True)
+    index_n = DB.Column(DB.Integer, nullable=False)
+
+    # the output this input spends
+    prev_txid = DB.Column(Txid, nullable=False)
+    output_n = DB.Column(DB.Integer, nullable=False)
+
+    value = DB.Column(DB.Integer, nullable=True)  # in sats
+    script_type = DB.Column(DB.String(), nullable=True)
+    address = DB.Column(DB.String(), nullable=True, index=True)
+    # is this input the users input for this wallet or not?
+    is_mine = DB.Column(DB.Boolean, nullable=False, default=False)
+
+    # the rest of the decoded input, as returned by bitcoinlib's Input.as_dict
+    details = DB.Column(DB.JSON, nullable=False, default=dict)
+
+    transaction = DB.relationship(
+        "Transaction",
+        back_populates="tx_inputs",
+        foreign_keys="[TxInput.wallet_id, TxInput.txid]",
+    )
+
+    __table_args__ = (
+        DB.UniqueConstraint(
+            "wallet_id", "txid", "index_n", name="uq_tx_inputs_txid_index_n"
+        ),
+        DB.ForeignKeyConstraint(
+            ["wallet_id", "txid"], ["transactions.wallet_id", "transactions.txid"]
+        ),
+        DB.Index("ix_tx_inputs_prev_txid_output_n", "prev_txid", "output_n"),
+    )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Get the input in the same shape as bitcoinlib's Input.as_dict"""
+        return {
+            **self.details,
+            "index_n": self.index_n,
+            "prev_txid": self.prev_txid,
+            "output_n": self.output_n,
+            "script_type": self.script_type,
+            "address": self.address,
+            "value": self.value,
+            # the sort property holds the is_mine value, see update_input_amount_and_is_mine_value
+            "sort": self.is_mine,
+        }
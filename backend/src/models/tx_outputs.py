@@ -0,0 +1,51 @@
+from typing import Any
+from sqlalchemy import Integer
+from src.database import DB, WalletScoped
+from src.models.column_types import Txid
+
+
+class TxOutput(DB.Model, WalletScoped):
+    """Decoded output of a wallet transaction, whether or not it is the users output"""
+
+    __tablename__ = "tx_outputs"  # Specify the table name
+
+    # Auto-incrementing integer
+    id = DB.Column(Integer, primary_key=True, autoincrement=True)
+
+    # the wallet transaction creating this output
+    txid = DB.Column(Txid, nullable=False, index=True)
+    output_n = DB.Column(DB.Integer, nullable=False)
+
+    value = DB.Column(DB.Integer, nullable=False)  # in sats
+    script_type = DB.Column(DB.String(), nullable=True)
+    address = DB.Column(DB.String(), nullable=True, index=True)
+    # is this output the users output for this wallet or not?
+    is_mine = DB.Column(DB.Boolean, nullable=False, default=False)
+
+    # the rest of the decoded output, as returned by bitcoinlib's Output.as_dict
+    details = DB.Column(DB.JSON, nullable=False, default=dict)
+
+    transaction = DB.relationship(
+        "Transaction",
+        back_populates="tx_outputs",
+        foreign_keys="[TxOutput.wallet_id, TxOutput.txid]",
+    )
+
+    __table_args__ = (
+        DB.UniqueConstraint(
+            "wallet_id", "txid", "output_n", name="uq_tx_outputs_txid_output_n"
+        ),
+        DB.ForeignKeyConstraint(
+            ["wallet_id", "txid"], ["transactions.wallet_id", "transactions.txid"]
+        ),
+    )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Get the output in the same shape as bitcoinlib's Output.as_dict"""
+        return {
+            **self.details,
+            "value": self.value,
+            "script_type": self.script_type,
+            "address": self.address,
+            "output_n": self.output_n,
+        }
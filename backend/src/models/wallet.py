@@ -1,10 +1,12 @@
 from typing import Optional, Type
 from bdkpython import bdk
 from src.database import DB
+import hashlib
 import uuid
 
 
 class Wallet(DB.Model):
+    # see get_wallet_id, the data stored for the wallet is kept under this id
     id = DB.Column(DB.String, primary_key=True, default=lambda: str(uuid.uuid4()))
 
     descriptor = DB.Column(DB.String(255), nullable=True, default=None)
@@ -14,6 +16,24 @@ class Wallet(DB.Model):
     network = DB.Column(DB.Integer, nullable=True, default=bdk.Network.REGTEST.value)
     electrum_url = DB.Column(DB.String(255), nullable=True, default="127.0.0.1:50000")
     stop_gap = DB.Column(DB.Integer, nullable=True, default=100)
+    # the wallet has no history before this block height
+    birthday_height = DB.Column(DB.Integer, nullable=True, default=None)
+    # scan the wallet's scripts in large electrum batches before bdk syncs it,
+    # see WalletScanner
+    fast_import = DB.Column(DB.Boolean, nullable=False, default=False)
+
+    @classmethod
+    def get_wallet_id(
+        cls, descriptor: str, change_descriptor: Optional[str], network: int
+    ) -> str:
+        """Get the id of the wallet with these descriptors,
+        which is the same every time the wallet is opened.
+
+        The id is a hash of the wallet's descriptors,
+        so that the descriptors themselves are not used as the id."""
+        return hashlib.sha256(
+            "\n".join([str(network), descriptor, change_descriptor or ""]).encode()
+        ).hexdigest()
 
     @classmethod
     def get_current_wallet(cls) -> Optional[Type["Wallet"]]:
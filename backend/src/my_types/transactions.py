@@ -1,6 +1,11 @@
-from typing import List, Any, Optional
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Any, Optional
 from bitcoinlib.transactions import Output
 
+if TYPE_CHECKING:
+    from src.models.tx_inputs import TxInput
+    from src.models.tx_outputs import TxOutput
+
 
 class LiveWalletOutput(Output):
     """
@@ -39,3 +44,27 @@ class LiveWalletOutput(Output):
         base_dict["txid"] = self.txid
         base_dict["labels"] = self.labels
         return base_dict
+
+
+@dataclass(frozen=True)
+class DecodedTransaction:
+    """
+    A wallet transaction decoded from the tx_inputs and tx_outputs tables.
+
+    It offers the parts of the bitcoinlib Transaction that the privacy metrics use,
+    so it can be used in place of one without fetching and parsing the transaction again.
+    """
+
+    txid: str
+    # the transaction level fields of bitcoinlib's Transaction.as_dict
+    details: dict[str, Any]
+    inputs: List["TxInput"]
+    outputs: List["TxOutput"]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            **self.details,
+            "txid": self.txid,
+            "inputs": [input.as_dict() for input in self.inputs],
+            "outputs": [output.as_dict() for output in self.outputs],
+        }
@@ -0,0 +1,201 @@
+from contextlib import closing
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from os import path
+from typing import Callable, List, Tuple
+
+import click
+from flask import Flask
+from sqlalchemy import event, text
+
+from src.database import DB, init_database, optimize_database, set_current_wallet_id
+from src.migrations import migrate_database
+from src.models.all_inputs import AllInput
+from src.models.outputs import Output as OutputModel
+from src.models.transaction import Transaction as TransactionModel
+from src.services.wallet.wallet import WalletService
+
+# the indexes added for the queries below, see add_hot_path_indexes
+HOT_PATH_INDEXES = [
+    "ix_outputs_wallet_id_address",
+    "ix_outputs_wallet_id_spent_txid",
+    "ix_transactions_wallet_id_confirmed_block_height",
+]
+WALLET_IDS = ["benchmark_wallet", "other_wallet"]
+
+
+def populate_wallet(wallet_id: str, transaction_count: int) -> None:
+    """Add transactions that each spend the output of the one before them
+    and create a couple of outputs of their own, one of which reuses an address."""
+    set_current_wallet_id(wallet_id)
+    transactions = []
+    outputs = []
+    all_inputs = []
+    for index in range(transaction_count):
+        txid = f"{wallet_id}_{index:064d}"[-64:]
+        transactions.append(
+            {
+                "wallet_id": wallet_id,
+                "txid": txid,
+                "received_amount": 1000,
+                "sent_amount": 500,
+                "confirmed_block_height": index,
+            }
+        )
+        for vout in range(2):
+            outputs.append(
+                {
+                    "wallet_id": wallet_id,
+                    "txid": txid,
+                    "vout": vout,
+                    "address": f"address_{index if vout == 0 else index // 2}",
+                    "value": 1000,
+                    "spent_txid": None,
+                }
+            )
+            all_inputs.append(
+                {
+                    "wallet_id": wallet_id,
+                    "txid": txid,
+                    "vout": vout,
+                    "address": f"address_{index}",
+                    "value": 1000,
+                    "is_mine": vout == 0,
+                }
+            )
+        if index > 0:
+            outputs[-4]["spent_txid"] = txid
+
+    DB.session.execute(TransactionModel.__table__.insert(), transactions)
+    DB.session.execute(OutputModel.__table__.insert(), outputs)
+    DB.session.execute(AllInput.__table__.insert(), all_inputs)
+    DB.session.commit()
+
+
+def get_hot_queries(transaction_count: int) -> List[Tuple[str, Callable[[], object]]]:
+    def random_txid() -> str:
+        index = random.randrange(transaction_count)
+        return f"{WALLET_IDS[0]}_{index:064d}"[-64:]
+
+    return [
+        (
+            "is_address_reused",
+            lambda: OutputModel.query.filter_by(
+                address=f"address_{random.randrange(transaction_count)}"
+            ).all(),
+        ),
+        (
+            "get_transaction_inputs_from_db",
+            lambda: WalletService.get_transaction_inputs_from_db(random_txid()),
+        ),
+        (
+            "get_all_inputs_from_db",
+            lambda: WalletService.get_all_inputs_from_db(
+                [(random_txid(), 0) for _ in range(50)]
+            ),
+        ),
+        (
+            "get_all_unspent_outputs_from_db_before_blockheight",
+            lambda: WalletService.get_all_unspent_outputs_from_db_before_blockheight(
+                transaction_count // 100
+            ),
+        ),
+    ]
+
+
+def get_query_plan(query: Callable[[], object]) -> List[str]:
+    """Run the query once and explain the sql it executed,
+    which includes the wallet filter added by WalletScoped."""
+    executed: List[Tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(DB.engine, "before_cursor_execute", capture)
+    try:
+        query()
+    finally:
+        event.remove(DB.engine, "before_cursor_execute", capture)
+
+    statement, parameters = executed[-1]
+    # a new connection, since the connections of the pool
+    # keep plans from before the indexes were dropped.
+    with closing(sqlite3.connect(DB.engine.url.database)) as connection:
+        rows = connection.execute(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).fetchall()
+    return [row[-1] for row in rows]
+
+
+def time_query(query: Callable[[], object], runs: int) -> float:
+    """Get the median time of the query in milliseconds."""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        query()
+        durations.append((time.perf_counter() - start) * 1000)
+        DB.session.expunge_all()
+    return statistics.median(durations)
+
+
+def run_queries(transaction_count: int, runs: int) -> dict:
+    results = {}
+    for name, query in get_hot_queries(transaction_count):
+        random.seed(name)
+        results[name] = (get_query_plan(query), time_query(query, runs))
+    return results
+
+
+@click.command()
+@click.option(
+    "--transaction_count",
+    default=20000,
+    help="Number of transactions in each of the benchmark's wallets.",
+)
+@click.option(
+    "--runs",
+    default=50,
+    help="Number of times each query is run.",
+)
+def benchmark_db_queries(transaction_count: int, runs: int):
+    """Compare the wallet's hot db queries with and without the hot path indexes."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = (
+            f"sqlite:///{path.join(data_dir, 'benchmark.db')}"
+        )
+        init_database(app)
+        with app.app_context():
+            migrate_database()
+            for wallet_id in WALLET_IDS:
+                populate_wallet(wallet_id, transaction_count)
+            set_current_wallet_id(WALLET_IDS[0])
+            # like the app does on every start
+            optimize_database()
+
+            indexed = run_queries(transaction_count, runs)
+            for index_name in HOT_PATH_INDEXES:
+                DB.session.execute(text(f"DROP INDEX {index_name}"))
+            DB.session.commit()
+            optimize_database()
+            unindexed = run_queries(transaction_count, runs)
+
+            for name, (plan, duration) in indexed.items():
+                unindexed_plan, unindexed_duration = unindexed[name]
+                click.echo(f"\n{name}")
+                click.echo(f"  without indexes: {unindexed_duration:.3f} ms")
+                for step in unindexed_plan:
+                    click.echo(f"    {step}")
+                click.echo(f"  with indexes:    {duration:.3f} ms")
+                for step in plan:
+                    click.echo(f"    {step}")
+
+            DB.session.remove()
+            DB.engine.dispose()
+
+
+if __name__ == "__main__":
+    benchmark_db_queries()
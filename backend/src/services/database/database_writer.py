@@ -0,0 +1,225 @@
+from concurrent.futures import Future
+from contextlib import nullcontext
+from dataclasses import dataclass
+from threading import Condition, Thread, current_thread
+from typing import Any, Callable, List, Optional, TypeVar
+import time
+
+from flask import Flask, current_app, has_app_context
+import structlog
+
+from src.database import DB
+
+LOGGER = structlog.get_logger()
+
+# commit once this many writes are queued
+DEFAULT_MAX_BATCH_SIZE = 200
+# or once the first queued write has waited this long for others to join it
+DEFAULT_MAX_BATCH_DELAY_SECONDS = 0.05
+
+T = TypeVar("T")
+
+
+@dataclass
+class _QueuedWrite:
+    write: Callable[[], Any]
+    future: Future
+    app: Optional[Flask]
+    # a flush only waits for the writes queued before it,
+    # therefore it commits the batch right away.
+    is_flush: bool = False
+
+
+def _no_write() -> None:
+    return None
+
+
+class DatabaseWriter:
+    """Make every db write from a single background thread, in batches.
+
+    A write is a function that changes the db session without committing it.
+    Writes that are submitted within a short window of each other are made
+    in a single db transaction with a single commit, so that a sync making
+    thousands of writes only commits, and therefore fsyncs, a handful of times,
+    and since sqlite only allows one writer at a time, writes never wait on
+    each other's locks.
+
+    Each write runs in a savepoint of its own, so a failing write is rolled back
+    without the rest of its batch, and its exception is raised by its future.
+    A write's result is returned once its batch is committed, after which the
+    objects it loaded are expired, therefore a write should return plain data
+    and the caller should read anything else back, see flush.
+
+    write and flush end the caller's db transaction without committing it,
+    therefore a caller must not mix changes of its own db session with the
+    writer, they are refused instead of being rolled back, see
+    _end_read_transaction.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_batch_delay_seconds: float = DEFAULT_MAX_BATCH_DELAY_SECONDS,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay_seconds = max_batch_delay_seconds
+
+        self._condition = Condition()
+        self._queue: List[_QueuedWrite] = []
+        self._thread: Optional[Thread] = None
+        self._commit_count = 0
+
+    @property
+    def commit_count(self) -> int:
+        """The number of batches committed so far."""
+        return self._commit_count
+
+    def submit(self, write: Callable[[], T]) -> "Future[T]":
+        """Queue the write, returning a future of its result
+        that is resolved once the write has been committed."""
+        if current_thread() is self._thread:
+            # a write that is made from another write is part of the same batch
+            future: Future = Future()
+            future.set_result(write())
+            return future
+        return self._enqueue(write)
+
+    def write(self, write: Callable[[], T], timeout: Optional[float] = None) -> T:
+        """Make the write and wait for it to be committed,
+        raising the exception of the write if it failed."""
+        if current_thread() is self._thread:
+            return write()
+        self._check_no_pending_changes()
+        try:
+            return self._enqueue(write).result(timeout)
+        finally:
+            self._end_read_transaction()
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until every write submitted so far has been committed,
+        for a reader that needs to see them."""
+        if current_thread() is self._thread:
+            return
+        self._check_no_pending_changes()
+        self._enqueue(_no_write, is_flush=True).result(timeout)
+        self._end_read_transaction()
+
+    def _check_no_pending_changes(self) -> None:
+        if has_app_context() and (
+            DB.session.new or DB.session.dirty or DB.session.deleted
+        ):
+            raise RuntimeError(
+                "The db session has changes of its own, "
+                "make them through the database writer instead"
+            )
+
+    def _end_read_transaction(self) -> None:
+        # the caller's db transaction reads the db as it was when it started,
+        # and the objects it loaded are from before the writes, end it so that
+        # the objects are loaded again, with the writes, when they are used.
+        # The caller only reads, so there is nothing to commit.
+        if has_app_context():
+            DB.session.rollback()
+
+    def _enqueue(self, write: Callable[[], Any], is_flush: bool = False) -> Future:
+        queued_write = _QueuedWrite(
+            write=write,
+            future=Future(),
+            app=current_app._get_current_object() if has_app_context() else None,
+            is_flush=is_flush,
+        )
+        with self._condition:
+            self._queue.append(queued_write)
+            self._start_thread()
+            self._condition.notify_all()
+        return queued_write.future
+
+    def _start_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = Thread(target=self._run, name="database_writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._queue) > 0)
+                commit_at = time.monotonic() + self.max_batch_delay_seconds
+                while len(self._queue) < self.max_batch_size and not any(
+                    queued_write.is_flush for queued_write in self._queue
+                ):
+                    remaining_seconds = commit_at - time.monotonic()
+                    if remaining_seconds <= 0:
+                        break
+                    self._condition.wait(remaining_seconds)
+                batch = self._queue[: self.max_batch_size]
+                self._queue = self._queue[self.max_batch_size:]
+
+            # the writes of a batch are made in the app context they were
+            # submitted from, there is only ever one app outside of the tests.
+            while len(batch) > 0:
+                app = batch[0].app
+                app_batch = [
+                    queued_write for queued_write in batch if queued_write.app is app
+                ]
+                batch = [
+                    queued_write
+                    for queued_write in batch
+                    if queued_write.app is not app
+                ]
+                with app.app_context() if app is not None else nullcontext():
+                    self._commit_batch(app_batch)
+
+    def _commit_batch(self, batch: List[_QueuedWrite]) -> None:
+        started_at = time.monotonic()
+        # writes submitted outside of an app have no db session to commit
+        is_db_write = has_app_context()
+        results = []
+        for queued_write in batch:
+            try:
+                with DB.session.begin_nested() if is_db_write else nullcontext():
+                    results.append((queued_write, queued_write.write(), None))
+            except Exception as e:
+                LOGGER.error("Error writing to the db", error=str(e))
+                results.append((queued_write, None, e))
+
+        if is_db_write:
+            try:
+                DB.session.commit()
+                self._commit_count += 1
+            except Exception as e:
+                DB.session.rollback()
+                LOGGER.error("Error committing writes to the db", error=str(e))
+                results = [
+                    (queued_write, None, error or e)
+                    for queued_write, _, error in results
+                ]
+            finally:
+                DB.session.remove()
+
+        for queued_write, result, error in results:
+            if error is not None:
+                queued_write.future.set_exception(error)
+            else:
+                queued_write.future.set_result(result)
+
+        writes = len(
+            [queued_write for queued_write in batch if not queued_write.is_flush]
+        )
+        if writes > 0:
+            LOGGER.debug(
+                "Committed db writes",
+                writes=writes,
+                seconds=round(time.monotonic() - started_at, 3),
+            )
+
+
+_database_writer: Optional[DatabaseWriter] = None
+
+
+def get_database_writer() -> DatabaseWriter:
+    """Get the shared database writer."""
+    global _database_writer
+    if _database_writer is None:
+        _database_writer = DatabaseWriter()
+    return _database_writer
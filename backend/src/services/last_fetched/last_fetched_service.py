@@ -13,7 +13,8 @@ class LastFetchedService:
     def update_last_fetched_outputs_type(
         self,
     ) -> None:
-        """Update the last fetched time for the outputs."""
+        """Update the last fetched time for the outputs,
+        made through the database writer."""
         timestamp = datetime.now()
         current_last_fetched_output = LastFetched.query.filter_by(
             type=LastFetchedType.OUTPUTS
@@ -25,7 +26,7 @@ class LastFetchedService:
                 type=LastFetchedType.OUTPUTS, timestamp=timestamp
             )
             DB.session.add(last_fetched_output)
-        DB.session.commit()
+        DB.session.flush()
 
     @classmethod
     def get_last_fetched_output_datetime(
@@ -43,7 +44,8 @@ class LastFetchedService:
     def update_last_fetched_transaction_type(
         self,
     ) -> None:
-        """Update the last fetched time for the transactions."""
+        """Update the last fetched time for the transactions,
+        made through the database writer."""
         timestamp = datetime.now()
         current_last_fetched_output = LastFetched.query.filter_by(
             type=LastFetchedType.TRANSACTIONS
@@ -55,7 +57,7 @@ class LastFetchedService:
                 type=LastFetchedType.TRANSACTIONS, timestamp=timestamp
             )
             DB.session.add(last_fetched_output)
-        DB.session.commit()
+        DB.session.flush()
 
     @classmethod
     def get_last_fetched_transaction_datetime(
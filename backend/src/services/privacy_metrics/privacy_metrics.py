@@ -1,4 +1,3 @@
-import asyncio
 from typing import Optional
 from bitcoinlib.transactions import Transaction
 from src.database import DB
@@ -7,6 +6,7 @@ from src.models.privacy_metric import PrivacyMetric, PrivacyMetricName
 from src.models.outputs import Output as OutputModel
 from datetime import datetime, timedelta
 from src.models.transaction import Transaction as TransactionModel
+from src.my_types.transactions import DecodedTransaction
 
 import structlog
 
@@ -29,10 +29,10 @@ class PrivacyMetricsService:
 
         results: dict[PrivacyMetricName, bool] = dict()
 
-        transaction_details = WalletService.get_transaction_details(txid)
-        transaction = asyncio.run(WalletService.get_transaction(txid))
         # Check that all outputs have already been fetched recently
         cls.ensure_recently_fetched_outputs()
+        transaction_details = WalletService.get_transaction_details(txid)
+        transaction = WalletService.get_decoded_transaction(txid)
 
         for privacy_metric in privacy_metrics:
             if privacy_metric == PrivacyMetricName.ANNOMINITY_SET:
@@ -118,7 +118,7 @@ class PrivacyMetricsService:
     @classmethod
     def analyze_annominity_set(
         cls,
-        transaction: Optional[Transaction],
+        transaction: Optional[Transaction | DecodedTransaction],
         desired_annominity_set: int = 2,
         allow_some_uneven_change: bool = True,
     ) -> bool:
@@ -368,7 +368,7 @@ class PrivacyMetricsService:
 
     @classmethod
     def analyze_no_round_number_payments(
-        cls, transaction: Optional[Transaction]
+        cls, transaction: Optional[Transaction | DecodedTransaction]
     ) -> bool:
         """Check if this transaction's change is easily detectable due to
         having a round number payment output and a non round number change
@@ -403,7 +403,7 @@ class PrivacyMetricsService:
     def analyze_same_script_types(
         cls,
         transaction_details: Optional[TransactionModel],
-        transaction: Optional[Transaction],
+        transaction: Optional[Transaction | DecodedTransaction],
     ) -> bool:
         """Analyze if the transaction is a spend to an output with a different
         script type than the user's input.
@@ -563,19 +563,18 @@ class PrivacyMetricsService:
             return True
 
         change_output_position = change_output.vout
-        all_change_outputs_count: int = WalletService.get_all_change_outputs_from_db(
-            None, "count"
+        change_output_position_counts = (
+            WalletService.get_change_output_position_counts()
         )
+        all_change_outputs_count = sum(change_output_position_counts.values())
 
         # this metric is only statistically relevant if the user has at least 8 change outputs
         if all_change_outputs_count < 8:
             # not statistically relevant enough to fail this metric
             return True
 
-        only_this_vout_change_outputs_count: int = (
-            WalletService.get_all_change_outputs_from_db(
-                change_output_position, "count"
-            )
+        only_this_vout_change_outputs_count = change_output_position_counts.get(
+            change_output_position, 0
         )
 
         percent_this_vout_is_change_position = (
@@ -588,7 +587,9 @@ class PrivacyMetricsService:
             return True
 
     @classmethod
-    def analyze_no_do_not_spend_utxos(cls, transaction: Optional[Transaction]) -> bool:
+    def analyze_no_do_not_spend_utxos(
+        cls, transaction: Optional[Transaction | DecodedTransaction]
+    ) -> bool:
         """Check that no inputs in this transaction come from outputs that were marked as do not spend
 
         If an input is used that was a utxo marked as do not spend then this metric fails.
@@ -615,7 +616,9 @@ class PrivacyMetricsService:
         return True
 
     @classmethod
-    def analyze_no_kyced_inputs(cls, transaction: Optional[Transaction]) -> bool:
+    def analyze_no_kyced_inputs(
+        cls, transaction: Optional[Transaction | DecodedTransaction]
+    ) -> bool:
         """Check that no inputs in this transaction come from outputs that were marked as being kyced.
 
         If an input is used that was a utxo marked as kyced then this metric fails.
@@ -0,0 +1,213 @@
+from os import path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+import sqlite3
+import time
+import zlib
+
+import structlog
+
+from src.utils.app_data import get_app_data_dir, is_testing_environment
+
+LOGGER = structlog.get_logger()
+
+RAW_TRANSACTION_CACHE_FILE_NAME = "raw_transaction_cache.db"
+DEFAULT_MAX_SIZE_BYTES = 256 * 1024 * 1024
+# an unconfirmed transaction can still be replaced or dropped from the mempool,
+# therefore it is refetched once its cache entry is older than this.
+DEFAULT_UNCONFIRMED_TTL_SECONDS = 60.0
+# evict down to this fraction of the max size so that every
+# insert after the cache fills up does not trigger another eviction.
+EVICTION_LOW_WATER_MARK = 0.9
+# stay well under sqlite's limit on the number of variables in a query
+MAX_QUERY_VARIABLES = 500
+
+
+class RawTransactionCache:
+    """A persistent txid -> raw transaction store, backed by a sqlite file.
+
+    A txid commits to the transaction's contents, therefore a confirmed
+    transaction can be served from the cache forever without asking
+    the electrum server again. Unconfirmed transactions are only served
+    until they are older than the unconfirmed_ttl_seconds, after which
+    they have to be refetched, and are upgraded to confirmed once the
+    caller knows they have been mined.
+
+    The raw transactions are stored zlib compressed and once the
+    compressed size of the cache goes over max_size_bytes the least
+    recently used transactions are evicted.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES,
+        unconfirmed_ttl_seconds: float = DEFAULT_UNCONFIRMED_TTL_SECONDS,
+    ):
+        self.db_path = db_path
+        self.max_size_bytes = max_size_bytes
+        self.unconfirmed_ttl_seconds = unconfirmed_ttl_seconds
+
+        self._lock = Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS raw_transactions (
+                    txid TEXT PRIMARY KEY,
+                    raw BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    is_confirmed INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE INDEX IF NOT EXISTS ix_raw_transactions_last_accessed_at
+                ON raw_transactions (last_accessed_at)
+                """
+            )
+
+    def get(self, txid: str) -> Optional[bytes]:
+        return self.get_many([txid]).get(txid)
+
+    def get_many(self, txids: Iterable[str]) -> Dict[str, bytes]:
+        """Get the raw transactions that are in the cache and still valid, keyed by txid."""
+        now = time.time()
+        unconfirmed_valid_after = now - self.unconfirmed_ttl_seconds
+        raw_transactions: Dict[str, bytes] = {}
+        with self._lock, self._connection:
+            for txids_chunk in _chunks(list(dict.fromkeys(txids))):
+                placeholders = ",".join("?" * len(txids_chunk))
+                rows = self._connection.execute(
+                    f"""
+                    SELECT txid, raw FROM raw_transactions
+                    WHERE txid IN ({placeholders})
+                    AND (is_confirmed = 1 OR fetched_at >= ?)
+                    """,
+                    [*txids_chunk, unconfirmed_valid_after],
+                ).fetchall()
+                for txid, compressed_raw in rows:
+                    try:
+                        raw_transactions[txid] = zlib.decompress(compressed_raw)
+                    except zlib.error:
+                        LOGGER.error("Corrupt raw transaction cache entry", txid=txid)
+
+            self._connection.executemany(
+                "UPDATE raw_transactions SET last_accessed_at = ? WHERE txid = ?",
+                [(now, txid) for txid in raw_transactions],
+            )
+
+        return raw_transactions
+
+    def put(self, txid: str, raw: bytes, is_confirmed: bool) -> None:
+        self.put_many([(txid, raw, is_confirmed)])
+
+    def put_many(self, transactions: Iterable[Tuple[str, bytes, bool]]) -> None:
+        """Add (txid, raw transaction, is_confirmed) entries to the cache.
+
+        An entry that is already confirmed in the cache stays confirmed."""
+        now = time.time()
+        rows = []
+        for txid, raw, is_confirmed in transactions:
+            compressed_raw = zlib.compress(raw)
+            rows.append(
+                (txid, compressed_raw, len(compressed_raw), int(is_confirmed), now, now)
+            )
+        if len(rows) == 0:
+            return
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                """
+                INSERT INTO raw_transactions
+                (txid, raw, size, is_confirmed, fetched_at, last_accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (txid) DO UPDATE SET
+                    raw = excluded.raw,
+                    size = excluded.size,
+                    is_confirmed = MAX(is_confirmed, excluded.is_confirmed),
+                    fetched_at = excluded.fetched_at,
+                    last_accessed_at = excluded.last_accessed_at
+                """,
+                rows,
+            )
+            self._evict_least_recently_used()
+
+    def mark_confirmed(self, txids: Iterable[str]) -> None:
+        """Mark cached transactions as confirmed so they never need to be refetched."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                """
+                UPDATE raw_transactions SET is_confirmed = 1
+                WHERE txid = ? AND is_confirmed = 0
+                """,
+                [(txid,) for txid in txids],
+            )
+
+    def total_size(self) -> int:
+        """The compressed size of every transaction in the cache, in bytes."""
+        with self._lock:
+            return self._total_size()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _total_size(self) -> int:
+        (total_size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM raw_transactions"
+        ).fetchone()
+        return total_size
+
+    def _evict_least_recently_used(self) -> None:
+        total_size = self._total_size()
+        if total_size <= self.max_size_bytes:
+            return
+
+        target_size = self.max_size_bytes * EVICTION_LOW_WATER_MARK
+        txids_to_evict: List[Tuple[str]] = []
+        rows = self._connection.execute(
+            "SELECT txid, size FROM raw_transactions ORDER BY last_accessed_at ASC"
+        )
+        for txid, size in rows:
+            if total_size <= target_size:
+                break
+            txids_to_evict.append((txid,))
+            total_size -= size
+
+        self._connection.executemany(
+            "DELETE FROM raw_transactions WHERE txid = ?", txids_to_evict
+        )
+        LOGGER.info(
+            "Evicted raw transactions from the cache",
+            evicted=len(txids_to_evict),
+            size=total_size,
+        )
+
+
+def _chunks(txids: List[str]) -> List[List[str]]:
+    return [
+        txids[chunk_start: chunk_start + MAX_QUERY_VARIABLES]
+        for chunk_start in range(0, len(txids), MAX_QUERY_VARIABLES)
+    ]
+
+
+_raw_transaction_cache: Optional[RawTransactionCache] = None
+
+
+def get_raw_transaction_cache() -> RawTransactionCache:
+    """Get the shared raw transaction cache, opening it if needed.
+
+    While testing the cache is kept in memory instead of the app data dir."""
+    global _raw_transaction_cache
+    if _raw_transaction_cache is None:
+        db_path = (
+            ":memory:"
+            if is_testing_environment()
+            else path.join(get_app_data_dir(), RAW_TRANSACTION_CACHE_FILE_NAME)
+        )
+        _raw_transaction_cache = RawTransactionCache(db_path)
+    return _raw_transaction_cache
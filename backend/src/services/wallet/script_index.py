@@ -0,0 +1,85 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+import bdkpython as bdk
+
+from src.services.wallet.wallet_scanner import WalletScanResult, get_scripthash
+
+
+class ScriptIndex:
+    """The keychain and index of each of the wallet's derived scripts,
+    keyed by the script's electrum scripthash, so that checking whether a
+    script is the wallet's is a dictionary lookup instead of a call into bdk.
+
+    The index covers every script of each keychain up to gap scripts past the
+    last used one, like a scan or a bdk sync does, and any script of the wallet
+    that is in one of its transactions is used, therefore a script that is not
+    in the index is not the wallet's. The index is rebuilt whenever a sync
+    finds that the wallet's transactions changed, so it grows as the wallet
+    starts using scripts further along a keychain.
+    """
+
+    def __init__(
+        self,
+        wallet_id: Optional[str],
+        derivations: Dict[str, Tuple[bdk.KeychainKind, int]],
+    ):
+        self.wallet_id = wallet_id
+        self._derivations = derivations
+
+    @classmethod
+    def from_scan_result(
+        cls, wallet_id: Optional[str], scan_result: WalletScanResult
+    ) -> "ScriptIndex":
+        return cls(
+            wallet_id,
+            {
+                script.scripthash: (script.keychain, script.index)
+                for script in scan_result.get_scripts()
+            },
+        )
+
+    @classmethod
+    def from_wallet(
+        cls,
+        wallet_id: Optional[str],
+        wallet: bdk.Wallet,
+        keychains: List[bdk.KeychainKind],
+        gap: int,
+    ) -> "ScriptIndex":
+        """Derive the scripts of the synced bdk wallet's keychains,
+        the scripts in the outputs of its transactions are the used ones."""
+        used_scripts: Set[bytes] = set()
+        for transaction in wallet.list_transactions(True):
+            if transaction.transaction is None:
+                continue
+            for output in transaction.transaction.output():
+                used_scripts.add(bytes(output.script_pubkey.to_bytes()))
+
+        derivations: Dict[str, Tuple[bdk.KeychainKind, int]] = {}
+        for keychain in keychains:
+            get_address = (
+                wallet.get_address
+                if keychain == bdk.KeychainKind.EXTERNAL
+                else wallet.get_internal_address
+            )
+            last_used_index = -1
+            index = 0
+            while index <= last_used_index + gap:
+                address_info = get_address(bdk.AddressIndex.PEEK(index))
+                script = bytes(address_info.address.script_pubkey().to_bytes())
+                derivations[get_scripthash(script)] = (keychain, index)
+                if script in used_scripts:
+                    last_used_index = index
+                index += 1
+        return cls(wallet_id, derivations)
+
+    def __len__(self) -> int:
+        return len(self._derivations)
+
+    def is_mine(self, script: bytes) -> bool:
+        return get_scripthash(script) in self._derivations
+
+    def get_derivation(self, script: bytes) -> Optional[Tuple[bdk.KeychainKind, int]]:
+        """Get the keychain and index the script was derived at,
+        None if it is not one of the wallet's scripts."""
+        return self._derivations.get(get_scripthash(script))
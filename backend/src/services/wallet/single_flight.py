@@ -0,0 +1,72 @@
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, TypeVar
+import asyncio
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class SingleFlight(Generic[K, V]):
+    """Coalesce fetches of the same key so that each key is only fetched once.
+
+    A caller asking for a key that is already being fetched awaits the
+    in flight fetch instead of starting another one, and every fetched value
+    is remembered, so later callers get it without fetching at all.
+    Keys the fetch did not return a value for are not remembered
+    and are fetched again by the next caller.
+
+    Create one per unit of work (for example a single get_all_transactions run)
+    so that the remembered values do not go stale.
+    """
+
+    def __init__(self):
+        self._values: Dict[K, V] = {}
+        self._inflight: Dict[K, asyncio.Future] = {}
+
+    async def get_many(
+        self,
+        keys: List[K],
+        fetch_many: Callable[[List[K]], Awaitable[Dict[K, V]]],
+    ) -> Dict[K, V]:
+        """Get the value of every key, only calling fetch_many for keys
+        that are neither remembered nor already being fetched.
+
+        Keys that could not be fetched are left out of the result."""
+        values: Dict[K, V] = {}
+        waiting_for: Dict[K, asyncio.Future] = {}
+        keys_to_fetch: List[K] = []
+        for key in dict.fromkeys(keys):
+            if key in self._values:
+                values[key] = self._values[key]
+            elif key in self._inflight:
+                waiting_for[key] = self._inflight[key]
+            else:
+                keys_to_fetch.append(key)
+
+        if len(keys_to_fetch) > 0:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in keys_to_fetch}
+            self._inflight.update(futures)
+            fetched_values: Dict[K, V] = {}
+            try:
+                fetched_values = await fetch_many(keys_to_fetch)
+            finally:
+                for key, future in futures.items():
+                    self._inflight.pop(key, None)
+                    if key in fetched_values:
+                        self._values[key] = fetched_values[key]
+                    # a key that failed to fetch resolves to None for the waiters,
+                    # it is not remembered so the next call fetches it again.
+                    if not future.done():
+                        future.set_result(fetched_values.get(key))
+            for key in keys_to_fetch:
+                if key in fetched_values:
+                    values[key] = fetched_values[key]
+
+        for key, future in waiting_for.items():
+            # shield the shared future so a cancelled caller does not
+            # cancel it for every other caller waiting on it.
+            value = await asyncio.shield(future)
+            if value is not None:
+                values[key] = value
+
+        return values
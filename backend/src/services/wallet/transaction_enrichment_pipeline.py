@@ -0,0 +1,336 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Type,
+)
+import asyncio
+import time
+
+from bitcoinlib.transactions import Transaction
+import structlog
+
+from src.services.database.database_writer import get_database_writer
+from src.services.wallet.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    import bdkpython as bdk
+    from src.services.wallet.wallet import WalletService
+
+LOGGER = structlog.get_logger()
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_MAX_QUEUE_SIZE = 4
+DEFAULT_PARSE_WORKERS = 2
+DEFAULT_ENRICH_WORKERS = 4
+DEFAULT_WRITE_BATCH_SIZE = 500
+
+# put on a stage's queue once for each of its workers to stop them
+_STAGE_DONE = object()
+
+
+@dataclass
+class PipelineStageStats:
+    name: str
+    items: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def log(self) -> None:
+        elapsed_seconds = time.monotonic() - self.started_at
+        LOGGER.info(
+            "Transaction enrichment stage finished",
+            stage=self.name,
+            items=self.items,
+            errors=self.errors,
+            busy_seconds=round(self.busy_seconds, 3),
+            items_per_second=(
+                round(self.items / elapsed_seconds, 1) if elapsed_seconds > 0 else None
+            ),
+        )
+
+
+@dataclass
+class WriteBatch:
+    all_inputs: List[dict] = field(default_factory=list)
+    transactions: List["bdk.TransactionDetails"] = field(default_factory=list)
+    decoded_transactions: List[Transaction] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.all_inputs) + len(self.transactions)
+
+    def extend(self, other: "WriteBatch") -> None:
+        self.all_inputs.extend(other.all_inputs)
+        self.transactions.extend(other.transactions)
+        self.decoded_transactions.extend(other.decoded_transactions)
+
+
+class TransactionEnrichmentPipeline:
+    """Enrich the wallet's transactions in three overlapping stages.
+
+    1. load: parse chunks of the wallet's raw transactions in a worker pool,
+       fetching any bdk did not have the raw bytes for.
+    2. enrich: value every input, fetching the foreign parent transactions
+       that are not cached in the db yet, and mark the outputs that are the wallet's.
+    3. write: save the resolved inputs, the transactions and their decoded
+       inputs and outputs to the db in batches, through the database writer
+       and therefore off of the event loop.
+
+    The stages are connected by bounded queues, so a slow stage applies
+    backpressure to the stages before it instead of letting work pile up
+    in memory, and a db commit no longer stalls the in flight electrum fetches.
+
+    Every transaction, wallet or parent, is loaded through a single SingleFlight,
+    so each is only fetched and parsed once per run.
+    """
+
+    def __init__(
+        self,
+        wallet_service: Type["WalletService"],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        parse_workers: int = DEFAULT_PARSE_WORKERS,
+        enrich_workers: int = DEFAULT_ENRICH_WORKERS,
+        write_batch_size: int = DEFAULT_WRITE_BATCH_SIZE,
+    ):
+        self.wallet_service = wallet_service
+        self.chunk_size = chunk_size
+        self.max_queue_size = max_queue_size
+        self.parse_workers = parse_workers
+        self.enrich_workers = enrich_workers
+        self.write_batch_size = write_batch_size
+
+        self._transaction_details: Dict[str, "bdk.TransactionDetails"] = {}
+        self._raw_wallet_transactions: Dict[str, bytes] = {}
+        self._confirmed_txids: Set[str] = set()
+        self._transactions: SingleFlight[str, Transaction] = SingleFlight()
+        self._parse_executor: Optional[ThreadPoolExecutor] = None
+
+    async def run(
+        self, transactions: List["bdk.TransactionDetails"]
+    ) -> Dict[str, Transaction]:
+        """Enrich and save the wallet's transactions.
+
+        Return the enriched transactions keyed by txid, once every
+        db write has finished."""
+        self._transaction_details = {
+            transaction.txid: transaction for transaction in transactions
+        }
+        self._confirmed_txids = {
+            transaction.txid
+            for transaction in transactions
+            if transaction.confirmation_time is not None
+        }
+        self._raw_wallet_transactions = self.wallet_service.get_bdk_raw_transactions(
+            transactions
+        )
+        txids = list(self._transaction_details.keys())
+        txid_chunks = [
+            txids[chunk_start: chunk_start + self.chunk_size]
+            for chunk_start in range(0, len(txids), self.chunk_size)
+        ]
+
+        load_stats = PipelineStageStats("load")
+        enrich_stats = PipelineStageStats("enrich")
+        write_stats = PipelineStageStats("write")
+        load_queue: asyncio.Queue = asyncio.Queue(self.max_queue_size)
+        enrich_queue: asyncio.Queue = asyncio.Queue(self.max_queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(self.max_queue_size)
+        enriched_transactions: Dict[str, Transaction] = {}
+
+        async def load_chunk(txid_chunk: List[str]) -> Dict[str, Transaction]:
+            return await self._transactions.get_many(
+                txid_chunk, self._load_transactions
+            )
+
+        async def enrich_chunk(
+            wallet_transactions: Dict[str, Transaction]
+        ) -> WriteBatch:
+            write_batch = await self._enrich_transactions(wallet_transactions)
+            enriched_transactions.update(wallet_transactions)
+            return write_batch
+
+        self._parse_executor = ThreadPoolExecutor(
+            self.parse_workers, thread_name_prefix="transaction_parser"
+        )
+        load_tasks = [
+            asyncio.create_task(
+                self._stage_worker(load_stats, load_queue, load_chunk, enrich_queue)
+            )
+            for _ in range(self.parse_workers)
+        ]
+        enrich_tasks = [
+            asyncio.create_task(
+                self._stage_worker(
+                    enrich_stats, enrich_queue, enrich_chunk, write_queue)
+            )
+            for _ in range(self.enrich_workers)
+        ]
+        write_task = asyncio.create_task(
+            self._write_worker(write_stats, write_queue))
+        try:
+            for txid_chunk in txid_chunks:
+                # blocks while the load stage is behind
+                await load_queue.put(txid_chunk)
+            await self._finish_stage(load_queue, load_tasks)
+            await self._finish_stage(enrich_queue, enrich_tasks)
+            await self._finish_stage(write_queue, [write_task])
+        finally:
+            for task in [*load_tasks, *enrich_tasks, write_task]:
+                task.cancel()
+            self._parse_executor.shutdown(wait=False)
+
+        for stats in [load_stats, enrich_stats, write_stats]:
+            stats.log()
+        return enriched_transactions
+
+    async def _stage_worker(
+        self,
+        stats: PipelineStageStats,
+        queue: asyncio.Queue,
+        handle: Callable[[Any], Awaitable[Any]],
+        next_queue: asyncio.Queue,
+    ) -> None:
+        while True:
+            item = await queue.get()
+            if item is _STAGE_DONE:
+                return
+
+            started_at = time.monotonic()
+            try:
+                result = await handle(item)
+            except Exception as e:
+                stats.errors += 1
+                LOGGER.error(f"Error in transaction {stats.name} stage {e}")
+                continue
+            finally:
+                stats.busy_seconds += time.monotonic() - started_at
+            stats.items += len(item)
+            # blocks while the next stage is behind
+            await next_queue.put(result)
+
+    async def _write_worker(
+        self, stats: PipelineStageStats, queue: asyncio.Queue
+    ) -> None:
+        """Combine the queued write batches, writing once the batch is
+        large enough or there is nothing else queued."""
+        pending = WriteBatch()
+        is_done = False
+        while not is_done:
+            item = await queue.get()
+            while True:
+                if item is _STAGE_DONE:
+                    is_done = True
+                    break
+                pending.extend(item)
+                if len(pending) >= self.write_batch_size or queue.empty():
+                    break
+                item = queue.get_nowait()
+
+            if len(pending) == 0:
+                continue
+            started_at = time.monotonic()
+            try:
+                await self._write(pending)
+                stats.items += len(pending)
+            except Exception as e:
+                stats.errors += 1
+                LOGGER.error(f"Error in transaction write stage {e}")
+            finally:
+                stats.busy_seconds += time.monotonic() - started_at
+            pending = WriteBatch()
+
+    async def _finish_stage(
+        self, queue: asyncio.Queue, tasks: List[asyncio.Task]
+    ) -> None:
+        for _ in tasks:
+            await queue.put(_STAGE_DONE)
+        await asyncio.gather(*tasks)
+
+    async def _load_transactions(self, txids: List[str]) -> Dict[str, Transaction]:
+        """Parse the transactions in the worker pool, using bdk's raw bytes
+        when it has them and fetching the rest."""
+        raw_transactions = {
+            txid: self._raw_wallet_transactions[txid]
+            for txid in txids
+            if txid in self._raw_wallet_transactions
+        }
+        missing_txids = [txid for txid in txids if txid not in raw_transactions]
+        if len(missing_txids) > 0:
+            raw_transactions.update(
+                await self.wallet_service.get_raw_transactions(
+                    missing_txids, self._confirmed_txids
+                )
+            )
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self._parse_executor,
+            self.wallet_service.parse_raw_transactions,
+            raw_transactions,
+        )
+
+    async def _enrich_transactions(
+        self, wallet_transactions: Dict[str, Transaction]
+    ) -> WriteBatch:
+        # inputs that are not in the db yet need the tx that created them
+        inputs_that_need_to_be_fetched_by_txid = (
+            self.wallet_service.update_input_values_from_db(wallet_transactions)
+        )
+        inputs_that_need_to_be_fetched = []
+        for txid, transaction_inputs in inputs_that_need_to_be_fetched_by_txid.items():
+            inputs_that_need_to_be_fetched.extend(transaction_inputs)
+            if txid in self._confirmed_txids:
+                # the parent of a confirmed transaction must be confirmed as well
+                self._confirmed_txids.update(
+                    input_dict["prev_txid"] for input_dict, _ in transaction_inputs
+                )
+
+        input_transactions = await self._transactions.get_many(
+            [input_dict["prev_txid"] for input_dict, _ in inputs_that_need_to_be_fetched],
+            self._load_transactions,
+        )
+
+        write_batch = WriteBatch()
+        for input_dict, input in inputs_that_need_to_be_fetched:
+            inputs_tx = input_transactions.get(input_dict["prev_txid"])
+            if inputs_tx is None:
+                LOGGER.error(f"Error getting input tx {input_dict['prev_txid']}")
+                continue
+            resolved_input = self.wallet_service.update_input_amount_and_is_mine_value(
+                input_dict, input, inputs_tx
+            )
+            if resolved_input is not None:
+                write_batch.all_inputs.append(resolved_input)
+
+        for txid, transaction in wallet_transactions.items():
+            transaction_details = self._transaction_details[txid]
+            self.wallet_service.update_all_tx_details_for_tx(
+                transaction_details, transaction
+            )
+            write_batch.transactions.append(transaction_details)
+            write_batch.decoded_transactions.append(transaction)
+
+        return write_batch
+
+    async def _write(self, write_batch: WriteBatch) -> None:
+        """Write the batch to the db through the database writer,
+        waiting until it has been committed."""
+        await asyncio.wrap_future(
+            get_database_writer().submit(lambda: self._write_batch(write_batch))
+        )
+
+    def _write_batch(self, write_batch: WriteBatch) -> None:
+        # the transactions first since the outputs reference them
+        self.wallet_service.add_transactions_to_db(write_batch.transactions)
+        self.wallet_service.add_decoded_transactions_to_db(
+            write_batch.decoded_transactions
+        )
+        self.wallet_service.add_all_inputs_to_db(write_batch.all_inputs)
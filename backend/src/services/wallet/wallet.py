@@ -1,22 +1,33 @@
+from contextlib import closing, nullcontext
 from dataclasses import dataclass
+from functools import partial
 from datetime import datetime
+from os import makedirs, path, remove
+import sqlite3
 import bdkpython as bdk
-from sqlalchemy.orm import aliased
+from sqlalchemy.orm import aliased, joinedload, selectinload
 from bitcoinlib.transactions import Output, Transaction, Input
-from sqlalchemy import func, or_
+from sqlalchemy import bindparam, func, or_, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from src.models.all_inputs import AllInput
+from src.models.change_output_position import ChangeOutputPosition
+from src.models.last_fetched import LastFetched
 from src.models.transaction import Transaction as TransactionModel
 from src.models.label import Label
 from src.models.outputs import Output as OutputModel
-from typing import Literal, Optional, List, Dict, Tuple
-from src.api import electrum_request, parse_electrum_url
+from src.models.tx_inputs import TxInput
+from src.models.tx_outputs import TxOutput
+from src.models.script_status import ScriptStatus
+from typing import Callable, Literal, Optional, List, Dict, Set, Tuple
+from src.api import electrum_request, electrum_raw_batch_request, parse_electrum_url
 import asyncio
 
 from src.api.electrum import (
     ElectrumMethod,
     GetTransactionsRequestParams,
 )
-from src.database import DB
+from src.api.electrum_pool import close_connection_pools
+from src.database import DB, get_current_wallet_id, set_current_wallet_id
 from src.models.wallet import Wallet
 from src.my_types import (
     ScriptType,
@@ -24,11 +35,32 @@ from src.my_types import (
     GetUtxosRequestDto,
 )
 from src.my_types.controller_types.utxos_dtos import (
+    OutputDetailDto,
     OutputLabelDto,
     PopulateOutputLabelsRequestDto,
+    TransactionDetailDto,
 )
-from src.my_types.transactions import LiveWalletOutput
+from src.my_types.transactions import DecodedTransaction
+from src.services.database.database_writer import get_database_writer
 from src.services.last_fetched.last_fetched_service import LastFetchedService
+from src.services.wallet.raw_transaction_cache import get_raw_transaction_cache
+from src.services.wallet.script_index import ScriptIndex
+from src.services.wallet.transaction_enrichment_pipeline import (
+    TransactionEnrichmentPipeline,
+)
+from src.services.wallet.wallet_history import (
+    WalletHistorySnapshot,
+    get_wallet_history,
+)
+from src.services.wallet.wallet_scanner import (
+    ScannedScript,
+    ScriptHistoryItem,
+    WalletScanner,
+    WalletScanResult,
+)
+from src.services.wallet.wallet_events import WalletEvent, get_wallet_event_stream
+from src.services.wallet.wallet_subscriber import get_wallet_subscriber
+from src.services.wallet.wallet_sync import WalletSyncJob, get_wallet_sync_worker
 from src.services.wallet.raw_output_script_examples import (
     p2pkh_raw_output_script,
     p2pk_raw_output_script,
@@ -36,12 +68,24 @@ from src.services.wallet.raw_output_script_examples import (
     p2wpkh_raw_output_script,
     p2wsh_raw_output_script,
 )
+from src.utils.app_data import get_app_data_dir, is_testing_environment
 from dependency_injector.wiring import inject
+from flask import current_app, has_app_context
 
 import structlog
 
 LOGGER = structlog.get_logger()
 
+# stay under sqlite's default limit of 999 variables in a single query
+MAX_QUERY_VARIABLES = 900
+
+# the bdk databases of the connected wallets, inside of the app data dir
+BDK_WALLETS_DIR_NAME = "bdk_wallets"
+
+# never let a fast imported wallet's stop gap drop below the usual bip44 gap limit,
+# so that scripts handed out after the scan are still found.
+MIN_FAST_IMPORT_STOP_GAP = 20
+
 
 @dataclass(frozen=True)
 class BuildTransactionResponseType:
@@ -67,6 +111,12 @@ class WalletService:
 
     wallet: Optional[bdk.Wallet] = None
     wallet_id: Optional[str] = None
+    # the wallet's scanned scripts, see is_mine
+    script_index: Optional[ScriptIndex] = None
+    # the bdk database files of the connected wallet
+    # and of the wallet being synced, see get_wallet_database_config
+    wallet_database_path: Optional[str] = None
+    syncing_wallet_database_path: Optional[str] = None
 
     def __init__(
         self,
@@ -81,22 +131,69 @@ class WalletService:
         network: bdk.Network,
         electrum_url: str,
         stop_gap: Optional[int] = 100,
+        birthday_height: Optional[int] = None,
+        fast_import: bool = False,
     ):
         """Store the wallet details in the database.
         There should ever only be one wallet in the db at a time. If a new wallet is created, the old one should be removed.
+
+        The data already stored for a wallet is kept when another one is created,
+        so that it is reused if the wallet is opened again, see remove_wallet.
         """
         if Wallet.get_current_wallet():
             cls.remove_global_wallet_and_details()
 
         new_wallet = Wallet(
+            id=Wallet.get_wallet_id(descriptor, change_descriptor, network.value),
             descriptor=descriptor,
             change_descriptor=change_descriptor,
             network=network.value,
             electrum_url=electrum_url,
             stop_gap=stop_gap,
+            birthday_height=birthday_height,
+            fast_import=fast_import,
         )
         DB.session.add(new_wallet)
         DB.session.commit()
+        set_current_wallet_id(new_wallet.id)
+
+    @classmethod
+    def remove_wallet(cls):
+        """Remove the current wallet along with every piece of data stored for it."""
+        # so that a write of the sync does not add data back once it is removed
+        get_database_writer().flush()
+        wallet_details = Wallet.get_current_wallet()
+        # the wallet's data is scoped to the current wallet,
+        # therefore remove it before the wallet details.
+        cls.remove_output_and_related_label_data()
+        if wallet_details is not None:
+            DB.session.query(LastFetched).delete()
+            DB.session.query(ScriptStatus).filter(
+                ScriptStatus.wallet_id == wallet_details.id
+            ).delete()
+            DB.session.commit()
+        cls.remove_global_wallet_and_details()
+
+        if wallet_details is None or is_testing_environment():
+            # the bdk database is kept in memory while testing
+            return
+        for is_spare in [False, True]:
+            database_path = cls.get_wallet_database_path(
+                wallet_details.descriptor,
+                wallet_details.change_descriptor,
+                wallet_details.network,
+                is_spare,
+            )
+            if not path.exists(database_path):
+                continue
+            try:
+                remove(database_path)
+            except OSError as e:
+                LOGGER.error(
+                    "Could not remove the bdk wallet database",
+                    path=database_path,
+                    error=str(e),
+                )
 
     @classmethod
     def remove_output_and_related_label_data(cls):
@@ -114,15 +211,34 @@ class WalletService:
             DB.session.flush()
         # remove all rows in the OutputModel table
         DB.session.query(OutputModel).delete()
+        DB.session.query(ChangeOutputPosition).delete()
         DB.session.query(AllInput).delete()
+        # remove the decoded wallet history
+        DB.session.query(TxInput).delete()
+        DB.session.query(TxOutput).delete()
+        DB.session.query(TransactionModel).delete()
         DB.session.commit()
+        get_wallet_history().invalidate()
 
     @classmethod
     def remove_global_wallet_and_details(cls):
+        """Disconnect the current wallet and remove its details,
+        the data stored for it is kept, see remove_wallet."""
+        # the queued writes are scoped to the current wallet,
+        # therefore they have to be made before it changes.
+        get_database_writer().flush()
         DB.session.query(Wallet).delete()
         DB.session.commit()
+        set_current_wallet_id(None)
         cls.wallet = None
         cls.wallet_id = None
+        cls.script_index = None
+        cls.wallet_database_path = None
+        get_wallet_history().invalidate()
+        get_wallet_sync_worker().clear_wallet()
+        get_wallet_subscriber().clear()
+        # the next wallet may use a different electrum server
+        close_connection_pools()
 
     @classmethod
     @inject
@@ -156,12 +272,108 @@ class WalletService:
             )
             raise Exception("No wallet details in the database")
 
+        job = cls.start_wallet_sync(wallet_details)
+        # there is no synced state of this wallet to serve yet,
+        # therefore wait for its first sync to finish.
+        finished_job = get_wallet_sync_worker().wait(job.id)
+        if cls.wallet is None or cls.wallet_id != wallet_details_id:
+            raise Exception(
+                f"Error syncing the wallet: {finished_job.error if finished_job else None}"
+            )
+
+        return cls.wallet
+
+    @classmethod
+    def start_wallet_sync(
+        cls, wallet_details: Optional[Wallet] = None
+    ) -> WalletSyncJob:
+        """Start syncing the wallet in the database in the background,
+        returning the sync job without waiting for it to finish.
+
+        Once the sync is done the synced bdk wallet becomes the connected wallet."""
+        if wallet_details is None:
+            wallet_details = Wallet.get_current_wallet()
+        if wallet_details is None:
+            raise Exception("No wallet details in the database")
+
+        # the wallet is opened in the sync thread, so read the details now
         descriptor = wallet_details.descriptor
         change_descriptor = wallet_details.change_descriptor
         network = wallet_details.network
         electrum_url = wallet_details.electrum_url
         stop_gap = wallet_details.stop_gap
+        birthday_height = wallet_details.birthday_height
+        fast_import = wallet_details.fast_import
+
+        wallet_id = wallet_details.id
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def open_wallet() -> Optional[Tuple[bdk.Wallet, bdk.Blockchain]]:
+            scan_result = None
+            if fast_import:
+                # the scanned scripts are kept in the db, whose session is
+                # scoped to the app context, therefore the sync thread needs its own.
+                with app.app_context() if app is not None else nullcontext():
+                    scan_result = cls.refresh_scanned_scripts(
+                        wallet_id,
+                        descriptor,
+                        change_descriptor,
+                        network,
+                        electrum_url,
+                        stop_gap,
+                        birthday_height,
+                    )
+            if scan_result is not None:
+                cls.script_index = ScriptIndex.from_scan_result(wallet_id, scan_result)
+            cls.subscribe_to_wallet_changes(electrum_url, scan_result)
+
+            if (
+                scan_result is not None
+                and scan_result.is_unchanged
+                and cls.wallet is not None
+                and cls.wallet_id == wallet_id
+            ):
+                # none of the wallet's scripts changed since the last sync,
+                # therefore the connected wallet is still up to date.
+                return None
+
+            wallet_stop_gap = stop_gap
+            if scan_result is not None:
+                # bdk only has to walk as far past the used scripts as the scan needed to
+                wallet_stop_gap = scan_result.get_required_stop_gap(
+                    MIN_FAST_IMPORT_STOP_GAP
+                )
+            return cls.open_wallet(
+                descriptor, change_descriptor, network, electrum_url, wallet_stop_gap
+            )
+
+        LOGGER.info(
+            f"Connecting a new wallet to electrum server {wallet_details.id}")
+
+        keychains = [bdk.KeychainKind.EXTERNAL]
+        if change_descriptor:
+            keychains.append(bdk.KeychainKind.INTERNAL)
+
+        def index_scripts(wallet: bdk.Wallet) -> ScriptIndex:
+            return ScriptIndex.from_wallet(wallet_id, wallet, keychains, stop_gap)
+
+        return get_wallet_sync_worker().set_wallet(
+            wallet_details.id,
+            open_wallet,
+            # the scripts of a fast imported wallet are indexed from its scan
+            partial(
+                cls.set_synced_wallet,
+                index_scripts=None if fast_import else index_scripts,
+            ),
+        )
 
+    @classmethod
+    def create_bdk_descriptors(
+        cls,
+        descriptor: str,
+        change_descriptor: Optional[str],
+        network: int,
+    ) -> Tuple[bdk.Descriptor, Optional[bdk.Descriptor]]:
         wallet_descriptor = bdk.Descriptor(
             descriptor, bdk.Network._value2member_map_[network]
         )
@@ -172,8 +384,25 @@ class WalletService:
             if change_descriptor
             else None
         )
+        return (wallet_descriptor, wallet_change_descriptor)
 
-        db_config = bdk.DatabaseConfig.MEMORY()
+    @classmethod
+    def open_wallet(
+        cls,
+        descriptor: str,
+        change_descriptor: Optional[str],
+        network: int,
+        electrum_url: str,
+        stop_gap: int,
+    ) -> Tuple[bdk.Wallet, bdk.Blockchain]:
+        """Open the bdk wallet and the electrum blockchain to sync it with."""
+        wallet_descriptor, wallet_change_descriptor = cls.create_bdk_descriptors(
+            descriptor, change_descriptor, network
+        )
+
+        db_config = cls.get_wallet_database_config(
+            descriptor, change_descriptor, network
+        )
         cls.url = electrum_url
 
         blockchain_config = bdk.BlockchainConfig.ELECTRUM(
@@ -181,7 +410,6 @@ class WalletService:
         )
 
         blockchain = bdk.Blockchain(blockchain_config)
-        cls.blockchain = blockchain
 
         wallet = bdk.Wallet(
             descriptor=wallet_descriptor,
@@ -190,16 +418,313 @@ class WalletService:
             database_config=db_config,
         )
 
-        LOGGER.info(
-            f"Connecting a new wallet to electrum server {wallet_details_id}")
         LOGGER.info(f"xpub {wallet_descriptor.as_string()}")
 
-        wallet.sync(blockchain, None)
+        return (wallet, blockchain)
+
+    @classmethod
+    def scan_wallet(
+        cls,
+        descriptor: str,
+        change_descriptor: Optional[str],
+        network: int,
+        electrum_url: str,
+        gap: int,
+        birthday_height: Optional[int] = None,
+        known_scripts: Optional[List[ScannedScript]] = None,
+    ) -> WalletScanResult:
+        """Find the wallet's used scripts with a WalletScanner,
+        which asks electrum for their history in much larger batches than bdk does."""
+        url, port = parse_electrum_url(electrum_url)
+        if url is None or port is None:
+            raise ValueError(f"Can not scan the wallet with electrum url {electrum_url}")
+
+        wallet_descriptor, wallet_change_descriptor = cls.create_bdk_descriptors(
+            descriptor, change_descriptor, network
+        )
+        # only used to derive the scripts, therefore it is never synced
+        derive_wallet = bdk.Wallet(
+            descriptor=wallet_descriptor,
+            change_descriptor=wallet_change_descriptor,
+            network=bdk.Network._value2member_map_[network],
+            database_config=bdk.DatabaseConfig.MEMORY(),
+        )
+
+        def derive_script(keychain: bdk.KeychainKind, index: int) -> bytes:
+            get_address = (
+                derive_wallet.get_address
+                if keychain == bdk.KeychainKind.EXTERNAL
+                else derive_wallet.get_internal_address
+            )
+            address_info = get_address(bdk.AddressIndex.PEEK(index))
+            return bytes(address_info.address.script_pubkey().to_bytes())
+
+        keychains = [bdk.KeychainKind.EXTERNAL]
+        if wallet_change_descriptor is not None:
+            keychains.append(bdk.KeychainKind.INTERNAL)
+
+        scanner = WalletScanner(
+            url, int(port), derive_script, gap, birthday_height=birthday_height
+        )
+        return asyncio.run(scanner.scan(keychains, known_scripts))
 
+    @classmethod
+    def refresh_scanned_scripts(
+        cls,
+        wallet_id: str,
+        descriptor: str,
+        change_descriptor: Optional[str],
+        network: int,
+        electrum_url: str,
+        gap: int,
+        birthday_height: Optional[int] = None,
+    ) -> Optional[WalletScanResult]:
+        """Rescan the wallet's scripts, only refetching the history of the
+        scripts whose electrum status changed since they were last scanned,
+        and save the scan to the db.
+
+        Return None if the wallet could not be scanned."""
+        try:
+            known_scripts = cls.get_scanned_scripts(wallet_id)
+            scan_result = cls.scan_wallet(
+                descriptor,
+                change_descriptor,
+                network,
+                electrum_url,
+                gap,
+                birthday_height,
+                known_scripts,
+            )
+        except Exception as e:
+            LOGGER.error(f"Error scanning the wallet's scripts {e}")
+            return None
+
+        if not scan_result.is_unchanged:
+            get_database_writer().submit(
+                lambda: cls.save_scanned_scripts(wallet_id, scan_result)
+            )
+        return scan_result
+
+    @classmethod
+    def get_scanned_scripts(cls, wallet_id: str) -> List[ScannedScript]:
+        """Get the wallet's scripts as of their last scan."""
+        script_statuses = (
+            DB.session.query(ScriptStatus)
+            .filter(ScriptStatus.wallet_id == wallet_id)
+            .order_by(ScriptStatus.keychain, ScriptStatus.index)
+            .all()
+        )
+        return [
+            ScannedScript(
+                keychain=bdk.KeychainKind[script_status.keychain],
+                index=script_status.index,
+                scripthash=script_status.scripthash,
+                status=script_status.status,
+                history=tuple(
+                    ScriptHistoryItem(txid=item["tx_hash"], height=item["height"])
+                    for item in script_status.history
+                ),
+            )
+            for script_status in script_statuses
+        ]
+
+    @classmethod
+    def save_scanned_scripts(cls, wallet_id: str, scan_result: WalletScanResult) -> None:
+        """Replace the wallet's scanned scripts in the db with the scan's,
+        made through the database writer."""
+        DB.session.query(ScriptStatus).filter(
+            ScriptStatus.wallet_id == wallet_id
+        ).delete()
+        DB.session.execute(
+            sqlite_insert(ScriptStatus),
+            [
+                {
+                    "wallet_id": wallet_id,
+                    "keychain": script.keychain.name,
+                    "index": script.index,
+                    "scripthash": script.scripthash,
+                    "status": script.status,
+                    "history": [
+                        {"tx_hash": item.txid, "height": item.height}
+                        for item in script.history
+                    ],
+                }
+                for script in scan_result.get_scripts()
+            ],
+        )
+
+    @classmethod
+    def set_synced_wallet(
+        cls,
+        wallet_id: Optional[str],
+        wallet: bdk.Wallet,
+        blockchain: bdk.Blockchain,
+        index_scripts: Optional[Callable[[bdk.Wallet], ScriptIndex]] = None,
+    ) -> None:
+        """Make a wallet that finished syncing the connected wallet.
+
+        Only if the wallet's transactions changed is "wallet_synced" published,
+        and if index_scripts is given, the wallet's script index rebuilt with it,
+        see is_mine."""
+        is_changed = cls.has_wallet_changed(wallet_id, wallet)
+        script_index = cls.script_index
+        if index_scripts is not None and (
+            script_index is None or script_index.wallet_id != wallet_id or is_changed
+        ):
+            try:
+                cls.script_index = index_scripts(wallet)
+            except Exception as e:
+                # is_mine asks bdk until the next sync indexes the scripts
+                LOGGER.error(f"Error indexing the wallet's scripts {e}")
+                cls.script_index = None
         cls.wallet = wallet
-        cls.wallet_id = wallet_details_id
+        cls.blockchain = blockchain
+        cls.wallet_id = wallet_id
+        cls.wallet_database_path = cls.syncing_wallet_database_path
+        if is_changed:
+            get_wallet_event_stream().publish(
+                "wallet_synced", {"walletId": wallet_id}
+            )
+
+    @classmethod
+    def has_wallet_changed(cls, wallet_id: Optional[str], wallet: bdk.Wallet) -> bool:
+        """Check whether the synced wallet's transactions differ from the
+        connected wallet's, or whether it is a different wallet altogether."""
+        if cls.wallet is None or cls.wallet_id != wallet_id:
+            return True
+        return cls.get_transactions_fingerprint(
+            wallet.list_transactions(False)
+        ) != cls.get_transactions_fingerprint(cls.wallet.list_transactions(False))
+
+    @classmethod
+    def subscribe_to_wallet_changes(
+        cls, electrum_url: str, scan_result: Optional[WalletScanResult]
+    ) -> None:
+        """Have the electrum server notify us of new blocks and of any change to
+        the wallet's scanned scripts, so that the wallet is synced as soon as
+        it changes instead of only on a schedule.
+
+        A wallet that was not scanned is only synced on new blocks."""
+        url, port = parse_electrum_url(electrum_url)
+        if url is None or port is None:
+            return
+        statuses = (
+            {script.scripthash: script.status for script in scan_result.get_scripts()}
+            if scan_result is not None
+            else {}
+        )
+        get_wallet_subscriber().subscribe(
+            url, int(port), statuses, cls.handle_wallet_change
+        )
 
-        return wallet
+    @classmethod
+    def handle_wallet_change(cls, new_tip_height: Optional[int]) -> None:
+        """Sync the wallet after the electrum server notified us of a change,
+        the sync only refetches the scripts whose status changed."""
+        if new_tip_height is not None:
+            get_wallet_event_stream().publish("new_block", {"height": new_tip_height})
+        get_wallet_sync_worker().request_sync()
+
+    @classmethod
+    def request_wallet_sync(cls) -> Optional[WalletSyncJob]:
+        """Sync the wallet in the background as soon as possible,
+        return None if there is no wallet to sync."""
+        job = get_wallet_sync_worker().request_sync()
+        if job is None and Wallet.get_current_wallet() is not None:
+            # the wallet has not been connected since the app started
+            job = cls.start_wallet_sync()
+        return job
+
+    @classmethod
+    def get_wallet_sync_job(cls) -> Optional[WalletSyncJob]:
+        """Get the wallet's current or else last sync job."""
+        return get_wallet_sync_worker().get_job()
+
+    @classmethod
+    def get_wallet_last_synced_at(cls) -> Optional[float]:
+        return get_wallet_sync_worker().last_synced_at
+
+    @classmethod
+    def get_last_wallet_event_id(cls) -> int:
+        return get_wallet_event_stream().last_event_id
+
+    @classmethod
+    def get_wallet_events(cls, after_id: int) -> List[WalletEvent]:
+        """Get the wallet change events published after after_id."""
+        return get_wallet_event_stream().get_events(after_id)
+
+    @classmethod
+    def get_wallet_database_path(
+        cls,
+        descriptor: str,
+        change_descriptor: Optional[str],
+        network: int,
+        is_spare: bool = False,
+    ) -> str:
+        """Get the path of the bdk database file for the wallet,
+        or of its spare file, see get_wallet_database_config.
+
+        The file is named after the wallet's id,
+        so that the descriptors themselves are not written to the file name."""
+        wallet_hash = Wallet.get_wallet_id(descriptor, change_descriptor, network)
+
+        wallets_dir = path.join(get_app_data_dir(), BDK_WALLETS_DIR_NAME)
+        makedirs(wallets_dir, exist_ok=True)
+        suffix = ".spare.sqlite" if is_spare else ".sqlite"
+        return path.join(wallets_dir, f"{wallet_hash}{suffix}")
+
+    @classmethod
+    def get_wallet_database_config(
+        cls,
+        descriptor: str,
+        change_descriptor: Optional[str],
+        network: int,
+    ) -> bdk.DatabaseConfig:
+        """Get the bdk database config for the wallet to sync.
+
+        The wallet's scripts and transactions are kept in a sqlite file per
+        wallet, so reconnecting to a wallet that was connected before only
+        has to sync what changed since then instead of rescanning every script.
+
+        The connected wallet keeps serving requests while the next sync runs,
+        therefore that sync is not made in the connected wallet's file.
+        Each wallet has a spare file, the connected wallet's file is copied to
+        whichever of the two it is not using, the sync is made in the copy,
+        and set_synced_wallet makes it the connected wallet's file."""
+        if is_testing_environment():
+            return bdk.DatabaseConfig.MEMORY()
+
+        database_path, spare_database_path = [
+            cls.get_wallet_database_path(
+                descriptor, change_descriptor, network, is_spare
+            )
+            for is_spare in [False, True]
+        ]
+        connected_database_path = cls.wallet_database_path
+        if connected_database_path not in [database_path, spare_database_path]:
+            # this wallet is not connected, so nothing else uses its file
+            connected_database_path = None
+        elif connected_database_path == database_path:
+            database_path = spare_database_path
+        if connected_database_path is not None:
+            cls.copy_wallet_database(connected_database_path, database_path)
+
+        LOGGER.info(
+            "Using bdk wallet database",
+            path=database_path,
+            copied_from=connected_database_path,
+        )
+        cls.syncing_wallet_database_path = database_path
+        return bdk.DatabaseConfig.SQLITE(bdk.SqliteDbConfiguration(path=database_path))
+
+    @classmethod
+    def copy_wallet_database(cls, source_path: str, destination_path: str) -> None:
+        """Copy a bdk database file, consistently, even while it is open."""
+        with (
+            closing(sqlite3.connect(source_path)) as source,
+            closing(sqlite3.connect(destination_path)) as destination,
+        ):
+            source.backup(destination)
 
     @classmethod
     def create_spendable_wallet(
@@ -301,9 +826,25 @@ class WalletService:
     async def get_all_transactions(
         cls,
     ) -> List[Tuple[Transaction, bdk.TransactionDetails]]:
-        """Get all transactions for the current wallet.
+        """Sync the db with the current wallet's transactions,
+        returning the transactions that were enriched.
+
+        Only the transactions that are new or whose confirmation height changed
+        since the db was last synced are enriched, see
+        get_synced_transaction_heights, and the transactions that are no longer
+        the wallet's, for example replaced ones, are removed from the db.
+
+        bdk already holds the wallet's raw transactions after syncing,
+        therefore they are parsed locally instead of being fetched again.
+        Only the previous transactions needed to value the inputs, that are
+        not wallet transactions and are not already in the database,
+        are fetched from electrum in batches.
 
-        Add the transaction to the database.
+        The fetching, parsing and saving to the database are overlapped
+        by the TransactionEnrichmentPipeline.
+
+        Add the transaction and its decoded inputs and outputs to the database.
+        Update the outputs table with the wallet's new and spent outputs.
         Add to the database that the transactions have been fetched
         via the LastFetched model.
         """
@@ -312,120 +853,150 @@ class WalletService:
             LOGGER.error("No electrum wallet or wallet details found.")
             return []
 
+        if cls.get_electrum_server() is None:
+            return []
+
         transactions: list[bdk.TransactionDetails] = cls.wallet.list_transactions(
-            False)
+            True)
+        wallet_heights = dict(cls.get_transactions_fingerprint(transactions))
+        synced_heights = cls.get_synced_transaction_heights()
+        changed_transactions = [
+            transaction
+            for transaction in transactions
+            if transaction.txid not in synced_heights
+            or synced_heights[transaction.txid] != wallet_heights[transaction.txid]
+        ]
+        removed_txids = set(synced_heights.keys()) - set(wallet_heights.keys())
+
+        enriched_transactions = await TransactionEnrichmentPipeline(cls).run(
+            changed_transactions
+        )
 
         all_tx_details: List[Tuple[Transaction, bdk.TransactionDetails]] = []
-        update_tx_details_tasks = []
-        # if there are more than 10 requests at once then the electrum server will return an error, therefore limit it to 10.
-        semaphore = asyncio.Semaphore(10)
-        for index, transaction in enumerate(transactions):
-            task = cls.update_all_tx_details_for_tx_with_semaphore(
-                transaction, index, all_tx_details, semaphore
-            )
-            update_tx_details_tasks.append(task)
+        for transaction in changed_transactions:
+            transaction_response = enriched_transactions.get(transaction.txid)
+            if transaction_response is None:
+                # it is not synced, so the next sync enriches it again
+                LOGGER.error(f"Error getting transaction {transaction.txid}")
+                continue
+            all_tx_details.append((transaction_response, transaction))
 
-        # fetch all the tx details concurrently
-        await asyncio.gather(*update_tx_details_tasks)
+        LOGGER.info(
+            "Synced the wallet's transactions with the db",
+            transactions=len(transactions),
+            enriched=len(all_tx_details),
+            removed=len(removed_txids),
+        )
+        cls.update_outputs_from_transactions(all_tx_details, removed_txids)
 
         # mark transactions as fetched
-        LastFetchedService.update_last_fetched_transaction_type()
+        get_database_writer().submit(
+            LastFetchedService.update_last_fetched_transaction_type
+        )
 
         return all_tx_details
 
     @classmethod
-    async def update_all_tx_details_for_tx(
+    def update_input_values_from_db(
+        cls, transactions: Dict[str, Transaction]
+    ) -> Dict[str, List[Tuple[dict, Input]]]:
+        """Add the value and is_mine value to each of the transactions' inputs
+        that are already cached in the database, using a single query
+        for all of the inputs.
+
+        Return the inputs that are not in the database and therefore
+        need their previous transaction to be fetched, keyed by the txid
+        of the transaction that spends them."""
+        transaction_inputs: List[Tuple[str, dict, Input]] = []
+        for txid, transaction in transactions.items():
+            for input in transaction.inputs:
+                try:
+                    transaction_inputs.append((txid, input.as_dict(), input))
+                except Exception as e:
+                    LOGGER.error(f"Error getting input tx {e}")
+
+        all_inputs = cls.get_all_inputs_from_db(
+            [
+                (input_dict["prev_txid"], input_dict["output_n"])
+                for _, input_dict, _ in transaction_inputs
+            ]
+        )
+
+        inputs_that_need_to_be_fetched: Dict[str, List[Tuple[dict, Input]]] = {}
+        for txid, input_dict, input in transaction_inputs:
+            all_input = all_inputs.get(
+                (input_dict["prev_txid"], input_dict["output_n"])
+            )
+            if all_input is not None:
+                input.value = all_input.value
+                # This is a huge hack I am using the sort property
+                # to hold the is_mine
+                input.sort = all_input.is_mine
+            else:
+                inputs_that_need_to_be_fetched.setdefault(txid, []).append(
+                    (input_dict, input)
+                )
+        return inputs_that_need_to_be_fetched
+
+    @classmethod
+    def is_mine(cls, script: bytes) -> bool:
+        """Check whether the script pubkey is one of the connected wallet's.
+
+        The wallet's script index answers this without creating a bdk.Script
+        and calling into bdk for every output,
+        bdk is only asked if the wallet's scripts have not been indexed yet."""
+        if cls.wallet is None:
+            return False
+        script_index = cls.script_index
+        if script_index is not None and script_index.wallet_id == cls.wallet_id:
+            return script_index.is_mine(script)
+        return cls.wallet.is_mine(bdk.Script(script))
+
+    @classmethod
+    def update_all_tx_details_for_tx(
         cls,
         transaction: bdk.TransactionDetails,
-        index: int,
-        all_tx_details: List[Tuple[Transaction, bdk.TransactionDetails]],
+        transaction_response: Transaction,
     ):
-        """Get and cache the transaction and related input txs,
-        then add the fetch transaction to the all_tx_details list"""
-        try:
-            transaction_response = await cls.get_transaction(transaction.txid, index)
-            if transaction_response is not None:
-                LOGGER.info(
-                    f"the_input_value {transaction_response.inputs[0].value}",
-                )
-                # for each input, get the tx for the input
-                inputs_that_need_to_be_fetched = []
-                for input in transaction_response.inputs:
-                    try:
-                        input_dict = input.as_dict()
-
-                        # try to get it from the db
-                        # if not then get it from electrum and add it to the db
-                        LOGGER.info(f"input prev_txid {input_dict}")
-                        all_input = cls.get_all_input_from_db(
-                            input_dict["prev_txid"], input_dict["output_n"]
-                        )
-                        if all_input is not None:
-                            input.value = all_input.value
-                            # This is a huge hack I am using the sort property
-                            # to hold the is_mine
-                            input.sort = all_input.is_mine
-                        else:
-                            task = cls.update_input_amount_and_is_mine_value(
-                                input_dict, input
-                            )
-                            inputs_that_need_to_be_fetched.append(task)
-                    except Exception as e:
-                        LOGGER.error(f"Error getting input tx {e}")
-
-                for output in transaction_response.outputs:
-                    # This is a ridiculous hack, instead of adding an additional property to the output
-                    # to determine if it is mine or not, I am using the
-                    # spending_txid to hold that value.
-                    # TODO I should refactor this and have an actual property to determine
-                    # if the output is mine or not.
-                    if cls.wallet and cls.wallet.is_mine(bdk.Script(output.script.raw)):
-                        output.spending_txid = "mine"
-                    else:
-                        output.spending_txid = "not_mine"
-                # update all the input values concurrently
-                await asyncio.gather(*inputs_that_need_to_be_fetched)
-
-                # add the transaction to the database
-                # use the bdk transaction details since it contains
-                # the sent and received amounts relative to the users wallet
-                # instead of just agnostic values that electrum returns
-                new_tx = cls.add_transaction_to_db(transaction)
-                transaction_response.date = new_tx.confirmed_date_time
-                transaction_response.fee = new_tx.fee
-                all_tx_details.append((transaction_response, transaction))
+        """Mark which of the fetched transaction's outputs are the users
+        and add the date and fee from the bdk transaction details."""
+        for output in transaction_response.outputs:
+            # This is a ridiculous hack, instead of adding an additional property to the output
+            # to determine if it is mine or not, I am using the
+            # spending_txid to hold that value.
+            # TODO I should refactor this and have an actual property to determine
+            # if the output is mine or not.
+            if cls.is_mine(output.script.raw):
+                output.spending_txid = "mine"
             else:
-                LOGGER.error(f"Error getting transaction {transaction.txid}")
-        except Exception as e:
-            LOGGER.error(
-                f"Error getting transaction in exception {transaction.txid}")
+                output.spending_txid = "not_mine"
+
+        # use the bdk transaction details since it contains
+        # the fee relative to the users wallet
+        # instead of just agnostic values that electrum returns
+        transaction_response.date = (
+            datetime.fromtimestamp(transaction.confirmation_time.timestamp)
+            if transaction.confirmation_time
+            else None
+        )
+        transaction_response.fee = transaction.fee
 
     @classmethod
-    async def update_all_tx_details_for_tx_with_semaphore(
-        cls, transaction, index, all_tx_details, semaphore
-    ):
-        """call update_all_tx_details_for_tx with a semaphore to limit the number of concurrent requests."""
-        async with semaphore:  # Acquire the semaphore before the task starts
-            await cls.update_all_tx_details_for_tx(transaction, index, all_tx_details)
+    def update_input_amount_and_is_mine_value(
+        cls, input_dict: dict, input: Input, inputs_tx: Transaction
+    ) -> Optional[dict]:
+        """Add the value of the output in the transaction that the input spends
+        to the input.
 
-    @classmethod
-    async def update_input_amount_and_is_mine_value(
-        cls, input_dict: dict, input: Input
-    ) -> None:
-        """Get the transaction that the input was used in as an output
-        and add its value to the input."""
+        Return the resolved input as a row to cache in the database."""
         try:
-            inputs_tx = await cls.get_transaction(input_dict["prev_txid"])
-            if inputs_tx is None:
-                return
-
             inputs_amount = inputs_tx.outputs[input_dict["output_n"]].value
 
             raw_script = inputs_tx.outputs[input_dict["output_n"]].script.raw
 
             # THIS IS A MASSIVE HACK, I am putting the is_mine value in the sort property
             # TODO actually refactor this so that input can have an is_mine property
-            if cls.wallet and cls.wallet.is_mine(bdk.Script(raw_script)):
+            if cls.is_mine(raw_script):
                 # this is really is_mine but just putting that value in the
                 # sort property since it is unused.
                 input.sort = True
@@ -435,21 +1006,22 @@ class WalletService:
                 input.sort = False
 
             input.value = inputs_amount
-            cls.add_all_input_to_db(
-                input_dict["prev_txid"],
-                input_dict["output_n"],
-                input_dict["address"],
-                inputs_amount,
-                input.sort,
-            )
+            return {
+                "txid": input_dict["prev_txid"],
+                "vout": input_dict["output_n"],
+                "address": input_dict["address"],
+                "value": inputs_amount,
+                "is_mine": input.sort,
+            }
 
         except Exception as e:
             LOGGER.error(
                 f"Error getting and updating the input amount value {e}")
+            return None
 
     @classmethod
-    async def get_transaction(cls, txid, index=1) -> Optional[Transaction]:
-        "Get an individual transaction from the wallet by the txid."
+    def get_electrum_server(cls) -> Optional[Tuple[str, int]]:
+        """Get the url and port of the current wallet's electrum server."""
         wallet_details = Wallet.get_current_wallet()
         if wallet_details is None:
             LOGGER.error(
@@ -468,20 +1040,138 @@ class WalletService:
             LOGGER.error("No electrum url or port found in the wallet details")
             return None
 
+        return url, int(port)
+
+    @classmethod
+    async def get_transaction(
+        cls, txid: str, is_confirmed: bool = False
+    ) -> Optional[Transaction]:
+        """Get an individual transaction by the txid.
+
+        The raw transaction cache is checked before asking the electrum server."""
+        raw_transaction_cache = get_raw_transaction_cache()
+        cached_transactions = cls.parse_raw_transactions(
+            raw_transaction_cache.get_many([txid])
+        )
+        if txid in cached_transactions:
+            return cached_transactions[txid]
+
+        electrum_server = cls.get_electrum_server()
+        if electrum_server is None:
+            return None
+
+        url, port = electrum_server
         electrum_response = await electrum_request(
             url,
-            int(port),
+            port,
             ElectrumMethod.GET_TRANSACTIONS,
             GetTransactionsRequestParams(txid, False),
-            index,
         )
 
         if electrum_response.status == "success" and electrum_response.data is not None:
             transaction: Transaction = electrum_response.data
+            raw_transaction_cache.put(txid, transaction.rawtx, is_confirmed)
             return transaction
         else:
             return None
 
+    @classmethod
+    async def get_transactions(
+        cls, txids: List[str], confirmed_txids: Optional[Set[str]] = None
+    ) -> Dict[str, Transaction]:
+        """Get and parse many transactions by their txids, see get_raw_transactions.
+
+        The transactions are returned keyed by their txid."""
+        return cls.parse_raw_transactions(
+            await cls.get_raw_transactions(txids, confirmed_txids)
+        )
+
+    @classmethod
+    async def get_raw_transactions(
+        cls, txids: List[str], confirmed_txids: Optional[Set[str]] = None
+    ) -> Dict[str, bytes]:
+        """Get many raw transactions by their txids.
+
+        Transactions in the raw transaction cache are served from it,
+        the rest are fetched using batched electrum requests and added to the cache.
+        The txids in confirmed_txids are cached as confirmed and will
+        not be refetched.
+
+        The raw transactions are returned keyed by their txid."""
+        if len(txids) == 0:
+            return {}
+
+        confirmed_txids = confirmed_txids or set()
+        unique_txids = list(dict.fromkeys(txids))
+        raw_transaction_cache = get_raw_transaction_cache()
+        raw_transactions = raw_transaction_cache.get_many(unique_txids)
+        # unconfirmed transactions that have since been mined
+        raw_transaction_cache.mark_confirmed(
+            [txid for txid in raw_transactions if txid in confirmed_txids]
+        )
+
+        missing_txids = [
+            txid for txid in unique_txids if txid not in raw_transactions]
+        LOGGER.info(
+            "Raw transaction cache lookup",
+            requested=len(unique_txids),
+            cache_hits=len(raw_transactions),
+        )
+        if len(missing_txids) == 0:
+            return raw_transactions
+
+        electrum_server = cls.get_electrum_server()
+        if electrum_server is None:
+            return raw_transactions
+
+        url, port = electrum_server
+        fetched_raw_transactions = await electrum_raw_batch_request(
+            url,
+            port,
+            [GetTransactionsRequestParams(txid, False) for txid in missing_txids],
+        )
+        raw_transaction_cache.put_many(
+            [
+                (txid, raw_transaction, txid in confirmed_txids)
+                for txid, raw_transaction in fetched_raw_transactions.items()
+            ]
+        )
+        raw_transactions.update(fetched_raw_transactions)
+        return raw_transactions
+
+    @classmethod
+    def get_bdk_raw_transactions(
+        cls, transactions: List[bdk.TransactionDetails]
+    ) -> Dict[str, bytes]:
+        """Get the raw transactions included in bdk's transaction details, keyed by txid.
+
+        Transactions bdk does not have the raw bytes for are left out."""
+        raw_transactions: Dict[str, bytes] = {}
+        for transaction in transactions:
+            if transaction.transaction is None:
+                continue
+            try:
+                raw_transactions[transaction.txid] = bytes(
+                    transaction.transaction.serialize()
+                )
+            except Exception as e:
+                LOGGER.error(
+                    f"Error serializing bdk transaction {transaction.txid}: {e}")
+        return raw_transactions
+
+    @classmethod
+    def parse_raw_transactions(
+        cls, raw_transactions: Dict[str, bytes]
+    ) -> Dict[str, Transaction]:
+        """Parse raw transactions keyed by txid, skipping any that can not be parsed."""
+        transactions: Dict[str, Transaction] = {}
+        for txid, raw_transaction in raw_transactions.items():
+            try:
+                transactions[txid] = Transaction.parse(raw_transaction, strict=True)
+            except Exception as e:
+                LOGGER.error(f"Error parsing raw transaction {txid}: {e}")
+        return transactions
+
     @classmethod
     def get_transaction_details(cls, txid) -> Optional[TransactionModel]:
         """Get the transaction details from the database."""
@@ -490,110 +1180,441 @@ class WalletService:
         return transaction
 
     @classmethod
-    def add_transaction_to_db(
-        cls, transaction_details: bdk.TransactionDetails
-    ) -> TransactionModel:
-        existing_transaction = (
-            DB.session.query(TransactionModel)
-            .filter_by(txid=transaction_details.txid)
+    def add_transactions_to_db(
+        cls, transactions_details: List[bdk.TransactionDetails]
+    ) -> None:
+        """Upsert many transactions, made through the database writer.
+
+        A transaction that is already in the db has its amounts, fee and
+        confirmation updated, for example once it has been mined."""
+        wallet_id = get_current_wallet_id()
+        rows = []
+        for transaction_details in transactions_details:
+            confirmation_time = transaction_details.confirmation_time
+            rows.append(
+                {
+                    "wallet_id": wallet_id,
+                    "txid": transaction_details.txid,
+                    "received_amount": transaction_details.received,
+                    "sent_amount": transaction_details.sent,
+                    "fee": transaction_details.fee,
+                    "confirmed_block_height": (
+                        confirmation_time.height if confirmation_time else None
+                    ),
+                    "confirmed_date_time": (
+                        datetime.fromtimestamp(confirmation_time.timestamp)
+                        if confirmation_time
+                        else None
+                    ),
+                }
+            )
+        if len(rows) == 0:
+            return
+
+        # each row uses a variable per column
+        chunk_size = MAX_QUERY_VARIABLES // len(rows[0])
+        for chunk_start in range(0, len(rows), chunk_size):
+            insert_statement = sqlite_insert(TransactionModel).values(
+                rows[chunk_start: chunk_start + chunk_size]
+            )
+            DB.session.execute(
+                insert_statement.on_conflict_do_update(
+                    index_elements=[
+                        TransactionModel.wallet_id,
+                        TransactionModel.txid,
+                    ],
+                    set_={
+                        column: insert_statement.excluded[column]
+                        for column in rows[0].keys()
+                        if column not in ["wallet_id", "txid"]
+                    },
+                )
+            )
+
+    @classmethod
+    def add_decoded_transactions_to_db(cls, transactions: List[Transaction]) -> None:
+        """Save every decoded input and output of the enriched transactions,
+        along with the rest of the decoded transaction, made through the
+        database writer.
+
+        The transactions must already be in the db, see add_transactions_to_db.
+        """
+        wallet_id = get_current_wallet_id()
+        transaction_rows = []
+        input_rows = []
+        output_rows = []
+        for transaction in transactions:
+            transaction_dict = transaction.as_dict()
+            transaction_rows.append(
+                {
+                    "b_txid": transaction.txid,
+                    "details": {
+                        key: value
+                        for key, value in transaction_dict.items()
+                        # the date is the confirmed_date_time column
+                        if key not in ["inputs", "outputs", "date"]
+                    },
+                }
+            )
+            for input_dict in transaction_dict["inputs"]:
+                input_rows.append(
+                    {
+                        "wallet_id": wallet_id,
+                        "txid": transaction.txid,
+                        "index_n": input_dict.pop("index_n"),
+                        "prev_txid": input_dict.pop("prev_txid"),
+                        "output_n": input_dict.pop("output_n"),
+                        "value": input_dict.pop("value"),
+                        "script_type": input_dict.pop("script_type"),
+                        "address": input_dict.pop("address"),
+                        # the sort property holds the is_mine value
+                        "is_mine": bool(input_dict.pop("sort")),
+                        "details": input_dict,
+                    }
+                )
+            for output_dict in transaction_dict["outputs"]:
+                output_rows.append(
+                    {
+                        "wallet_id": wallet_id,
+                        "txid": transaction.txid,
+                        "output_n": output_dict.pop("output_n"),
+                        "value": output_dict.pop("value"),
+                        "script_type": output_dict.pop("script_type"),
+                        "address": output_dict.pop("address"),
+                        # the spending_txid holds the is_mine value
+                        "is_mine": output_dict["spending_txid"] == "mine",
+                        "details": output_dict,
+                    }
+                )
+        if len(transaction_rows) == 0:
+            return
+
+        transactions_table = TransactionModel.__table__
+        DB.session.execute(
+            update(transactions_table)
+            # a core update is not scoped to the current wallet, see WalletScoped
+            .where(transactions_table.c.wallet_id == wallet_id)
+            .where(transactions_table.c.txid == bindparam("b_txid"))
+            .values(details=bindparam("details")),
+            transaction_rows,
+        )
+        for model, index_elements, rows in [
+            (
+                TxInput,
+                [TxInput.wallet_id, TxInput.txid, TxInput.index_n],
+                input_rows,
+            ),
+            (
+                TxOutput,
+                [TxOutput.wallet_id, TxOutput.txid, TxOutput.output_n],
+                output_rows,
+            ),
+        ]:
+            if len(rows) == 0:
+                continue
+            # each row uses a variable per column
+            chunk_size = MAX_QUERY_VARIABLES // len(rows[0])
+            for chunk_start in range(0, len(rows), chunk_size):
+                insert_statement = sqlite_insert(model).values(
+                    rows[chunk_start: chunk_start + chunk_size]
+                )
+                DB.session.execute(
+                    insert_statement.on_conflict_do_update(
+                        index_elements=index_elements,
+                        set_={
+                            column: insert_statement.excluded[column]
+                            for column in rows[0].keys()
+                        },
+                    )
+                )
+
+    @classmethod
+    def remove_transactions_from_db(cls, txids: Set[str]) -> None:
+        """Remove the transactions and their decoded inputs and outputs,
+        made through the database writer."""
+        txids_list = list(txids)
+        for chunk_start in range(0, len(txids_list), MAX_QUERY_VARIABLES):
+            txids_chunk = txids_list[chunk_start: chunk_start + MAX_QUERY_VARIABLES]
+            for model in [TxInput, TxOutput, TransactionModel]:
+                DB.session.query(model).filter(model.txid.in_(txids_chunk)).delete()
+        DB.session.flush()
+
+    @classmethod
+    def get_all_transaction_details_from_db(cls) -> List[TransactionDetailDto]:
+        """Get every decoded transaction in the db, with the users amounts."""
+        transactions = (
+            TransactionModel.query.options(
+                selectinload(TransactionModel.tx_inputs),
+                selectinload(TransactionModel.tx_outputs),
+            )
+            .filter(TransactionModel.details.isnot(None))
+            .order_by(TransactionModel.id)
+            .all()
+        )
+
+        return [
+            TransactionDetailDto.model_validate(
+                {
+                    **transaction.details,
+                    "txid": transaction.txid,
+                    "date": transaction.confirmed_date_time,
+                    "fee": transaction.fee,
+                    "inputs": [input.as_dict() for input in transaction.tx_inputs],
+                    "outputs": [output.as_dict() for output in transaction.tx_outputs],
+                    "user_spent_amount": transaction.sent_amount,
+                    "user_received_amount": transaction.received_amount,
+                    "user_total_amount": transaction.received_amount
+                    - transaction.sent_amount,
+                }
+            )
+            for transaction in transactions
+        ]
+
+    @classmethod
+    def get_decoded_transaction_from_db(cls, txid: str) -> Optional[DecodedTransaction]:
+        """Get a wallet transaction decoded from the db, if it has been decoded."""
+        transaction = (
+            TransactionModel.query.options(
+                selectinload(TransactionModel.tx_inputs),
+                selectinload(TransactionModel.tx_outputs),
+            )
+            .filter_by(txid=txid)
             .first()
         )
-        if existing_transaction is None:
-            block_height = (
-                transaction_details.confirmation_time.height
-                if transaction_details.confirmation_time
-                else None
+        if transaction is None or transaction.details is None:
+            return None
+
+        return DecodedTransaction(
+            txid=transaction.txid,
+            details=transaction.details,
+            inputs=list(transaction.tx_inputs),
+            outputs=list(transaction.tx_outputs),
+        )
+
+    @classmethod
+    def get_decoded_transaction(
+        cls, txid: str
+    ) -> Optional[DecodedTransaction | Transaction]:
+        """Get a transaction from the db, only fetching and parsing it
+        if it is not a wallet transaction that has already been decoded.
+
+        A fetched transaction is cached for as long as the wallet knows it is
+        confirmed, any other transaction is cached as unconfirmed."""
+        decoded_transaction = cls.get_decoded_transaction_from_db(txid)
+        if decoded_transaction is not None:
+            return decoded_transaction
+
+        is_confirmed = cls.wallet is not None and any(
+            transaction.txid == txid and transaction.confirmation_time is not None
+            for transaction in cls.wallet.list_transactions(False)
+        )
+        return asyncio.run(cls.get_transaction(txid, is_confirmed))
+
+    @classmethod
+    def get_all_outputs(cls) -> List[OutputDetailDto]:
+        """Get all spent and unspent transaction outputs for the current wallet.
+
+        The outputs are served from the wallet history snapshot,
+        see get_wallet_history_snapshot.
+        """
+        snapshot = cls.get_wallet_history_snapshot()
+        if snapshot is None:
+            return []
+
+        return list(snapshot.outputs)
+
+    @classmethod
+    def get_all_transaction_details(cls) -> List[TransactionDetailDto]:
+        """Get all of the wallet's decoded transactions.
+
+        Like the outputs, the transactions are served from the wallet history snapshot.
+        """
+        snapshot = cls.get_wallet_history_snapshot()
+        if snapshot is None:
+            return []
+
+        return list(snapshot.transactions)
+
+    @classmethod
+    def get_wallet_history_snapshot(cls) -> Optional[WalletHistorySnapshot]:
+        """Get the snapshot of the wallet's transactions and outputs.
+
+        The snapshot is only rebuilt when bdk's transactions changed since
+        it was built or it was invalidated, and the wallet's history is only
+        refetched and enriched when the db has not been synced with bdk's transactions yet.
+        Concurrent rebuilds are coalesced into one.
+        """
+        if cls.wallet is None:
+            return None
+
+        wallet_transactions_fingerprint = cls.get_transactions_fingerprint(
+            cls.wallet.list_transactions(False)
+        )
+
+        def build_wallet_history():
+            synced_fingerprint = frozenset(
+                cls.get_synced_transaction_heights().items()
+            )
+            if synced_fingerprint != wallet_transactions_fingerprint:
+                LOGGER.info("Wallet transactions changed, syncing the wallet history")
+                asyncio.run(cls.get_all_transactions())
+                synced_fingerprint = frozenset(
+                    cls.get_synced_transaction_heights().items()
+                )
+            return (
+                synced_fingerprint,
+                tuple(cls.get_all_transaction_details_from_db()),
+                tuple(cls.get_all_outputs_from_db()),
             )
 
-            timestamp = (
-                transaction_details.confirmation_time.timestamp
-                if transaction_details.confirmation_time
-                else None
+        return get_wallet_history().get(
+            wallet_transactions_fingerprint, build_wallet_history
+        )
+
+    @classmethod
+    def get_synced_transaction_heights(cls) -> Dict[str, Optional[int]]:
+        """Get the confirmation height of every transaction the db is synced with,
+        keyed by txid, in the same shape as get_transactions_fingerprint.
+
+        A transaction is synced once it has been enriched and decoded,
+        so the synced state is kept across restarts."""
+        return dict(
+            DB.session.query(
+                TransactionModel.txid, TransactionModel.confirmed_block_height
             )
-            new_transaction = TransactionModel(
-                txid=transaction_details.txid,
-                received_amount=transaction_details.received,
-                sent_amount=transaction_details.sent,
-                fee=transaction_details.fee,
-                confirmed_block_height=block_height,
-                confirmed_date_time=datetime.fromtimestamp(timestamp),
+            .filter(TransactionModel.details.isnot(None))
+            .all()
+        )
+
+    @classmethod
+    def get_transactions_fingerprint(
+        cls, transactions: List[bdk.TransactionDetails]
+    ) -> frozenset:
+        """Get the txid and confirmation height of every transaction.
+
+        bdk's transactions only come from its local database, so it is cheap enough
+        to check on every request whether the db is out of date."""
+        return frozenset(
+            (
+                transaction.txid,
+                transaction.confirmation_time.height
+                if transaction.confirmation_time is not None
+                else None,
             )
-            DB.session.add(new_transaction)
-            DB.session.commit()
-            return new_transaction
-        return existing_transaction
+            for transaction in transactions
+        )
 
     @classmethod
-    def get_all_outputs(cls) -> List[LiveWalletOutput]:
-        """Get all spent and unspent transaction outputs for the current wallet and mutate them as needed.
-        Calculate the annominity set for each output.
-        Attach the txid to each output.
-        Attach all labels to each output.
-        Sync the database with the incoming outputs.
+    def update_outputs_from_transactions(
+        cls,
+        all_transactions: List[Tuple[Transaction, bdk.TransactionDetails]],
+        removed_txids: Optional[Set[str]] = None,
+    ) -> None:
+        """Sync the outputs table with the wallet's new or changed enriched
+        transactions, the outputs of the wallet's other transactions are
+        already in the db and are left as they are.
+
+        Calculate the annominity set for each of the wallet's outputs,
+        and find the transaction and input that spent it, if any.
+
+        The transactions in removed_txids are no longer the wallet's, so they
+        are removed from the db, their outputs are no longer served and the
+        outputs they spent are unspent again, see sync_local_db_with_incoming_outputs.
         """
-        all_transactions = asyncio.run(cls.get_all_transactions())
-        all_outputs: List[LiveWalletOutput] = []
-        all_outputs_dict: Dict[str, LiveWalletOutput] = {}
-        for transaction in all_transactions:
-            transaction, transaction_details = transaction
+        wallet_outputs: List[dict] = []
+        for transaction, transaction_details in all_transactions:
             annominity_sets = cls.calculate_output_annominity_sets(
                 transaction.outputs)
-            for output in transaction.outputs:
-                script = bdk.Script(output.script.raw)
-                if cls.wallet and cls.wallet.is_mine(script):
-                    db_output = cls.sync_local_db_with_incoming_output(
-                        txid=transaction.txid,
-                        vout=output.output_n,
-                        address=output.address,
-                        value=output.value,
-                    )
-                    LastFetchedService.update_last_fetched_outputs_type()
-                    annominity_set = annominity_sets.get(output.value, 1)
-                    LOGGER.info(
-                        f"output.address {output.address}: and isspent {db_output.spent_txid}"
-                    )
-                    extended_output = LiveWalletOutput(
-                        annominity_set=annominity_set,
-                        base_output=output,
-                        txid=transaction.txid,
-                        labels=[label.display_name for label in db_output.labels],
-                    )
-
-                    all_outputs.append(extended_output)
-                    all_outputs_dict[f"{transaction.txid}-{output.output_n}"] = (
-                        extended_output
-                    )
+            transaction_wallet_outputs = [
+                output
+                for output in transaction.outputs
+                if cls.is_mine(output.script.raw)
+            ]
+            # the wallet's only output in a transaction it both sent and
+            # received funds in is change, see OutputModel.is_simple_change
+            is_simple_change = (
+                transaction_details.sent > 0
+                and transaction_details.received > 0
+                and len(transaction_wallet_outputs) == 1
+            )
+            for output in transaction_wallet_outputs:
+                wallet_outputs.append(
+                    {
+                        "txid": transaction.txid,
+                        "vout": output.output_n,
+                        "address": output.address,
+                        "value": output.value,
+                        "script": output.lock_script.hex(),
+                        "script_type": output.script_type,
+                        "public_key": output.public_key.hex(),
+                        "public_hash": output.public_hash.hex(),
+                        "annominity_set": annominity_sets.get(output.value, 1),
+                        "is_simple_change": is_simple_change,
+                    }
+                )
 
-        # since the transactions don't come back in order we have to
-        # loop through them all again to mark the outputs
+        # since the transactions don't come back in order
+        # collect every input first to mark the outputs
         # that were used as inputs.
-        for transaction in all_transactions:
-            transaction, transaction_details = transaction
+        # {(prev_txid, vout): (spending txid, spending input index)}
+        spent_outputs: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        for transaction, transaction_details in all_transactions:
             for input in transaction.inputs:
-                # if the input is one of my outputs then add it to the inputs
                 input_dict = input.as_dict()
-                user_output = cls.get_output_from_db(
-                    txid=input_dict["prev_txid"], vout=input_dict["output_n"]
+                spent_outputs[(input_dict["prev_txid"], input_dict["output_n"])] = (
+                    transaction.txid,
+                    input_dict["index_n"],
                 )
 
-                if user_output is None:
-                    # not the users output therefore don't put it in the db
-                    LOGGER.info("output is not the users")
-                else:
-                    # add the output to the db?
-                    # or just update the output as spend and then add what txid it was spent in?
-                    cls.add_spend_tx_to_output(
-                        output=user_output, txid=transaction.txid
-                    )
-                    extended_output = all_outputs_dict.get(
-                        f"{input_dict['prev_txid']}-{input_dict['output_n']}", None
-                    )
-                    if extended_output:
-                        extended_output.spent = True
-                        extended_output.spending_txid = transaction.txid
-                        extended_output.spending_index_n = input_dict["index_n"]
+        def write() -> None:
+            cls.sync_local_db_with_incoming_outputs(
+                wallet_outputs,
+                spent_outputs,
+                remove_stale_outputs=False,
+                removed_txids=removed_txids,
+            )
+            if removed_txids:
+                cls.remove_transactions_from_db(removed_txids)
+            if len(wallet_outputs) > 0:
+                LastFetchedService.update_last_fetched_outputs_type()
 
-        return all_outputs
+        try:
+            get_database_writer().write(write)
+        except Exception as e:
+            LOGGER.error(f"Error syncing outputs with the db {e}")
+            raise e
+
+    @classmethod
+    def get_all_outputs_from_db(cls) -> List[OutputDetailDto]:
+        """Get every output in the outputs table that has been synced with its transaction.
+
+        Outputs that were only added by the output label population, and
+        therefore do not have their details yet, are left out."""
+        db_outputs = (
+            OutputModel.query.options(joinedload(OutputModel.labels))
+            .filter(OutputModel.script.isnot(None))
+            .order_by(OutputModel.id)
+            .all()
+        )
+
+        return [
+            OutputDetailDto(
+                value=db_output.value,
+                script=db_output.script,
+                script_type=db_output.script_type,
+                public_key=db_output.public_key,
+                public_hash=db_output.public_hash,
+                address=db_output.address,
+                output_n=db_output.vout,
+                spent=db_output.spent_txid is not None,
+                spending_txid=db_output.spent_txid or "",
+                spending_index_n=db_output.spending_index_n,
+                annominity_set=db_output.annominity_set,
+                txid=db_output.txid,
+                labels=[label.display_name for label in db_output.labels],
+            )
+            for db_output in db_outputs
+        ]
 
     @classmethod
     def get_all_change_outputs_from_db(
@@ -609,22 +1630,8 @@ class WalletService:
         This will either return a count of the change outputs or all the change outputs
         depending on the query_result_type.
         """
-        output_alias = aliased(OutputModel)
-
-        query = (
-            DB.session.query(OutputModel)
-            .join(TransactionModel, TransactionModel.txid == OutputModel.txid)
-            .outerjoin(output_alias, output_alias.txid == OutputModel.txid)
-            .group_by(OutputModel.txid)
-            .filter(
-                TransactionModel.sent_amount
-                > 0,  # Sent amount is greater than 0 so we know the user is creating change
-                TransactionModel.received_amount
-                > 0,  # Received amount is greater than 0, so we know the user is getting change
-            )
-            .having(func.count(output_alias.id) == 1)
-            # Only one output for the transaction because we want simple change, not any "change" from a complex tx
-        )
+        # Only the simple change, not any "change" from a complex tx
+        query = OutputModel.query.filter(OutputModel.is_simple_change.is_(True))
 
         if vout is not None:
             # only get the change outputs for a specific vout
@@ -636,43 +1643,154 @@ class WalletService:
             return query.all()
 
     @classmethod
-    def add_spend_tx_to_output(cls, output: OutputModel, txid: str):
-        output.spent_txid = txid
-        DB.session.commit()
+    def get_change_output_position_counts(cls) -> Dict[int, int]:
+        """Get the number of the wallet's change outputs at each vout."""
+        return {
+            change_output_position.vout: change_output_position.count
+            for change_output_position in ChangeOutputPosition.query.filter(
+                ChangeOutputPosition.count > 0
+            ).all()
+        }
 
-    # TODO add a better name since this is just adding the output to the db
     @classmethod
-    def sync_local_db_with_incoming_output(
-        cls,
-        txid: str,
-        vout: int,
-        address: str,
-        value: Optional[int] = None,
-    ) -> OutputModel:
-        """Sync the local database with the incoming output.
-
-        If the output is not in the database, add it.
-        """
-
-        db_output = OutputModel.query.filter_by(
-            txid=txid, vout=vout, address=address
-        ).first()
-        if not db_output:
-            db_output = cls.add_output_to_db(
-                txid=txid, vout=vout, address=address, value=value
+    def update_change_output_positions(cls, changes: Dict[int, int]) -> None:
+        """Add the change in the number of change outputs, keyed by vout,
+        to the change output positions, made through the database writer."""
+        wallet_id = get_current_wallet_id()
+        rows = [
+            {"wallet_id": wallet_id, "vout": vout, "count": change}
+            for vout, change in changes.items()
+            if change != 0
+        ]
+        if len(rows) == 0:
+            return
+
+        insert_statement = sqlite_insert(ChangeOutputPosition).values(rows)
+        DB.session.execute(
+            insert_statement.on_conflict_do_update(
+                index_elements=[
+                    ChangeOutputPosition.wallet_id,
+                    ChangeOutputPosition.vout,
+                ],
+                set_={
+                    "count": ChangeOutputPosition.count
+                    + insert_statement.excluded.count
+                },
             )
-        return db_output
+        )
 
     @classmethod
-    def add_output_to_db(
-        cls, vout: int, txid: str, address: str, value: Optional[int]
-    ) -> OutputModel:
-        db_output = OutputModel(
-            txid=txid, vout=vout, address=address, value=value, labels=[]
+    def sync_local_db_with_incoming_outputs(
+        cls,
+        outputs: List[dict],
+        spent_outputs: Dict[Tuple[str, int], Tuple[str, int]],
+        remove_stale_outputs: bool = True,
+        removed_txids: Optional[Set[str]] = None,
+    ) -> Dict[Tuple[str, int], OutputModel]:
+        """Sync the local database with all of the wallet's outputs at once.
+
+        Every output in the database is loaded in a single query, the outputs
+        that are not in the database yet are added, the details of the outputs
+        that changed are updated and the outputs in spent_outputs,
+        {(txid, vout): (spending txid, spending input index)}, are marked as spent,
+        made through the database writer.
+
+        Since outputs and spent_outputs are the wallet's entire history,
+        if remove_stale_outputs is True an output that is no longer in outputs,
+        for example one created by a replaced transaction, has its details cleared
+        so that it is no longer served, keeping its labels, and an output that is
+        no longer in spent_outputs is marked as unspent.
+        Otherwise only the outputs created or spent by the transactions in
+        removed_txids are treated that way.
+
+        The change output positions are updated with the outputs that became,
+        or are no longer, simple change.
+
+        Return every output in the database keyed by (txid, vout)."""
+        db_outputs: Dict[Tuple[str, int], OutputModel] = {
+            (db_output.txid, db_output.vout): db_output
+            for db_output in OutputModel.query.options(
+                joinedload(OutputModel.labels)
+            ).all()
+        }
+        simple_change_outputs = {
+            prevout
+            for prevout, db_output in db_outputs.items()
+            if db_output.is_simple_change
+        }
+
+        new_db_outputs: List[OutputModel] = []
+        updated_output_count = 0
+        for output in outputs:
+            db_output = db_outputs.get((output["txid"], output["vout"]))
+            if db_output is None:
+                db_output = OutputModel(**output, labels=[])
+                db_outputs[(db_output.txid, db_output.vout)] = db_output
+                new_db_outputs.append(db_output)
+                continue
+            # outputs added by the output label population
+            # do not have their details until they are synced.
+            is_updated = False
+            for key, value in output.items():
+                if getattr(db_output, key) != value:
+                    setattr(db_output, key, value)
+                    is_updated = True
+            updated_output_count += is_updated
+
+        if remove_stale_outputs or removed_txids:
+            incoming_outputs = {(output["txid"], output["vout"]) for output in outputs}
+            for prevout, db_output in db_outputs.items():
+                is_stale = (
+                    prevout not in incoming_outputs
+                    if remove_stale_outputs
+                    else db_output.txid in removed_txids
+                )
+                if is_stale and db_output.script is not None:
+                    db_output.script = None
+                    db_output.is_simple_change = False
+                    updated_output_count += 1
+                is_unspent = (
+                    prevout not in spent_outputs
+                    if remove_stale_outputs
+                    else db_output.spent_txid in removed_txids
+                )
+                if is_unspent and db_output.spent_txid is not None:
+                    db_output.spent_txid = None
+                    db_output.spending_index_n = None
+                    updated_output_count += 1
+
+        spent_output_count = 0
+        for prevout, (spending_txid, spending_index_n) in spent_outputs.items():
+            db_output = db_outputs.get(prevout)
+            if db_output is not None and (
+                db_output.spent_txid != spending_txid
+                or db_output.spending_index_n != spending_index_n
+            ):
+                db_output.spent_txid = spending_txid
+                db_output.spending_index_n = spending_index_n
+                spent_output_count += 1
+
+        DB.session.add_all(new_db_outputs)
+        DB.session.flush()
+
+        change_position_changes: Dict[int, int] = {}
+        for prevout, db_output in db_outputs.items():
+            is_simple_change = bool(db_output.is_simple_change)
+            if is_simple_change != (prevout in simple_change_outputs):
+                change_position_changes[db_output.vout] = (
+                    change_position_changes.get(db_output.vout, 0)
+                    + (1 if is_simple_change else -1)
+                )
+        cls.update_change_output_positions(change_position_changes)
+
+        LOGGER.info(
+            "Synced outputs with the db",
+            outputs=len(outputs),
+            added=len(new_db_outputs),
+            updated=updated_output_count,
+            marked_spent=spent_output_count,
         )
-        DB.session.add(db_output)
-        DB.session.commit()
-        return db_output
+        return db_outputs
 
     @classmethod
     def calculate_output_annominity_sets(
@@ -749,19 +1867,39 @@ class WalletService:
     def populate_outputs_and_labels(
         cls, populate_output_labels: PopulateOutputLabelsRequestDto
     ) -> None:  # TODO maybe a success of fail reutn type?
+        model_dump = populate_output_labels.model_dump()
+
+        outputs_labels: Dict[Tuple[str, int], List[str]] = {}
+        outputs: List[dict] = []
+        for unique_output_txid_vout, output_labels in model_dump.items():
+            txid, vout, address = unique_output_txid_vout.split("-")
+            outputs_labels[(txid, int(vout))] = [
+                label["display_name"] for label in output_labels
+            ]
+            outputs.append({"txid": txid, "vout": int(vout), "address": address})
+
+        # a single write, so that every output and label is committed at once,
+        # the outputs that are not in the db yet are added without their details
+        # until they are synced, see sync_local_db_with_incoming_outputs.
+        def populate() -> None:
+            db_outputs = cls.sync_local_db_with_incoming_outputs(
+                outputs, {}, remove_stale_outputs=False
+            )
+            labels = {label.display_name: label for label in Label.query.all()}
+            for prevout, display_names in outputs_labels.items():
+                db_output = db_outputs[prevout]
+                for display_name in display_names:
+                    label = labels.get(display_name)
+                    if label is not None and label not in db_output.labels:
+                        db_output.labels.append(label)
+            DB.session.flush()
+
         try:
-            model_dump = populate_output_labels.model_dump()
-            for unique_output_txid_vout in model_dump.keys():
-                txid, vout, address = unique_output_txid_vout.split("-")
-                cls.sync_local_db_with_incoming_output(
-                    txid, int(vout), address)
-                output_labels = model_dump[unique_output_txid_vout]
-                for label in output_labels:
-                    display_name = label["display_name"]
-                    cls.add_label_to_output(txid, int(vout), display_name)
+            get_database_writer().write(populate)
         except Exception as e:
             LOGGER.error("Error populating outputs and labels", error=e)
-            DB.session.rollback()
+        # the outputs in the wallet history snapshot include their labels
+        get_wallet_history().invalidate()
 
     @classmethod
     def get_output_from_db(
@@ -803,22 +1941,66 @@ class WalletService:
         return outputs_used_as_inputs
 
     @classmethod
-    def get_all_input_from_db(
+    def get_all_inputs_from_db(
         cls,
-        txid: str,
-        vout: str,
-    ) -> Optional[AllInput]:
-        return AllInput.query.filter_by(txid=txid, vout=vout).first()
+        prevouts: List[Tuple[str, int]],
+    ) -> Dict[Tuple[str, int], AllInput]:
+        """Get the cached inputs for many (txid, vout) prevouts,
+        keyed by their (txid, vout)."""
+        unique_prevouts = list(dict.fromkeys(prevouts))
+        all_inputs: Dict[Tuple[str, int], AllInput] = {}
+        # each prevout uses two variables, the txid and the vout
+        chunk_size = MAX_QUERY_VARIABLES // 2
+        for chunk_start in range(0, len(unique_prevouts), chunk_size):
+            prevouts_chunk = unique_prevouts[chunk_start: chunk_start + chunk_size]
+            for all_input in AllInput.query.filter(
+                tuple_(AllInput.txid, AllInput.vout).in_(prevouts_chunk)
+            ).all():
+                all_inputs[(all_input.txid, all_input.vout)] = all_input
+        return all_inputs
 
     @classmethod
-    def add_all_input_to_db(
-        cls, txid: str, vout: str, address: str, value: int, is_mine: bool
-    ) -> None:
-        all_input = AllInput(
-            txid=txid, vout=vout, address=address, value=value, is_mine=is_mine
+    def add_all_inputs_to_db(cls, all_inputs: List[dict]) -> None:
+        """Upsert many inputs, each a dict of the AllInput columns,
+        made through the database writer.
+
+        An input that is already in the db for the same (txid, vout)
+        is updated instead of being added again."""
+        if len(all_inputs) == 0:
+            return
+
+        # only keep the last row for a (txid, vout) since
+        # a single upsert statement can not update the same row twice.
+        wallet_id = get_current_wallet_id()
+        unique_all_inputs = list(
+            {
+                (all_input["txid"], all_input["vout"]): {
+                    **all_input,
+                    "wallet_id": wallet_id,
+                }
+                for all_input in all_inputs
+            }.values()
         )
-        DB.session.add(all_input)
-        DB.session.commit()
+        # each row uses a variable per column
+        chunk_size = MAX_QUERY_VARIABLES // len(unique_all_inputs[0])
+        for chunk_start in range(0, len(unique_all_inputs), chunk_size):
+            insert_statement = sqlite_insert(AllInput).values(
+                unique_all_inputs[chunk_start: chunk_start + chunk_size]
+            )
+            DB.session.execute(
+                insert_statement.on_conflict_do_update(
+                    index_elements=[
+                        AllInput.wallet_id,
+                        AllInput.txid,
+                        AllInput.vout,
+                    ],
+                    set_={
+                        "address": insert_statement.excluded.address,
+                        "value": insert_statement.excluded.value,
+                        "is_mine": insert_statement.excluded.is_mine,
+                    },
+                )
+            )
 
     @classmethod
     def get_all_unspent_outputs_from_db_before_blockheight(
@@ -855,25 +2037,45 @@ class WalletService:
         cls, txid: str, vout: int, label_display_name: str
     ) -> list[Label]:
         """Add a label to an output in the db."""
-        db_output = OutputModel.query.filter_by(txid=txid, vout=vout).first()
-        label = Label.query.filter_by(display_name=label_display_name).first()
-        if db_output is None or label is None:
-            return []
-        db_output.labels.append(label)
-        DB.session.commit()
-        return db_output.labels
+
+        def add_label() -> None:
+            db_output = OutputModel.query.filter_by(txid=txid, vout=vout).first()
+            label = Label.query.filter_by(display_name=label_display_name).first()
+            if db_output is None or label is None:
+                return
+            db_output.labels.append(label)
+            DB.session.flush()
+
+        get_database_writer().write(add_label)
+        # the outputs in the wallet history snapshot include their labels
+        get_wallet_history().invalidate()
+        return cls.get_output_labels_from_db(txid, vout)
 
     def remove_label_from_output(
         self, txid: str, vout: int, label_display_name: str
     ) -> list[Label]:
         """Remove a label from an output in the db."""
-        db_output = OutputModel.query.filter_by(txid=txid, vout=vout).first()
-        label = Label.query.filter_by(display_name=label_display_name).first()
-        # Remove the label from the output's labels collection
-        if label in db_output.labels:
-            db_output.labels.remove(label)
-        DB.session.commit()
 
+        def remove_label() -> None:
+            db_output = OutputModel.query.filter_by(txid=txid, vout=vout).first()
+            label = Label.query.filter_by(display_name=label_display_name).first()
+            # Remove the label from the output's labels collection
+            if label in db_output.labels:
+                db_output.labels.remove(label)
+            DB.session.flush()
+
+        get_database_writer().write(remove_label)
+        get_wallet_history().invalidate()
+
+        return self.get_output_labels_from_db(txid, vout)
+
+    @classmethod
+    def get_output_labels_from_db(cls, txid: str, vout: int) -> list[Label]:
+        """Get the labels of an output in the db,
+        an empty list if the output is not in the db."""
+        db_output = OutputModel.query.filter_by(txid=txid, vout=vout).first()
+        if db_output is None:
+            return []
         return db_output.labels
 
     def get_utxos_info(self, utxos_wanted: List[bdk.OutPoint]) -> List[bdk.LocalUtxo]:
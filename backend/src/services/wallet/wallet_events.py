@@ -0,0 +1,67 @@
+from collections import deque
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Deque, Dict, List, Literal, Optional
+import time
+
+import structlog
+
+LOGGER = structlog.get_logger()
+
+# how many of the latest events are kept for clients that reconnect
+DEFAULT_MAX_EVENTS = 100
+
+# wallet_synced: the wallet's transactions or utxos changed,
+# new_block: the electrum server saw a new chain tip
+WalletEventType = Literal["wallet_synced", "new_block"]
+
+
+@dataclass(frozen=True)
+class WalletEvent:
+    id: int
+    type: WalletEventType
+    data: Dict[str, Any]
+    created_at: float = field(default_factory=time.time)
+
+
+class WalletEventStream:
+    """The latest wallet change events, numbered in the order they were published.
+
+    A client remembers the id of the last event it saw and asks for the events
+    after it, if the client fell so far behind that some of those events were
+    already dropped, it gets every event that is still kept, which is enough
+    for it to know that it has to refetch.
+    """
+
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS):
+        self._lock = Lock()
+        self._events: Deque[WalletEvent] = deque(maxlen=max_events)
+        self._last_event_id = 0
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_event_id
+
+    def publish(self, event_type: WalletEventType, data: Dict[str, Any]) -> WalletEvent:
+        with self._lock:
+            self._last_event_id += 1
+            event = WalletEvent(id=self._last_event_id, type=event_type, data=data)
+            self._events.append(event)
+
+        LOGGER.info("Wallet event published", event_id=event.id, type=event_type)
+        return event
+
+    def get_events(self, after_id: int) -> List[WalletEvent]:
+        with self._lock:
+            return [event for event in self._events if event.id > after_id]
+
+
+_wallet_event_stream: Optional[WalletEventStream] = None
+
+
+def get_wallet_event_stream() -> WalletEventStream:
+    """Get the shared wallet event stream."""
+    global _wallet_event_stream
+    if _wallet_event_stream is None:
+        _wallet_event_stream = WalletEventStream()
+    return _wallet_event_stream
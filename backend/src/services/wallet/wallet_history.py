@@ -0,0 +1,111 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable, Optional, Tuple
+import time
+
+import structlog
+
+from src.my_types.controller_types.utxos_dtos import (
+    OutputDetailDto,
+    TransactionDetailDto,
+)
+
+LOGGER = structlog.get_logger()
+
+
+@dataclass(frozen=True)
+class WalletHistorySnapshot:
+    """The wallet's decoded transactions and outputs at a point in time.
+
+    A snapshot is never changed once it is built, a newer history is a
+    new snapshot with a higher version, so it can be shared by every request.
+    """
+
+    version: int
+    # the wallet transactions the snapshot was built from,
+    # see WalletService.get_transactions_fingerprint
+    fingerprint: Optional[frozenset]
+    transactions: Tuple[TransactionDetailDto, ...]
+    outputs: Tuple[OutputDetailDto, ...]
+    built_at: float = field(default_factory=time.time)
+
+
+# build a snapshot, returning the fingerprint of the history that was actually built
+WalletHistoryBuilder = Callable[
+    [],
+    Tuple[
+        Optional[frozenset],
+        Tuple[TransactionDetailDto, ...],
+        Tuple[OutputDetailDto, ...],
+    ],
+]
+
+
+class WalletHistory:
+    """Hold the latest WalletHistorySnapshot, rebuilding it only when the
+    wallet's transactions changed or it was invalidated.
+
+    Concurrent callers that find the snapshot out of date are coalesced,
+    only the first one rebuilds it while the rest wait for and share its result.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[WalletHistorySnapshot] = None
+        self._version = 0
+        self._rebuild_lock = Lock()
+
+    @property
+    def snapshot(self) -> Optional[WalletHistorySnapshot]:
+        return self._snapshot
+
+    def get(
+        self, fingerprint: frozenset, build: WalletHistoryBuilder
+    ) -> WalletHistorySnapshot:
+        """Get the snapshot for the wallet transactions in fingerprint,
+        building a new one if the current snapshot is of a different history."""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.fingerprint == fingerprint:
+            return snapshot
+
+        with self._rebuild_lock:
+            # another caller may have rebuilt it while this one was waiting
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.fingerprint == fingerprint:
+                return snapshot
+
+            started_at = time.monotonic()
+            built_fingerprint, transactions, outputs = build()
+            self._version += 1
+            snapshot = WalletHistorySnapshot(
+                version=self._version,
+                fingerprint=built_fingerprint,
+                transactions=transactions,
+                outputs=outputs,
+            )
+            self._snapshot = snapshot
+
+        LOGGER.info(
+            "Built wallet history snapshot",
+            version=snapshot.version,
+            transactions=len(snapshot.transactions),
+            outputs=len(snapshot.outputs),
+            seconds=round(time.monotonic() - started_at, 3),
+        )
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Rebuild the snapshot on the next get, for example after the
+        outputs' labels changed in the db."""
+        with self._rebuild_lock:
+            self._snapshot = None
+
+
+_wallet_history: Optional[WalletHistory] = None
+
+
+def get_wallet_history() -> WalletHistory:
+    """Get the shared wallet history."""
+    global _wallet_history
+    if _wallet_history is None:
+        _wallet_history = WalletHistory()
+    return _wallet_history
@@ -0,0 +1,282 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import time
+
+import bdkpython as bdk
+import structlog
+
+from src.api.electrum import ElectrumMethod, electrum_scripthash_batch_request
+
+LOGGER = structlog.get_logger()
+
+# the largest batch of scripts to ask for the history of at once
+DEFAULT_MAX_SCAN_BATCH_SIZE = 2000
+
+# derive the script pubkey at an index of a keychain
+DeriveScript = Callable[[bdk.KeychainKind, int], bytes]
+
+
+def get_scripthash(script: bytes) -> str:
+    """Get the electrum scripthash of a script pubkey,
+    the reversed sha256 of the script in hex."""
+    return hashlib.sha256(script).digest()[::-1].hex()
+
+
+def get_script_status(history: List[dict]) -> Optional[str]:
+    """Get the electrum status of a script from its history, as returned by
+    blockchain.scripthash.get_history, None if the script has no history."""
+    if len(history) == 0:
+        return None
+    status = "".join(f"{item['tx_hash']}:{item['height']}:" for item in history)
+    return hashlib.sha256(status.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class ScriptHistoryItem:
+    txid: str
+    # 0 or less while the transaction is unconfirmed
+    height: int
+
+
+@dataclass(frozen=True)
+class ScannedScript:
+    keychain: bdk.KeychainKind
+    index: int
+    scripthash: str
+    # the electrum status of the script's whole history
+    status: Optional[str]
+    # the script's history since the birthday height
+    history: Tuple[ScriptHistoryItem, ...]
+
+    @property
+    def is_used(self) -> bool:
+        # the status is of the whole history, including the history
+        # from before the birthday height that is not kept.
+        return self.status is not None
+
+
+@dataclass(frozen=True)
+class KeychainScanResult:
+    keychain: bdk.KeychainKind
+    # every script that was scanned, ordered by index
+    scripts: Tuple[ScannedScript, ...]
+    # how many of the scripts had their history fetched,
+    # the rest were known and their status had not changed
+    fetched_count: int = 0
+
+    @property
+    def used_scripts(self) -> Tuple[ScannedScript, ...]:
+        return tuple(script for script in self.scripts if script.is_used)
+
+    @property
+    def last_used_index(self) -> Optional[int]:
+        used_scripts = self.used_scripts
+        if len(used_scripts) == 0:
+            return None
+        return used_scripts[-1].index
+
+    @property
+    def largest_gap(self) -> int:
+        """The longest run of unused scripts that is followed by a used one."""
+        largest_gap = 0
+        previous_used_index = -1
+        for script in self.used_scripts:
+            largest_gap = max(largest_gap, script.index - previous_used_index - 1)
+            previous_used_index = script.index
+        return largest_gap
+
+
+@dataclass(frozen=True)
+class WalletScanResult:
+    keychains: Tuple[KeychainScanResult, ...]
+    birthday_height: Optional[int]
+
+    @property
+    def fetched_count(self) -> int:
+        return sum(keychain.fetched_count for keychain in self.keychains)
+
+    @property
+    def is_unchanged(self) -> bool:
+        """Whether every script was already known and none of their statuses changed."""
+        return self.fetched_count == 0
+
+    def get_scripts(self) -> List[ScannedScript]:
+        return [script for keychain in self.keychains for script in keychain.scripts]
+
+    def get_transaction_heights(self) -> Dict[str, int]:
+        """Get the height of every transaction that was found, keyed by txid."""
+        return {
+            item.txid: item.height
+            for script in self.get_scripts()
+            for item in script.history
+        }
+
+    def get_required_stop_gap(self, min_stop_gap: int) -> int:
+        """Get the smallest stop gap that still finds every used script,
+        since a sync stops looking once it sees stop gap unused scripts in a row."""
+        largest_gap = max(
+            [keychain.largest_gap for keychain in self.keychains], default=0
+        )
+        return max(min_stop_gap, largest_gap + 1)
+
+
+class WalletScanner:
+    """Find the wallet's used scripts by asking the electrum server for
+    the history of many derived scripts at once.
+
+    Each keychain is scanned in batches of scripts, each batch is a handful of
+    large json-rpc batches of blockchain.scripthash.get_history requests.
+    The first batch is the size of the gap, so an unused keychain is scanned in
+    a single round trip, and every batch that finds used scripts doubles the
+    size of the next one, up to max_batch_size, so long lived wallets with
+    thousands of used scripts only take a few round trips.
+    The scan stops once gap scripts in a row after the last used one are unused.
+
+    The scripts of a previous scan can be passed in as known_scripts, their
+    statuses are checked with a single batch of blockchain.scripthash.subscribe
+    requests and only the scripts whose status changed have their history
+    refetched, so rescanning a wallet that has not changed takes one round trip.
+
+    History that was confirmed before the birthday_height is skipped,
+    scripts that only have such history are still counted as used,
+    so that the scan does not stop before the scripts used after them.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        port: int,
+        derive_script: DeriveScript,
+        gap: int,
+        birthday_height: Optional[int] = None,
+        max_batch_size: int = DEFAULT_MAX_SCAN_BATCH_SIZE,
+    ):
+        if gap < 1:
+            raise ValueError("gap must be at least 1")
+
+        self.url = url
+        self.port = port
+        self.derive_script = derive_script
+        self.gap = gap
+        self.birthday_height = birthday_height
+        self.max_batch_size = max(max_batch_size, gap)
+
+    async def scan(
+        self,
+        keychains: List[bdk.KeychainKind],
+        known_scripts: Optional[List[ScannedScript]] = None,
+    ) -> WalletScanResult:
+        started_at = time.monotonic()
+        unchanged_scripts: Dict[str, ScannedScript] = {}
+        statuses: Dict[str, Optional[str]] = {}
+        if known_scripts:
+            statuses = await self._request(
+                ElectrumMethod.SUBSCRIBE_SCRIPTHASH,
+                [script.scripthash for script in known_scripts],
+            )
+            unchanged_scripts = {
+                script.scripthash: script
+                for script in known_scripts
+                if statuses[script.scripthash] == script.status
+            }
+
+        keychain_results = await asyncio.gather(
+            *[
+                self._scan_keychain(keychain, unchanged_scripts, statuses)
+                for keychain in keychains
+            ]
+        )
+        result = WalletScanResult(
+            keychains=tuple(keychain_results), birthday_height=self.birthday_height
+        )
+
+        LOGGER.info(
+            "Wallet scan finished",
+            scanned_scripts=len(result.get_scripts()),
+            fetched_scripts=result.fetched_count,
+            used_scripts=sum(
+                len(keychain.used_scripts) for keychain in result.keychains
+            ),
+            transactions=len(result.get_transaction_heights()),
+            seconds=round(time.monotonic() - started_at, 3),
+        )
+        return result
+
+    async def _scan_keychain(
+        self,
+        keychain: bdk.KeychainKind,
+        unchanged_scripts: Dict[str, ScannedScript],
+        statuses: Dict[str, Optional[str]],
+    ) -> KeychainScanResult:
+        scripts: List[ScannedScript] = []
+        fetched_count = 0
+        last_used_index = -1
+        next_index = 0
+        batch_size = self.gap
+        while next_index <= last_used_index + self.gap:
+            scripthashes = [
+                (index, get_scripthash(self.derive_script(keychain, index)))
+                for index in range(next_index, next_index + batch_size)
+            ]
+            histories = await self._request(
+                ElectrumMethod.GET_SCRIPTHASH_HISTORY,
+                [
+                    scripthash
+                    for _, scripthash in scripthashes
+                    if scripthash not in unchanged_scripts
+                ],
+            )
+
+            found_used_script = False
+            for index, scripthash in scripthashes:
+                script = unchanged_scripts.get(scripthash)
+                if script is None:
+                    fetched_count += 1
+                    history = histories[scripthash]
+                    script = ScannedScript(
+                        keychain=keychain,
+                        index=index,
+                        scripthash=scripthash,
+                        # the subscribed status, if there is one, is the server's own
+                        status=statuses.get(scripthash, get_script_status(history)),
+                        history=self._parse_history(history),
+                    )
+                scripts.append(script)
+                if script.is_used:
+                    last_used_index = index
+                    found_used_script = True
+
+            next_index += batch_size
+            if found_used_script:
+                batch_size = min(batch_size * 2, self.max_batch_size)
+
+        return KeychainScanResult(
+            keychain=keychain, scripts=tuple(scripts), fetched_count=fetched_count
+        )
+
+    async def _request(
+        self, electrum_method: ElectrumMethod, scripthashes: List[str]
+    ) -> Dict[str, Any]:
+        if len(scripthashes) == 0:
+            return {}
+        results = await electrum_scripthash_batch_request(
+            self.url, self.port, electrum_method, scripthashes
+        )
+        # an unknown history or status can not be treated as unused,
+        # or the scan could stop before the wallet's last used script.
+        if len(results) != len(set(scripthashes)):
+            raise ConnectionError(
+                f"Could not get the {electrum_method.value} of every script"
+            )
+        return results
+
+    def _parse_history(self, history: List[dict]) -> Tuple[ScriptHistoryItem, ...]:
+        return tuple(
+            ScriptHistoryItem(txid=item["tx_hash"], height=item["height"])
+            for item in history
+            if self.birthday_height is None
+            or item["height"] <= 0
+            or item["height"] >= self.birthday_height
+        )
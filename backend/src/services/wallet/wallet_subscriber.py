@@ -0,0 +1,285 @@
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Set
+import asyncio
+
+import structlog
+
+from src.api.electrum import DEFAULT_SCRIPTHASH_BATCH_CHUNK_SIZE, ElectrumMethod
+from src.api.electrum_client import ElectrumClient, ElectrumRequestError
+
+LOGGER = structlog.get_logger()
+
+# wait this long after a notification for the ones that usually follow it
+# (a new block notifies every script with a transaction in it) before acting on them
+DEFAULT_NOTIFICATION_DEBOUNCE_SECONDS = 0.5
+DEFAULT_RECONNECT_DELAY_SECONDS = 10.0
+# how often the subscription connection is checked while no notifications arrive
+DEFAULT_HEALTH_CHECK_SECONDS = 30.0
+
+# called with the new chain tip height if there is a new block,
+# or None if only some of the wallet's scripts changed
+OnWalletChanged = Callable[[Optional[int]], None]
+
+
+class WalletSubscriber:
+    """Hold the electrum subscriptions of the connected wallet in a background thread.
+
+    A single connection to the electrum server subscribes to the chain tip
+    (blockchain.headers.subscribe) and to every one of the wallet's scanned
+    scripts (blockchain.scripthash.subscribe), and on_change is called whenever
+    the server notifies that either of them changed, so the wallet only has
+    to be synced when something actually happened.
+
+    Each script is subscribed to with the status it had when it was scanned,
+    a script whose status differs by the time it is subscribed to
+    (or after a reconnect) is treated as a notification.
+    """
+
+    def __init__(
+        self,
+        debounce_seconds: float = DEFAULT_NOTIFICATION_DEBOUNCE_SECONDS,
+        reconnect_delay_seconds: float = DEFAULT_RECONNECT_DELAY_SECONDS,
+        health_check_seconds: float = DEFAULT_HEALTH_CHECK_SECONDS,
+    ):
+        self.debounce_seconds = debounce_seconds
+        self.reconnect_delay_seconds = reconnect_delay_seconds
+        self.health_check_seconds = health_check_seconds
+
+        self._lock = Lock()
+        self._url: Optional[str] = None
+        self._port: Optional[int] = None
+        # the expected status of every script to subscribe to, keyed by scripthash
+        self._statuses: Dict[str, Optional[str]] = {}
+        self._on_change: Optional[OnWalletChanged] = None
+        # bumped whenever the server or wallet changes, so the current
+        # connection is closed and every subscription is made again.
+        self._generation = 0
+        self._tip_height: Optional[int] = None
+        self._new_tip_height: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._thread: Optional[Thread] = None
+
+    @property
+    def tip_height(self) -> Optional[int]:
+        """The height of the chain tip the electrum server last notified about."""
+        return self._tip_height
+
+    def subscribe(
+        self,
+        url: str,
+        port: int,
+        statuses: Dict[str, Optional[str]],
+        on_change: OnWalletChanged,
+    ) -> None:
+        """Subscribe to the chain tip and to the scripts, keyed by scripthash,
+        in addition to the scripts that are already subscribed to.
+
+        Subscribing to a different server drops every previous subscription."""
+        with self._lock:
+            if (url, port) != (self._url, self._port):
+                self._generation += 1
+                self._url = url
+                self._port = port
+                self._statuses = {}
+                self._tip_height = None
+            self._statuses.update(statuses)
+            self._on_change = on_change
+            self._start_thread()
+        self._wake_up()
+
+    def clear(self) -> None:
+        """Drop every subscription."""
+        with self._lock:
+            self._generation += 1
+            self._url = None
+            self._port = None
+            self._statuses = {}
+            self._on_change = None
+            self._tip_height = None
+        self._wake_up()
+
+    def _start_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = Thread(
+            target=lambda: asyncio.run(self._run()),
+            name="wallet_subscriber",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _wake_up(self) -> None:
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            # the loop already stopped
+            pass
+
+    async def _run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            with self._lock:
+                url, port, generation = self._url, self._port, self._generation
+
+            if url is None or port is None:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+
+            try:
+                await self._listen(url, port, generation)
+            except Exception as e:
+                LOGGER.error(
+                    "Electrum subscription connection failed",
+                    url=url,
+                    port=port,
+                    error=str(e),
+                )
+                await self._wait_for_wake_up(self.reconnect_delay_seconds)
+
+    async def _listen(self, url: str, port: int, generation: int) -> None:
+        changed = asyncio.Event()
+        client = ElectrumClient(
+            url,
+            port,
+            notification_handler=lambda method, params: self._handle_notification(
+                method, params, changed
+            ),
+        )
+        await client.connect()
+        LOGGER.info("Electrum subscription connection opened", url=url, port=port)
+        try:
+            self._handle_tip(
+                await client.request(ElectrumMethod.SUBSCRIBE_HEADERS.value, []),
+                changed,
+            )
+
+            subscribed: Set[str] = set()
+            while generation == self._generation:
+                await self._subscribe_scripts(client, subscribed, changed)
+
+                if not changed.is_set():
+                    await self._wait_for_wake_up(self.health_check_seconds, changed)
+                if not client.is_healthy():
+                    raise ConnectionError("Electrum subscription connection closed")
+
+                if changed.is_set() and generation == self._generation:
+                    await asyncio.sleep(self.debounce_seconds)
+                    changed.clear()
+                    self._notify_change()
+        finally:
+            await client.close()
+
+    async def _subscribe_scripts(
+        self,
+        client: ElectrumClient,
+        subscribed: Set[str],
+        changed: asyncio.Event,
+    ) -> None:
+        with self._lock:
+            statuses = {
+                scripthash: status
+                for scripthash, status in self._statuses.items()
+                if scripthash not in subscribed
+            }
+        scripthashes = list(statuses.keys())
+
+        for chunk_start in range(
+            0, len(scripthashes), DEFAULT_SCRIPTHASH_BATCH_CHUNK_SIZE
+        ):
+            chunk = scripthashes[
+                chunk_start: chunk_start + DEFAULT_SCRIPTHASH_BATCH_CHUNK_SIZE
+            ]
+            results = await client.batch_request(
+                [
+                    (ElectrumMethod.SUBSCRIBE_SCRIPTHASH.value, [scripthash])
+                    for scripthash in chunk
+                ]
+            )
+            for scripthash, status in zip(chunk, results):
+                if isinstance(status, ElectrumRequestError):
+                    LOGGER.error(
+                        f"Could not subscribe to scripthash {scripthash}: {status}"
+                    )
+                    continue
+                subscribed.add(scripthash)
+                if status != statuses[scripthash]:
+                    # the script changed since it was scanned
+                    changed.set()
+
+        if len(scripthashes) > 0:
+            LOGGER.info(
+                "Subscribed to the wallet's scripts",
+                scripts=len(scripthashes),
+                subscribed=len(subscribed),
+            )
+
+    async def _wait_for_wake_up(
+        self, timeout: float, changed: Optional[asyncio.Event] = None
+    ) -> None:
+        assert self._wake is not None
+        waiters = [asyncio.ensure_future(self._wake.wait())]
+        if changed is not None:
+            waiters.append(asyncio.ensure_future(changed.wait()))
+        try:
+            await asyncio.wait(
+                waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        self._wake.clear()
+
+    def _handle_notification(
+        self, method: str, params: List[Any], changed: asyncio.Event
+    ) -> None:
+        if method == ElectrumMethod.SUBSCRIBE_HEADERS.value and len(params) > 0:
+            self._handle_tip(params[0], changed)
+        elif method == ElectrumMethod.SUBSCRIBE_SCRIPTHASH.value and len(params) > 1:
+            scripthash, status = params[0], params[1]
+            with self._lock:
+                is_changed = (
+                    scripthash in self._statuses
+                    and self._statuses[scripthash] != status
+                )
+            if is_changed:
+                changed.set()
+
+    def _handle_tip(self, header: Any, changed: asyncio.Event) -> None:
+        height = header.get("height") if isinstance(header, dict) else None
+        if height is None:
+            return
+        with self._lock:
+            if self._tip_height is not None and height > self._tip_height:
+                self._new_tip_height = height
+                changed.set()
+            self._tip_height = height
+
+    def _notify_change(self) -> None:
+        with self._lock:
+            on_change = self._on_change
+            new_tip_height = self._new_tip_height
+            self._new_tip_height = None
+
+        if on_change is None:
+            return
+        try:
+            on_change(new_tip_height)
+        except Exception as e:
+            LOGGER.error("Error handling an electrum notification", error=str(e))
+
+
+_wallet_subscriber: Optional[WalletSubscriber] = None
+
+
+def get_wallet_subscriber() -> WalletSubscriber:
+    """Get the shared wallet subscriber."""
+    global _wallet_subscriber
+    if _wallet_subscriber is None:
+        _wallet_subscriber = WalletSubscriber()
+    return _wallet_subscriber
@@ -0,0 +1,283 @@
+from dataclasses import dataclass, field, replace
+from threading import Condition, Thread
+from typing import Callable, Literal, Optional, Tuple
+import time
+
+import bdkpython as bdk
+import structlog
+
+LOGGER = structlog.get_logger()
+
+# sync the connected wallet at least this often, electrum notifications
+# of changes to the wallet also queue a sync as soon as they arrive
+DEFAULT_SYNC_INTERVAL_SECONDS = 120.0
+
+WalletSyncJobState = Literal["queued", "running", "succeeded", "failed"]
+
+# open a bdk wallet and the blockchain to sync it with,
+# or return None if the published wallet is already up to date
+OpenWallet = Callable[[], Optional[Tuple[bdk.Wallet, bdk.Blockchain]]]
+# publish a wallet that finished syncing, called with the wallet's id
+OnWalletSynced = Callable[[Optional[str], bdk.Wallet, bdk.Blockchain], None]
+
+
+@dataclass(frozen=True)
+class WalletSyncJob:
+    id: int
+    wallet_id: Optional[str]
+    state: WalletSyncJobState = "queued"
+    # the percentage reported by bdk's sync progress callback
+    progress: float = 0.0
+    message: Optional[str] = None
+    error: Optional[str] = None
+    queued_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class WalletSyncProgress(bdk.Progress):
+    """Forward bdk's sync progress updates."""
+
+    def __init__(self, on_update: Callable[[float, Optional[str]], None]):
+        self._on_update = on_update
+
+    def update(self, progress: float, message: Optional[str]):
+        self._on_update(progress, message)
+
+
+class WalletSyncWorker:
+    """Sync the connected wallet in a background thread,
+    on a schedule and whenever a sync is requested.
+
+    Every sync opens a new bdk wallet, syncs it and only then publishes it,
+    bdk locks a wallet for the whole of a sync, therefore the wallet that
+    is currently published keeps serving the last synced state in the meantime.
+    The new wallet is opened on a copy of the published wallet's bdk database,
+    so the sync only has to fetch what changed since the last one without
+    writing to the database the published wallet is reading.
+    If open_wallet finds that the published wallet is still up to date,
+    the sync is skipped altogether.
+
+    Sync requests that come in while a sync is already queued share that job.
+    """
+
+    def __init__(self, sync_interval_seconds: float = DEFAULT_SYNC_INTERVAL_SECONDS):
+        self.sync_interval_seconds = sync_interval_seconds
+
+        self._condition = Condition()
+        self._wallet_id: Optional[str] = None
+        self._open_wallet: Optional[OpenWallet] = None
+        self._on_synced: Optional[OnWalletSynced] = None
+        # bumped whenever the wallet changes, so that a sync
+        # of the previous wallet that is still running is not published.
+        self._generation = 0
+        self._next_job_id = 0
+        self._next_sync_at = 0.0
+        self._queued_job: Optional[WalletSyncJob] = None
+        self._running_job: Optional[WalletSyncJob] = None
+        self._finished_job: Optional[WalletSyncJob] = None
+        self._last_synced_at: Optional[float] = None
+        self._thread: Optional[Thread] = None
+
+    @property
+    def wallet_id(self) -> Optional[str]:
+        return self._wallet_id
+
+    @property
+    def last_synced_at(self) -> Optional[float]:
+        """When the last successful sync of the current wallet finished."""
+        return self._last_synced_at
+
+    def get_job(self) -> Optional[WalletSyncJob]:
+        """Get the running job, else the queued one, else the last finished one."""
+        with self._condition:
+            return self._running_job or self._queued_job or self._finished_job
+
+    def set_wallet(
+        self,
+        wallet_id: Optional[str],
+        open_wallet: OpenWallet,
+        on_synced: OnWalletSynced,
+    ) -> WalletSyncJob:
+        """Sync a different wallet from now on, queuing its first sync.
+
+        If the wallet is already the one being synced, its current job is returned."""
+        with self._condition:
+            if self._open_wallet is not None and self._wallet_id == wallet_id:
+                job = self._running_job or self._queued_job
+                if job is not None:
+                    return job
+            else:
+                self._cancel_queued_job("The wallet was changed")
+                self._generation += 1
+                self._wallet_id = wallet_id
+                self._open_wallet = open_wallet
+                self._on_synced = on_synced
+                self._last_synced_at = None
+                self._finished_job = None
+
+            job = self._queue_job()
+            self._start_thread()
+            return job
+
+    def clear_wallet(self) -> None:
+        """Stop syncing the current wallet."""
+        with self._condition:
+            self._cancel_queued_job("The wallet was removed")
+            self._generation += 1
+            self._wallet_id = None
+            self._open_wallet = None
+            self._on_synced = None
+            self._last_synced_at = None
+            self._condition.notify_all()
+
+    def request_sync(self) -> Optional[WalletSyncJob]:
+        """Queue a sync of the current wallet, return None if there is no wallet."""
+        with self._condition:
+            if self._open_wallet is None:
+                return None
+            job = self._queue_job()
+            self._start_thread()
+            return job
+
+    def wait(
+        self, job_id: int, timeout: Optional[float] = None
+    ) -> Optional[WalletSyncJob]:
+        """Wait for the job to finish and return it,
+        or None if it did not finish within the timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                job = self._finished_job
+                if job is not None and job.id >= job_id:
+                    return job
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    def _queue_job(self) -> WalletSyncJob:
+        if self._queued_job is None:
+            self._next_job_id += 1
+            self._queued_job = WalletSyncJob(
+                id=self._next_job_id, wallet_id=self._wallet_id
+            )
+            self._condition.notify_all()
+        return self._queued_job
+
+    def _cancel_queued_job(self, error: str) -> None:
+        if self._queued_job is None:
+            return
+        self._finished_job = replace(
+            self._queued_job, state="failed", error=error, finished_at=time.time()
+        )
+        self._queued_job = None
+        self._condition.notify_all()
+
+    def _start_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = Thread(target=self._run, name="wallet_sync", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._queued_job is None:
+                    if self._open_wallet is None:
+                        self._condition.wait()
+                        continue
+                    remaining = self._next_sync_at - time.monotonic()
+                    if remaining <= 0:
+                        self._queue_job()
+                        break
+                    self._condition.wait(remaining)
+
+                job = replace(self._queued_job, state="running", started_at=time.time())
+                self._queued_job = None
+                self._running_job = job
+                generation = self._generation
+                open_wallet = self._open_wallet
+                on_synced = self._on_synced
+
+            self._sync(job, generation, open_wallet, on_synced)
+
+    def _sync(
+        self,
+        job: WalletSyncJob,
+        generation: int,
+        open_wallet: OpenWallet,
+        on_synced: OnWalletSynced,
+    ) -> None:
+        LOGGER.info("Wallet sync started", job_id=job.id, wallet_id=job.wallet_id)
+        started_at = time.monotonic()
+        error = None
+        opened_wallet = None
+        try:
+            opened_wallet = open_wallet()
+            if opened_wallet is not None:
+                wallet, blockchain = opened_wallet
+                wallet.sync(
+                    blockchain,
+                    WalletSyncProgress(
+                        lambda progress, message: self._update_progress(
+                            job.id, progress, message
+                        )
+                    ),
+                )
+        except Exception as e:
+            error = str(e)
+            LOGGER.error("Wallet sync failed", job_id=job.id, error=error)
+
+        with self._condition:
+            if error is None and generation != self._generation:
+                error = "The wallet was changed while it was syncing"
+            elif error is None:
+                if opened_wallet is not None:
+                    on_synced(job.wallet_id, *opened_wallet)
+                self._last_synced_at = time.time()
+
+            running_job = self._running_job or job
+            finished_job = replace(
+                running_job,
+                state="failed" if error else "succeeded",
+                progress=running_job.progress if error else 100.0,
+                message=(
+                    "The wallet has not changed since the last sync"
+                    if error is None and opened_wallet is None
+                    else running_job.message
+                ),
+                error=error,
+                finished_at=time.time(),
+            )
+            self._finished_job = finished_job
+            self._running_job = None
+            self._next_sync_at = time.monotonic() + self.sync_interval_seconds
+            self._condition.notify_all()
+
+        LOGGER.info(
+            "Wallet sync finished",
+            job_id=job.id,
+            state=finished_job.state,
+            seconds=round(time.monotonic() - started_at, 3),
+        )
+
+    def _update_progress(
+        self, job_id: int, progress: float, message: Optional[str]
+    ) -> None:
+        with self._condition:
+            if self._running_job is not None and self._running_job.id == job_id:
+                self._running_job = replace(
+                    self._running_job, progress=progress, message=message
+                )
+
+
+_wallet_sync_worker: Optional[WalletSyncWorker] = None
+
+
+def get_wallet_sync_worker() -> WalletSyncWorker:
+    """Get the shared wallet sync worker."""
+    global _wallet_sync_worker
+    if _wallet_sync_worker is None:
+        _wallet_sync_worker = WalletSyncWorker()
+    return _wallet_sync_worker
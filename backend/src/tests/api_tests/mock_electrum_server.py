@@ -0,0 +1,77 @@
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import json
+
+
+class MockElectrumServer:
+    """A local json-rpc server for testing the electrum client.
+
+    Each request is answered with the result of calling respond(method, params),
+    if respond raises an exception the request is answered with an error.
+    Requests for a method in delays are answered after that many seconds,
+    which allows responses to be sent back out of order.
+    """
+
+    def __init__(
+        self,
+        respond: Optional[Callable[[str, List[Any]], Any]] = None,
+        delays: Optional[Dict[str, float]] = None,
+    ):
+        self.respond = respond or (lambda method, params: params)
+        self.delays = delays or {}
+        self.received_messages: List[Any] = []
+        self.connection_count = 0
+        self.closed_connection_count = 0
+        self.writers: List[asyncio.StreamWriter] = []
+        self.port: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "MockElectrumServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in self.writers:
+                writer.close()
+            await self._server.wait_closed()
+
+    async def notify(self, method: str, params: List[Any]) -> None:
+        """Send a notification (a message without an id) to every connection."""
+        notification = {"jsonrpc": "2.0", "method": method, "params": params}
+        for writer in self.writers:
+            writer.write((json.dumps(notification) + "\n").encode("utf-8"))
+            await writer.drain()
+
+    async def _handle(self, reader, writer):
+        self.connection_count += 1
+        self.writers.append(writer)
+        while True:
+            line = await reader.readline()
+            if not line:
+                self.closed_connection_count += 1
+                break
+            message = json.loads(line)
+            self.received_messages.append(message)
+            asyncio.create_task(self._answer(message, writer))
+
+    async def _answer(self, message, writer):
+        if isinstance(message, list):
+            delay = max([self.delays.get(request["method"], 0) for request in message])
+            response: Any = [self._response_for(request) for request in message]
+        else:
+            delay = self.delays.get(message["method"], 0)
+            response = self._response_for(message)
+
+        await asyncio.sleep(delay)
+        writer.write((json.dumps(response) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    def _response_for(self, request: dict) -> dict:
+        try:
+            result = self.respond(request["method"], request["params"])
+            return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": str(e)}
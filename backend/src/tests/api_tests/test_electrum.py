@@ -5,22 +5,62 @@ from src.api.electrum import (
     ElectrumResponse,
     parse_electrum_url,
     electrum_request,
+    electrum_batch_request,
+    electrum_raw_batch_request,
+    electrum_scripthash_batch_request,
     ElectrumMethod,
     GetTransactionsRequestParams,
 )
-from unittest.mock import patch, Mock
+from unittest.mock import AsyncMock, patch, Mock
+from src.api.electrum_client import ElectrumRequestError
+from src.api.electrum_pool import close_connection_pools
+from src.tests.api_tests.mock_electrum_server import MockElectrumServer
 from src.tests.mocks import (
-    mock_electrum_get_transactions_response_json,
+    mock_electrum_get_transactions_response,
     mock_electrum_get_transactions_response_parsed,
 )
-import socket
+import json
+
+
+def create_batch_electrum_server(received_batches: list):
+    """Create a handler for a fake electrum server that answers every
+    blockchain.transaction.get request in a batch with the mock transaction,
+    except for the txid "missing" which gets an error response."""
+
+    async def handler(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            batch = json.loads(line)
+            received_batches.append(batch)
+            responses = []
+            for request in batch:
+                if request["params"][0] == "missing":
+                    responses.append(
+                        {"jsonrpc": "2.0", "id": request["id"], "error": "not found"}
+                    )
+                else:
+                    responses.append(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": request["id"],
+                            "result": mock_electrum_get_transactions_response[
+                                "result"
+                            ],
+                        }
+                    )
+            writer.write((json.dumps(responses) + "\n").encode("utf-8"))
+            await writer.drain()
+        writer.close()
+
+    return handler
 
 
 class TestElectrumApi(TestCase):
     def setUp(self):
         self.mock_url = "blockstream"
         self.mock_port = 1234
-        self.mock_request_id = 432
         self.mock_tx_id = "mockTxId"
 
     def test_parse_electrum_url(self):
@@ -35,47 +75,175 @@ class TestElectrumApi(TestCase):
         assert port is None
         assert url is None
 
-    async def test_get_transactions_electrum_request_success(self):
+    def test_get_transactions_electrum_request_success(self):
         request_method = ElectrumMethod.GET_TRANSACTIONS
 
-        with patch.object(asyncio, "open_connection") as mock_socket:
-            mock_live_socket = Mock()
-            mock_socket.return_value.__enter__.return_value = mock_live_socket
-            mock_live_socket.recv.return_value = (
-                mock_electrum_get_transactions_response_json.encode("utf-8")
+        with patch("src.api.electrum.get_connection_pool") as mock_get_connection_pool:
+            mock_client = Mock()
+            mock_client.request = AsyncMock(
+                return_value=mock_electrum_get_transactions_response["result"]
             )
-
-            response = await electrum_request(
-                self.mock_url,
-                self.mock_port,
-                request_method,
-                GetTransactionsRequestParams(self.mock_tx_id, False),
-                self.mock_request_id,
+            mock_get_connection_pool.return_value.get_client = AsyncMock(
+                return_value=mock_client
             )
-            mock_socket.assert_called_with(socket.AF_INET, socket.SOCK_STREAM)
-            mock_live_socket.connect.assert_called_with((self.mock_url, self.mock_port))
 
-            mock_live_socket.recv.assert_called_with(4096)
+            response = asyncio.run(
+                electrum_request(
+                    self.mock_url,
+                    self.mock_port,
+                    request_method,
+                    GetTransactionsRequestParams(self.mock_tx_id, False),
+                )
+            )
+            mock_get_connection_pool.assert_called_with(self.mock_url, self.mock_port)
+            mock_client.request.assert_called_with(
+                request_method.value, [self.mock_tx_id, False], timeout=None
+            )
 
             assert response == ElectrumResponse(
                 status="success", data=mock_electrum_get_transactions_response_parsed
             )
 
-    async def test_get_transactions_electrum_request_error(self):
+    def test_get_transactions_electrum_request_error(self):
         request_method = ElectrumMethod.GET_TRANSACTIONS
 
-        with patch.object(asyncio, "open_connection") as mock_socket:
-            mock_live_socket = Mock()
-            mock_socket.return_value.__enter__.return_value = mock_live_socket
+        with patch("src.api.electrum.get_connection_pool") as mock_get_connection_pool:
+            mock_client = Mock()
             # bad electrum response
-            mock_live_socket.recv.return_value = None
-
-            response = await electrum_request(
-                self.mock_url,
-                self.mock_port,
-                request_method,
-                GetTransactionsRequestParams(self.mock_tx_id, False),
-                self.mock_request_id,
+            mock_client.request = AsyncMock(
+                side_effect=ElectrumRequestError("not found")
+            )
+            mock_get_connection_pool.return_value.get_client = AsyncMock(
+                return_value=mock_client
+            )
+
+            response = asyncio.run(
+                electrum_request(
+                    self.mock_url,
+                    self.mock_port,
+                    request_method,
+                    GetTransactionsRequestParams(self.mock_tx_id, False),
+                )
             )
 
             assert response == ElectrumResponse(status="error", data=None)
+
+    def test_electrum_batch_request_returns_transactions_by_txid(self):
+        received_batches = []
+
+        async def run():
+            server = await asyncio.start_server(
+                create_batch_electrum_server(received_batches), "127.0.0.1", 0
+            )
+            port = server.sockets[0].getsockname()[1]
+
+            response = await electrum_batch_request(
+                "127.0.0.1",
+                port,
+                [
+                    GetTransactionsRequestParams("txid1", False),
+                    GetTransactionsRequestParams("txid2", False),
+                    # duplicate txids are only requested once
+                    GetTransactionsRequestParams("txid1", False),
+                    GetTransactionsRequestParams("txid3", False),
+                ],
+                chunk_size=2,
+            )
+            close_connection_pools()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        response = asyncio.run(run())
+
+        assert sorted(response.keys()) == ["txid1", "txid2", "txid3"]
+        assert response["txid1"] == mock_electrum_get_transactions_response_parsed
+        assert sorted(len(batch) for batch in received_batches) == [1, 2]
+
+    def test_electrum_batch_request_skips_errored_transactions(self):
+        received_batches = []
+
+        async def run():
+            server = await asyncio.start_server(
+                create_batch_electrum_server(received_batches), "127.0.0.1", 0
+            )
+            port = server.sockets[0].getsockname()[1]
+
+            response = await electrum_batch_request(
+                "127.0.0.1",
+                port,
+                [
+                    GetTransactionsRequestParams("txid1", False),
+                    GetTransactionsRequestParams("missing", False),
+                ],
+            )
+            close_connection_pools()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        response = asyncio.run(run())
+
+        assert list(response.keys()) == ["txid1"]
+
+    def test_electrum_raw_batch_request_returns_raw_bytes_by_txid(self):
+        received_batches = []
+
+        async def run():
+            server = await asyncio.start_server(
+                create_batch_electrum_server(received_batches), "127.0.0.1", 0
+            )
+            port = server.sockets[0].getsockname()[1]
+
+            response = await electrum_raw_batch_request(
+                "127.0.0.1",
+                port,
+                [
+                    GetTransactionsRequestParams("txid1", False),
+                    GetTransactionsRequestParams("missing", False),
+                ],
+            )
+            close_connection_pools()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        response = asyncio.run(run())
+
+        assert response == {
+            "txid1": mock_electrum_get_transactions_response_parsed.rawtx
+        }
+
+    def test_electrum_scripthash_batch_request_returns_results_by_scripthash(self):
+        def respond(method, params):
+            if params[0] == "missing":
+                raise ValueError("mock error")
+            return [{"tx_hash": f"txid_{params[0]}", "height": 100}]
+
+        async def run():
+            server = await MockElectrumServer(respond).start()
+
+            response = await electrum_scripthash_batch_request(
+                "127.0.0.1",
+                server.port,
+                ElectrumMethod.GET_SCRIPTHASH_HISTORY,
+                ["scripthash1", "scripthash2", "scripthash1", "missing"],
+                chunk_size=2,
+            )
+            close_connection_pools()
+            await server.stop()
+            return response, server.received_messages
+
+        response, received_messages = asyncio.run(run())
+
+        assert response == {
+            "scripthash1": [{"tx_hash": "txid_scripthash1", "height": 100}],
+            "scripthash2": [{"tx_hash": "txid_scripthash2", "height": 100}],
+        }
+        # the duplicate scripthash is only requested once, in batches of chunk_size
+        assert [len(batch) for batch in received_messages] == [2, 1]
+        assert all(
+            request["method"] == "blockchain.scripthash.get_history"
+            for batch in received_messages
+            for request in batch
+        )
@@ -0,0 +1,181 @@
+import asyncio
+from unittest.case import TestCase
+
+from src.api.electrum_client import ElectrumClient, ElectrumRequestError
+from src.api.electrum_limiter import AdaptiveConcurrencyLimiter
+from src.tests.api_tests.mock_electrum_server import MockElectrumServer
+
+
+class TestElectrumClient(TestCase):
+    def test_request_returns_result(self):
+        async def run():
+            server = await MockElectrumServer().start()
+            client = ElectrumClient("127.0.0.1", server.port)
+            await client.connect()
+
+            result = await client.request("server.ping", ["hello"])
+
+            await client.close()
+            await server.stop()
+            return result
+
+        assert asyncio.run(run()) == ["hello"]
+
+    def test_responses_are_routed_by_id(self):
+        async def run():
+            # the slow request is answered after the fast one
+            server = await MockElectrumServer(delays={"slow": 0.05}).start()
+            client = ElectrumClient("127.0.0.1", server.port)
+            await client.connect()
+
+            results = await asyncio.gather(
+                client.request("slow", ["slow result"]),
+                client.request("fast", ["fast result"]),
+            )
+
+            await client.close()
+            await server.stop()
+            return results, server.connection_count
+
+        results, connection_count = asyncio.run(run())
+
+        assert results == [["slow result"], ["fast result"]]
+        # both requests were sent over the same socket
+        assert connection_count == 1
+
+    def test_batch_request_returns_results_in_request_order(self):
+        def respond(method, params):
+            if params[0] == "missing":
+                raise ValueError("not found")
+            return params[0]
+
+        async def run():
+            server = await MockElectrumServer(respond=respond).start()
+            client = ElectrumClient("127.0.0.1", server.port)
+            await client.connect()
+
+            results = await client.batch_request(
+                [("get", ["a"]), ("get", ["missing"]), ("get", ["b"])]
+            )
+
+            await client.close()
+            await server.stop()
+            return results, server.received_messages
+
+        results, received_messages = asyncio.run(run())
+
+        assert results[0] == "a"
+        assert isinstance(results[1], ElectrumRequestError)
+        assert results[2] == "b"
+        # the batch was sent as a single message
+        assert len(received_messages) == 1
+
+    def test_request_error_is_raised(self):
+        def respond(method, params):
+            raise ValueError("bad request")
+
+        async def run():
+            server = await MockElectrumServer(respond=respond).start()
+            client = ElectrumClient("127.0.0.1", server.port)
+            await client.connect()
+            try:
+                await client.request("get", [])
+            finally:
+                await client.close()
+                await server.stop()
+
+        with self.assertRaises(ElectrumRequestError):
+            asyncio.run(run())
+
+    def test_request_timeout(self):
+        async def run():
+            server = await MockElectrumServer(delays={"slow": 1}).start()
+            client = ElectrumClient("127.0.0.1", server.port)
+            await client.connect()
+            try:
+                await client.request("slow", [], timeout=0.01)
+            finally:
+                await client.close()
+                await server.stop()
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(run())
+
+    def test_max_inflight_limits_requests_sent(self):
+        async def run():
+            server = await MockElectrumServer(delays={"slow": 0.05}).start()
+            client = ElectrumClient("127.0.0.1", server.port, max_inflight=2)
+            await client.connect()
+
+            requests = asyncio.gather(
+                *[client.request("slow", [index]) for index in range(5)]
+            )
+            await asyncio.sleep(0.02)
+            sent_while_inflight = len(server.received_messages)
+            results = await requests
+
+            await client.close()
+            await server.stop()
+            return sent_while_inflight, results
+
+        sent_while_inflight, results = asyncio.run(run())
+
+        assert sent_while_inflight == 2
+        assert results == [[0], [1], [2], [3], [4]]
+
+    def test_only_written_requests_count_towards_the_limiter(self):
+        limiter = AdaptiveConcurrencyLimiter("mock_server", initial_limit=10)
+
+        async def run():
+            server = await MockElectrumServer(
+                respond=lambda method, params: params[0], delays={"slow": 0.05}
+            ).start()
+            client = ElectrumClient(
+                "127.0.0.1", server.port, max_inflight=1, limiter=limiter
+            )
+            await client.connect()
+
+            slow_request = asyncio.create_task(client.request("slow", ["slow"]))
+            await asyncio.sleep(0)
+            # timed out waiting for the inflight window, it was never sent
+            with self.assertRaises(asyncio.TimeoutError):
+                await client.request("queued", ["queued"], timeout=0.01)
+            assert await slow_request == "slow"
+            assert limiter.stats()["failures"] == 0
+
+            # the server answered one of the batch's requests with an error
+            await client.batch_request([("get", ["a"]), ("get", [])])
+
+            await client.close()
+            await server.stop()
+
+        asyncio.run(run())
+
+        assert limiter.stats()["successes"] == 1
+        assert limiter.stats()["failures"] == 2
+
+    def test_notifications_are_passed_to_the_handler(self):
+        notifications = []
+
+        async def run():
+            server = await MockElectrumServer().start()
+            client = ElectrumClient(
+                "127.0.0.1",
+                server.port,
+                notification_handler=lambda method, params: notifications.append(
+                    (method, params)
+                ),
+            )
+            await client.connect()
+            # make sure the server has accepted the connection
+            await client.request("server.ping", [])
+
+            await server.notify("blockchain.headers.subscribe", [{"height": 1}])
+            await asyncio.sleep(0.02)
+
+            await client.close()
+            await server.stop()
+
+        asyncio.run(run())
+
+        assert notifications == [("blockchain.headers.subscribe", [{"height": 1}])]
@@ -0,0 +1,71 @@
+import asyncio
+from unittest.case import TestCase
+
+from src.api.electrum_frame_reader import (
+    ElectrumFrameReader,
+    ElectrumFrameTooLargeError,
+    ElectrumFrameTruncatedError,
+)
+
+
+def create_stream_reader(chunks: list[bytes], eof: bool = True) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    for chunk in chunks:
+        reader.feed_data(chunk)
+    if eof:
+        reader.feed_eof()
+    return reader
+
+
+class TestElectrumFrameReader(TestCase):
+    def test_reads_multiple_frames_from_one_chunk(self):
+        async def run():
+            frame_reader = ElectrumFrameReader(
+                create_stream_reader([b'{"id": 1}\n{"id": 2}\n'])
+            )
+            return [
+                await frame_reader.read_frame(),
+                await frame_reader.read_frame(),
+                await frame_reader.read_frame(),
+            ]
+
+        assert asyncio.run(run()) == [b'{"id": 1}', b'{"id": 2}', None]
+
+    def test_reads_a_large_frame_split_across_many_small_reads(self):
+        large_result = "ab" * (3 * 1024 * 1024)
+        message = f'{{"id": 1, "result": "{large_result}"}}\n'.encode("utf-8")
+        # split the frame into chunks that are shorter than the read size
+        # like a slow connection would
+        chunks = [
+            message[index: index + 1000] for index in range(0, len(message), 1000)
+        ]
+
+        async def run():
+            frame_reader = ElectrumFrameReader(
+                create_stream_reader(chunks), read_size=4096
+            )
+            return await frame_reader.read_frame()
+
+        assert asyncio.run(run()) == message[:-1]
+
+    def test_frame_larger_than_max_frame_size_raises(self):
+        async def run():
+            frame_reader = ElectrumFrameReader(
+                create_stream_reader([b"a" * 100, b"a" * 100, b"\n"]),
+                max_frame_size=150,
+                read_size=100,
+            )
+            await frame_reader.read_frame()
+
+        with self.assertRaises(ElectrumFrameTooLargeError):
+            asyncio.run(run())
+
+    def test_connection_closed_part_way_through_a_frame_raises(self):
+        async def run():
+            frame_reader = ElectrumFrameReader(
+                create_stream_reader([b'{"id": 1, "res'])
+            )
+            await frame_reader.read_frame()
+
+        with self.assertRaises(ElectrumFrameTruncatedError):
+            asyncio.run(run())
@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+from unittest.case import TestCase
+
+from src.api.electrum_limiter import AdaptiveConcurrencyLimiter
+
+
+class TestAdaptiveConcurrencyLimiter(TestCase):
+    def test_limit_increases_after_successful_requests(self):
+        limiter = AdaptiveConcurrencyLimiter("mock_server", initial_limit=4)
+
+        for _ in range(3):
+            limiter.record_success(time.monotonic(), latency=0.1)
+        assert limiter.limit == 4
+
+        # the increment shrinks as the limit grows
+        for _ in range(3):
+            limiter.record_success(time.monotonic(), latency=0.1)
+        assert limiter.limit == 5
+
+    def test_limit_does_not_go_above_max_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            "mock_server", initial_limit=2, max_limit=2
+        )
+
+        for _ in range(10):
+            limiter.record_success(time.monotonic(), latency=0.1)
+
+        assert limiter.limit == 2
+
+    def test_limit_decreases_on_failure(self):
+        limiter = AdaptiveConcurrencyLimiter("mock_server", initial_limit=10)
+
+        limiter.record_failure(time.monotonic())
+
+        assert limiter.limit == 5
+
+    def test_limit_decreases_on_slow_response(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            "mock_server", initial_limit=10, latency_target_seconds=1
+        )
+
+        limiter.record_success(time.monotonic(), latency=2)
+
+        assert limiter.limit == 5
+
+    def test_requests_already_in_flight_only_decrease_the_limit_once(self):
+        limiter = AdaptiveConcurrencyLimiter("mock_server", initial_limit=16)
+        started_at = time.monotonic()
+
+        # every request in the window failed at the same time
+        for _ in range(4):
+            limiter.record_failure(started_at)
+
+        assert limiter.limit == 8
+
+    def test_limit_does_not_go_below_min_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            "mock_server", initial_limit=2, min_limit=1
+        )
+
+        for _ in range(3):
+            limiter.record_failure(time.monotonic())
+            time.sleep(0.001)
+
+        assert limiter.limit == 1
+
+    def test_acquire_limits_concurrent_requests(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            "mock_server", initial_limit=3, max_limit=3
+        )
+        inflight = 0
+        max_inflight = 0
+
+        async def make_request():
+            nonlocal inflight, max_inflight
+            async with limiter.acquire():
+                inflight += 1
+                max_inflight = max(max_inflight, inflight)
+                await asyncio.sleep(0.01)
+                inflight -= 1
+
+        async def run():
+            await asyncio.gather(*[make_request() for _ in range(10)])
+
+        asyncio.run(run())
+
+        assert max_inflight == 3
+        assert limiter.inflight == 0
+
+    def test_batches_take_a_slot_for_each_of_their_requests(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            "mock_server", initial_limit=4, max_limit=4
+        )
+
+        async def run():
+            async with limiter.acquire(weight=3):
+                assert limiter.inflight == 3
+                with self.assertRaises(asyncio.TimeoutError):
+                    async with limiter.acquire(timeout=0.01, weight=2):
+                        pass
+                async with limiter.acquire(timeout=0.01):
+                    assert limiter.inflight == 4
+            # a batch larger than the limit is sent on its own
+            async with limiter.acquire(timeout=0.01, weight=10):
+                assert limiter.inflight == 10
+
+        asyncio.run(run())
+
+        assert limiter.inflight == 0
+        assert limiter.stats()["successes"] == 14
+
+    def test_failed_slots_are_recorded_as_failures(self):
+        limiter = AdaptiveConcurrencyLimiter("mock_server", initial_limit=10)
+
+        async def run():
+            async with limiter.acquire(weight=2) as slot:
+                slot.fail()
+
+        asyncio.run(run())
+
+        assert limiter.limit == 5
+        assert limiter.stats()["failures"] == 2
+        assert limiter.stats()["successes"] == 0
+
+    def test_acquire_records_exceptions_as_failures(self):
+        limiter = AdaptiveConcurrencyLimiter("mock_server", initial_limit=10)
+
+        async def run():
+            async with limiter.acquire():
+                raise asyncio.TimeoutError()
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(run())
+
+        assert limiter.limit == 5
+        assert limiter.stats()["failures"] == 1
+
+    def test_waiting_for_a_slot_times_out(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            "mock_server", initial_limit=1, max_limit=1
+        )
+
+        async def run():
+            async with limiter.acquire():
+                with self.assertRaises(asyncio.TimeoutError):
+                    async with limiter.acquire(timeout=0.01):
+                        pass
+            # the request that timed out did not take a slot
+            async with limiter.acquire(timeout=0.01):
+                pass
+
+        asyncio.run(run())
+
+        assert limiter.inflight == 0
+        # waiting for a slot is not a failure of the server
+        assert limiter.stats()["failures"] == 0
+
+    def test_requests_of_concurrent_event_loops_are_limited_separately(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            "mock_server", initial_limit=1, max_limit=1
+        )
+        holding = threading.Event()
+        release = threading.Event()
+
+        async def hold_slot():
+            async with limiter.acquire():
+                holding.set()
+                while not release.is_set():
+                    await asyncio.sleep(0.01)
+
+        async def make_requests():
+            await asyncio.gather(
+                *[asyncio.wait_for(wait_for_slot(), 5) for _ in range(3)]
+            )
+
+        async def wait_for_slot():
+            async with limiter.acquire():
+                await asyncio.sleep(0.01)
+
+        thread = threading.Thread(target=lambda: asyncio.run(hold_slot()))
+        thread.start()
+        assert holding.wait(5)
+
+        # neither the slot held by the other loop nor its waiters are lost
+        asyncio.run(make_requests())
+        assert limiter.inflight == 1
+
+        release.set()
+        thread.join(5)
+        assert limiter.inflight == 0
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+from unittest.case import TestCase
+
+from src.api.electrum_pool import (
+    ElectrumConnectionPool,
+    close_connection_pools,
+    get_connection_pool,
+)
+from src.tests.api_tests.mock_electrum_server import MockElectrumServer
+
+
+class TestElectrumConnectionPool(TestCase):
+    def tearDown(self):
+        close_connection_pools()
+
+    def test_connections_are_reused(self):
+        async def run():
+            server = await MockElectrumServer().start()
+            pool = ElectrumConnectionPool("127.0.0.1", server.port, max_size=2)
+
+            first_client = await pool.get_client()
+            assert await first_client.request("server.ping", ["ping"]) == ["ping"]
+            second_client = await pool.get_client()
+
+            assert first_client is second_client
+            assert pool.size == 1
+            assert server.connection_count == 1
+
+            pool.close()
+            await server.stop()
+
+        asyncio.run(run())
+
+    def test_new_connection_is_opened_when_inflight_window_is_full(self):
+        async def run():
+            server = await MockElectrumServer(delays={"slow": 0.05}).start()
+            pool = ElectrumConnectionPool("127.0.0.1", server.port, max_size=2)
+
+            first_client = await pool.get_client()
+            first_client.max_inflight = 1
+            request = asyncio.create_task(first_client.request("slow", []))
+            await asyncio.sleep(0)
+
+            second_client = await pool.get_client()
+            second_client.max_inflight = 1
+            second_request = asyncio.create_task(second_client.request("slow", []))
+            await asyncio.sleep(0)
+
+            # the pool is full, therefore the least busy client is reused
+            third_client = await pool.get_client()
+
+            assert first_client is not second_client
+            assert third_client in (first_client, second_client)
+            assert pool.size == 2
+
+            await asyncio.gather(request, second_request)
+            pool.close()
+            await server.stop()
+
+        asyncio.run(run())
+
+    def test_unhealthy_connections_are_replaced(self):
+        async def run():
+            server = await MockElectrumServer().start()
+            pool = ElectrumConnectionPool("127.0.0.1", server.port)
+
+            first_client = await pool.get_client()
+            await first_client.close()
+            second_client = await pool.get_client()
+
+            assert first_client is not second_client
+            assert pool.size == 1
+
+            pool.close()
+            await server.stop()
+
+        asyncio.run(run())
+
+    def test_expired_idle_connections_are_evicted(self):
+        async def run():
+            server = await MockElectrumServer().start()
+            pool = ElectrumConnectionPool("127.0.0.1", server.port, idle_timeout=0)
+
+            await pool.get_client()
+            await asyncio.sleep(0.01)
+
+            assert pool.evict_idle_connections() == 1
+            assert pool.size == 0
+
+            await server.stop()
+
+        asyncio.run(run())
+
+    def test_get_connection_pool_is_shared_per_server(self):
+        async def run():
+            pool = get_connection_pool("127.0.0.1", 50000)
+
+            assert get_connection_pool("127.0.0.1", "50000") is pool
+            assert get_connection_pool("127.0.0.1", 50001) is not pool
+            return pool
+
+        # and each event loop has pools of its own
+        assert asyncio.run(run()) is not asyncio.run(run())
+
+    def test_pools_of_concurrent_event_loops_do_not_disrupt_each_other(self):
+        # the server runs in a loop of its own, like the electrum server would
+        server_loop = asyncio.new_event_loop()
+        server_thread = threading.Thread(target=server_loop.run_forever, daemon=True)
+        server_thread.start()
+        server = asyncio.run_coroutine_threadsafe(
+            MockElectrumServer(delays={"slow": 0.01}).start(), server_loop
+        ).result(5)
+        results = []
+
+        async def request_many():
+            for index in range(20):
+                pool = get_connection_pool("127.0.0.1", server.port)
+                client = await pool.get_client()
+                results.append(await client.request("slow", [index]))
+
+        threads = [
+            threading.Thread(target=lambda: asyncio.run(request_many()))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        assert len(results) == 40
+        asyncio.run_coroutine_threadsafe(server.stop(), server_loop).result(5)
+        server_loop.call_soon_threadsafe(server_loop.stop)
+        server_thread.join(5)
+
+    def test_pools_are_closed_when_their_event_loop_is_done(self):
+        server_loop = asyncio.new_event_loop()
+        server_thread = threading.Thread(target=server_loop.run_forever, daemon=True)
+        server_thread.start()
+        server = asyncio.run_coroutine_threadsafe(
+            MockElectrumServer().start(), server_loop
+        ).result(5)
+
+        async def request():
+            client = await get_connection_pool("127.0.0.1", server.port).get_client()
+            assert await client.request("server.ping", ["ping"]) == ["ping"]
+
+        async def wait_for_closed_connections(count: int):
+            while server.closed_connection_count < count:
+                await asyncio.sleep(0.01)
+
+        # like two requests, each of which runs a loop of its own
+        asyncio.run(request())
+        asyncio.run_coroutine_threadsafe(
+            wait_for_closed_connections(1), server_loop
+        ).result(5)
+        asyncio.run(request())
+        asyncio.run_coroutine_threadsafe(
+            wait_for_closed_connections(2), server_loop
+        ).result(5)
+
+        assert server.connection_count == 2
+        asyncio.run_coroutine_threadsafe(server.stop(), server_loop).result(5)
+        server_loop.call_soon_threadsafe(server_loop.stop)
+        server_thread.join(5)
+
+    def test_pool_is_bound_to_its_event_loop(self):
+        pool = ElectrumConnectionPool("127.0.0.1", 50000)
+
+        async def bind():
+            pool._bind_to_running_loop()
+
+        asyncio.run(bind())
+        with self.assertRaises(RuntimeError):
+            asyncio.run(bind())
@@ -1,10 +1,12 @@
 from unittest import TestCase
 
-from unittest.mock import MagicMock, Mock, AsyncMock
+from unittest.mock import MagicMock, Mock
 from src.app import AppCreator
 from src.my_types.controller_types.utxos_dtos import (
+    OutputDetailDto,
     OutputLabelDto,
     PopulateOutputLabelsRequestDto,
+    TransactionDetailDto,
 )
 from src.services.wallet.wallet import WalletService
 from src.tests.mocks import (
@@ -26,29 +28,37 @@ class TestTransactionsController(TestCase):
         )
 
     def test_get_transactions(self):
-        get_all_transactions_mock = AsyncMock(
-            return_value=all_transactions_with_details_mock
+        all_transaction_details = []
+        for transaction, transaction_details in all_transactions_with_details_mock:
+            dto = transaction.as_dict()
+            dto["user_spent_amount"] = transaction_details.sent
+            dto["user_received_amount"] = transaction_details.received
+            dto["user_total_amount"] = 100
+            all_transaction_details.append(TransactionDetailDto.model_validate(dto))
+        get_all_transaction_details_mock = MagicMock(
+            return_value=all_transaction_details
         )
         with self.app.container.wallet_service.override(self.mock_wallet_service):
-            self.mock_wallet_service.get_all_transactions = get_all_transactions_mock
+            self.mock_wallet_service.get_all_transaction_details = (
+                get_all_transaction_details_mock
+            )
             get_transactions_response = self.test_client.get("/transactions/")
 
-            get_all_transactions_mock.assert_called_once()
+            get_all_transaction_details_mock.assert_called_once()
 
             assert get_transactions_response.status == "200 OK"
-            expected_response = []
-            for transaction, transaction_details in all_transactions_with_details_mock:
-                dto = transaction.as_dict()
-                dto["user_spent_amount"] = transaction_details.sent
-                dto["user_received_amount"] = transaction_details.received
-                dto["user_total_amount"] = 100
-                expected_response.append(dto)
             assert json.loads(get_transactions_response.data) == {
-                "transactions": expected_response
+                "transactions": [
+                    json.loads(transaction_details.model_dump_json())
+                    for transaction_details in all_transaction_details
+                ]
             }
 
     def test_get_utxos(self):
-        all_outputs = all_outputs_mock
+        all_outputs = [
+            OutputDetailDto.model_validate(output.as_dict())
+            for output in all_outputs_mock
+        ]
         get_all_outputs_mock = MagicMock(return_value=all_outputs)
         with self.app.container.wallet_service.override(self.mock_wallet_service):
             self.mock_wallet_service.get_all_outputs = get_all_outputs_mock
@@ -59,7 +69,7 @@ class TestTransactionsController(TestCase):
 
             assert get_all_outputs_response.status == "200 OK"
             assert json.loads(get_all_outputs_response.data) == {
-                "outputs": [output.as_dict() for output in all_outputs]
+                "outputs": [output.model_dump() for output in all_outputs]
             }
 
     def test_get_output_labels(self):
@@ -4,6 +4,8 @@ from unittest.mock import MagicMock, patch
 from bdkpython import bdk
 
 from src.services import WalletService
+from src.services.wallet.wallet_events import WalletEvent
+from src.services.wallet.wallet_sync import WalletSyncJob
 from src.app import AppCreator
 import json
 
@@ -33,10 +35,17 @@ class TestWalletController(TestCase):
                 },
             )
             wallet_service_mock.create_wallet.assert_called_once_with(
-                descriptor, None, bdk.Network.TESTNET, electrum_url, 101
+                descriptor,
+                None,
+                bdk.Network.TESTNET,
+                electrum_url,
+                101,
+                birthday_height=None,
+                fast_import=False,
             )
 
-            wallet_service_mock.assert_called_once()
+            # the wallet is synced in the background
+            wallet_service_mock.start_wallet_sync.assert_called_once()
 
             assert wallet_response.status == "200 OK"
             assert json.loads(wallet_response.data) == {
@@ -65,10 +74,17 @@ class TestWalletController(TestCase):
                 },
             )
             wallet_service_mock.create_wallet.assert_called_once_with(
-                descriptor, change_descriptor, bdk.Network.TESTNET, electrum_url, 101
+                descriptor,
+                change_descriptor,
+                bdk.Network.TESTNET,
+                electrum_url,
+                101,
+                birthday_height=None,
+                fast_import=False,
             )
 
-            wallet_service_mock.assert_called_once()
+            # the wallet is synced in the background
+            wallet_service_mock.start_wallet_sync.assert_called_once()
 
             assert wallet_response.status == "200 OK"
             assert json.loads(wallet_response.data) == {
@@ -90,6 +106,119 @@ class TestWalletController(TestCase):
         # an error for each required field descriptor, network, and electrumUrl
         assert len(response_data["errors"]) == 3
 
+    def test_wallet_controller_with_fast_import_success(self):
+        with patch("src.controllers.wallet.WalletService") as wallet_service_mock:
+            wallet_response = self.test_client.post(
+                "/wallet/",
+                json={
+                    "descriptor": "mock_descriptor",
+                    "network": "TESTNET",
+                    "electrumUrl": "mock_electrum_url",
+                    "birthdayHeight": 800000,
+                    "fastImport": True,
+                },
+            )
+
+            wallet_service_mock.create_wallet.assert_called_once_with(
+                "mock_descriptor",
+                None,
+                bdk.Network.TESTNET,
+                "mock_electrum_url",
+                None,
+                birthday_height=800000,
+                fast_import=True,
+            )
+            assert wallet_response.status == "200 OK"
+
+    def test_get_wallet_sync_success(self):
+        with patch("src.controllers.wallet.WalletService") as wallet_service_mock:
+            wallet_service_mock.get_wallet_sync_job.return_value = WalletSyncJob(
+                id=1,
+                wallet_id="mock_wallet_id",
+                state="running",
+                progress=50.0,
+                message="mock message",
+                queued_at=1.0,
+                started_at=2.0,
+            )
+            wallet_service_mock.get_wallet_last_synced_at.return_value = None
+
+            response = self.test_client.get("/wallet/sync")
+
+            assert response.status == "200 OK"
+            assert json.loads(response.data) == {
+                "message": "Wallet sync status",
+                "job": {
+                    "id": 1,
+                    "state": "running",
+                    "progress": 50.0,
+                    "message": "mock message",
+                    "error": None,
+                    "queuedAt": 1.0,
+                    "startedAt": 2.0,
+                    "finishedAt": None,
+                },
+                "lastSyncedAt": None,
+            }
+
+    def test_request_wallet_sync_success(self):
+        with patch("src.controllers.wallet.WalletService") as wallet_service_mock:
+            wallet_service_mock.request_wallet_sync.return_value = WalletSyncJob(
+                id=2, wallet_id="mock_wallet_id", queued_at=3.0
+            )
+            wallet_service_mock.get_wallet_last_synced_at.return_value = 1.0
+
+            response = self.test_client.post("/wallet/sync")
+
+            wallet_service_mock.request_wallet_sync.assert_called_once()
+            assert response.status == "200 OK"
+            response_data = json.loads(response.data)
+            assert response_data["message"] == "Wallet sync requested"
+            assert response_data["job"]["id"] == 2
+            assert response_data["job"]["state"] == "queued"
+            assert response_data["lastSyncedAt"] == 1.0
+
+    def test_request_wallet_sync_without_a_wallet(self):
+        with patch("src.controllers.wallet.WalletService") as wallet_service_mock:
+            wallet_service_mock.request_wallet_sync.return_value = None
+
+            response = self.test_client.post("/wallet/sync")
+
+            assert response.status == "400 BAD REQUEST"
+            assert json.loads(response.data) == {"message": "No wallet to sync"}
+
+    def test_get_wallet_events_streams_the_events_after_the_last_event_id(self):
+        with patch("src.controllers.wallet.WalletService") as wallet_service_mock:
+            wallet_service_mock.get_last_wallet_event_id.return_value = 4
+            wallet_service_mock.get_wallet_events.return_value = [
+                WalletEvent(id=3, type="new_block", data={"height": 100}),
+                WalletEvent(id=4, type="wallet_synced", data={"walletId": "mock_id"}),
+            ]
+
+            response = self.test_client.get(
+                "/wallet/events", headers={"Last-Event-ID": "2"}
+            )
+
+            assert response.status == "200 OK"
+            assert response.mimetype == "text/event-stream"
+            assert response.get_data(as_text=True) == (
+                "retry: 5000\n\n"
+                "id: 3\nevent: new_block\ndata: {\"height\": 100}\n\n"
+                'id: 4\nevent: wallet_synced\ndata: {"walletId": "mock_id"}\n\n'
+            )
+            wallet_service_mock.get_wallet_events.assert_called_once_with(2)
+
+    def test_get_wallet_events_for_a_new_client_starts_from_the_last_event(self):
+        with patch("src.controllers.wallet.WalletService") as wallet_service_mock:
+            wallet_service_mock.get_last_wallet_event_id.return_value = 7
+            wallet_service_mock.get_wallet_events.return_value = []
+
+            response = self.test_client.get("/wallet/events")
+
+            assert response.status == "200 OK"
+            assert response.get_data(as_text=True) == "retry: 5000\n\nid: 7\n\n"
+            wallet_service_mock.get_wallet_events.assert_called_once_with(7)
+
     def test_get_wallet_type_success(self):
         self.mock_wallet_service = MagicMock(WalletService)
 
@@ -133,14 +262,12 @@ class TestWalletController(TestCase):
 
     def test_remove_wallet_success(self):
         with patch("src.controllers.wallet.WalletService") as wallet_service_mock:
-            wallet_service_mock.remove_global_wallet_and_details = MagicMock()
-            wallet_service_mock.remove_output_and_related_label_data = MagicMock()
+            wallet_service_mock.remove_wallet = MagicMock()
 
             wallet_response = self.test_client.delete(
                 "/wallet/remove",
             )
-            wallet_service_mock.remove_global_wallet_and_details.assert_called_once()
-            wallet_service_mock.remove_output_and_related_label_data.assert_called_once()
+            wallet_service_mock.remove_wallet.assert_called_once()
             assert wallet_response.status == "200 OK"
             assert json.loads(wallet_response.data) == {
                 "message": "wallet and related data successfully deleted",
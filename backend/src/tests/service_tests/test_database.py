@@ -0,0 +1,421 @@
+from datetime import datetime
+from os import path
+import tempfile
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import StatementError
+
+from src.database import (
+    DB,
+    get_current_wallet_id,
+    init_database,
+    set_current_wallet_id,
+)
+from src.migrations import (
+    Migration,
+    get_latest_schema_version,
+    get_schema_version,
+    migrate_database,
+)
+from src.models.change_output_position import ChangeOutputPosition
+from src.models.last_fetched import LastFetched, LastFetchedType
+from src.models.outputs import Output
+from src.models.schema_migration import SchemaMigration
+from src.models.transaction import Transaction
+from src.services.wallet.wallet import WalletService
+
+
+TXID = "11" * 32
+SHARED_TXID = "22" * 32
+WALLET_A_TXID = "33" * 32
+
+HOT_PATH_INDEXES = [
+    ("outputs", "ix_outputs_wallet_id_address"),
+    ("outputs", "ix_outputs_wallet_id_spent_txid"),
+    ("transactions", "ix_transactions_wallet_id_confirmed_block_height"),
+]
+
+
+def create_database_app(database_uri: str = "sqlite://") -> Flask:
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+    init_database(app)
+    return app
+
+
+def add_transaction(txid: str) -> Transaction:
+    transaction = Transaction(txid=txid, received_amount=1000, sent_amount=0)
+    DB.session.add(transaction)
+    DB.session.add(Output(txid=txid, vout=0, address="mock_address", value=1000))
+    DB.session.commit()
+    return transaction
+
+
+class TestMigrateDatabase(TestCase):
+    def setUp(self):
+        self.app = create_database_app()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        DB.session.remove()
+        self.app_context.pop()
+        set_current_wallet_id(None)
+
+    def test_new_database_is_created_at_the_latest_version(self):
+        migrate_database()
+
+        assert get_schema_version() == get_latest_schema_version()
+        assert "transactions" in inspect(DB.engine).get_table_names()
+
+    def test_baseline_database_gets_the_hot_path_indexes(self):
+        migrate_database()
+        add_transaction(TXID)
+        with DB.engine.begin() as connection:
+            for _, index_name in HOT_PATH_INDEXES:
+                connection.execute(text(f"DROP INDEX {index_name}"))
+            connection.execute(
+                text("UPDATE schema_migrations SET version = 1, name = 'baseline'")
+            )
+
+        migrate_database()
+
+        assert get_schema_version() == get_latest_schema_version()
+        for table_name, index_name in HOT_PATH_INDEXES:
+            assert index_name in [
+                index["name"] for index in inspect(DB.engine).get_indexes(table_name)
+            ]
+        assert Transaction.query.count() == 1
+
+    def test_hex_txids_are_converted_to_bytes(self):
+        migrate_database()
+        with DB.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO transactions "
+                    "(id, wallet_id, txid, received_amount, sent_amount) "
+                    f"VALUES (1, '', '{TXID}', 1000, 0)"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO outputs "
+                    "(id, wallet_id, txid, vout, address, spent_txid) VALUES "
+                    f"(1, '', '{TXID}', 0, 'mock_address', NULL), "
+                    "(2, '', 'not_a_txid', 0, 'mock_address', NULL)"
+                )
+            )
+            connection.execute(
+                text("INSERT INTO output_labels (output_id, label_id) VALUES (2, 1)")
+            )
+            connection.execute(
+                text(
+                    "UPDATE schema_migrations "
+                    "SET version = 2, name = 'hot path indexes'"
+                )
+            )
+
+        migrate_database()
+
+        assert get_schema_version() == get_latest_schema_version()
+        assert DB.session.execute(
+            text("SELECT typeof(txid), length(txid) FROM transactions")
+        ).all() == [("blob", 32)]
+        transaction = Transaction.query.one()
+        assert transaction.txid == TXID
+        assert [output.vout for output in transaction.outputs] == [0]
+        assert Output.query.count() == 1
+        assert (
+            DB.session.execute(text("SELECT count(*) FROM output_labels")).scalar()
+            == 0
+        )
+
+    def test_simple_change_outputs_are_counted_by_position(self):
+        migrate_database()
+        with DB.engine.begin() as connection:
+            connection.execute(text("DROP TABLE change_output_positions"))
+            connection.execute(text("ALTER TABLE outputs DROP COLUMN is_simple_change"))
+            connection.execute(
+                text(
+                    "UPDATE schema_migrations "
+                    "SET version = 3, name = 'txids as bytes'"
+                )
+            )
+        set_current_wallet_id("wallet_a")
+        # sent and received with a single output of the wallet, simple change
+        DB.session.add(Transaction(txid=TXID, received_amount=500, sent_amount=1000))
+        # sent and received with two outputs of the wallet, not simple change
+        DB.session.add(
+            Transaction(txid=SHARED_TXID, received_amount=500, sent_amount=1000)
+        )
+        # only received, not change
+        DB.session.add(
+            Transaction(txid=WALLET_A_TXID, received_amount=500, sent_amount=0)
+        )
+        for txid, vout in [
+            (TXID, 1),
+            (SHARED_TXID, 0),
+            (SHARED_TXID, 1),
+            (WALLET_A_TXID, 0),
+        ]:
+            DB.session.execute(
+                text(
+                    "INSERT INTO outputs (wallet_id, txid, vout, address, script) "
+                    "VALUES ('wallet_a', :txid, :vout, 'mock_address', 'mock_script')"
+                ),
+                {"txid": bytes.fromhex(txid), "vout": vout},
+            )
+        DB.session.commit()
+
+        migrate_database()
+
+        assert get_schema_version() == get_latest_schema_version()
+        assert [
+            (output.txid, output.vout)
+            for output in Output.query.filter(Output.is_simple_change.is_(True))
+        ] == [(TXID, 1)]
+        assert [
+            (position.vout, position.count) for position in ChangeOutputPosition.query
+        ] == [(1, 1)]
+
+    def test_invalid_txid_is_not_stored(self):
+        migrate_database()
+
+        with self.assertRaises(StatementError):
+            add_transaction("not_a_txid")
+
+    def test_database_from_before_versioning_is_rebuilt(self):
+        with DB.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE transactions (txid VARCHAR)"))
+
+        migrate_database()
+
+        assert get_schema_version() == get_latest_schema_version()
+        columns = [
+            column["name"] for column in inspect(DB.engine).get_columns("transactions")
+        ]
+        assert "wallet_id" in columns
+
+    def test_migrated_database_keeps_its_data(self):
+        migrate_database()
+        add_transaction(TXID)
+
+        migrate_database()
+
+        assert Transaction.query.count() == 1
+
+    def test_pending_migrations_are_applied_in_order(self):
+        migrate_database()
+        add_transaction(TXID)
+        version = get_latest_schema_version()
+        first_upgrade = MagicMock()
+        second_upgrade = MagicMock(
+            side_effect=lambda connection: first_upgrade.assert_called_once()
+        )
+        migrations = [
+            Migration(version + 1, "first", first_upgrade),
+            Migration(version + 2, "second", second_upgrade),
+        ]
+
+        with patch("src.migrations.MIGRATIONS", migrations):
+            migrate_database()
+            migrate_database()
+
+        first_upgrade.assert_called_once()
+        second_upgrade.assert_called_once()
+        assert [
+            (migration.version, migration.name)
+            for migration in SchemaMigration.query.filter(
+                SchemaMigration.version > version
+            ).order_by(SchemaMigration.version)
+        ] == [(version + 1, "first"), (version + 2, "second")]
+        assert Transaction.query.count() == 1
+
+    def test_failed_migration_is_not_stamped(self):
+        migrate_database()
+        version = get_latest_schema_version()
+        migrations = [
+            Migration(
+                version + 1, "failing", MagicMock(side_effect=Exception("mock error"))
+            )
+        ]
+
+        with patch("src.migrations.MIGRATIONS", migrations):
+            with self.assertRaises(Exception):
+                migrate_database()
+
+        assert get_schema_version() == version
+
+    def test_database_from_a_newer_version_is_rebuilt(self):
+        migrate_database()
+        add_transaction(TXID)
+        DB.session.add(
+            SchemaMigration(
+                version=get_latest_schema_version() + 1, name="from the future"
+            )
+        )
+        DB.session.commit()
+
+        migrate_database()
+
+        assert get_schema_version() == get_latest_schema_version()
+        assert Transaction.query.count() == 0
+
+
+class TestSqlitePragmas(TestCase):
+    def test_database_file_uses_the_write_ahead_log(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            app = create_database_app(
+                f"sqlite:///{path.join(data_dir, 'test.db')}"
+            )
+            with app.app_context():
+                assert DB.session.execute(text("PRAGMA journal_mode")).scalar() == (
+                    "wal"
+                )
+                assert DB.session.execute(text("PRAGMA synchronous")).scalar() == 1
+                DB.session.remove()
+                DB.engine.dispose()
+
+    def test_other_engines_keep_their_settings(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            app = create_database_app(
+                f"sqlite:///{path.join(data_dir, 'test.db')}"
+            )
+            # like the db bitcoinlib keeps of its own
+            engine = create_engine(f"sqlite:///{path.join(data_dir, 'other.db')}")
+            with engine.connect() as connection:
+                journal_mode = connection.exec_driver_sql("PRAGMA journal_mode")
+                assert journal_mode.scalar() == "delete"
+            engine.dispose()
+            with app.app_context():
+                DB.engine.dispose()
+
+
+class TestWalletScoped(TestCase):
+    def setUp(self):
+        self.app = create_database_app()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        migrate_database()
+
+    def tearDown(self):
+        set_current_wallet_id(None)
+        DB.session.remove()
+        self.app_context.pop()
+
+    def test_rows_are_stamped_with_the_current_wallet(self):
+        set_current_wallet_id("wallet_a")
+
+        transaction = add_transaction(TXID)
+
+        assert get_current_wallet_id() == "wallet_a"
+        assert transaction.wallet_id == "wallet_a"
+        assert transaction.outputs[0].wallet_id == "wallet_a"
+
+    def test_each_wallet_only_sees_its_own_rows(self):
+        set_current_wallet_id("wallet_a")
+        add_transaction(SHARED_TXID)
+        add_transaction(WALLET_A_TXID)
+        set_current_wallet_id("wallet_b")
+        add_transaction(SHARED_TXID)
+        DB.session.expunge_all()
+
+        assert [transaction.txid for transaction in Transaction.query.all()] == [
+            SHARED_TXID
+        ]
+        assert Output.query.join(Output.transaction).count() == 1
+
+        set_current_wallet_id("wallet_a")
+        assert Transaction.query.count() == 2
+        transaction = Transaction.query.filter_by(txid=SHARED_TXID).one()
+        assert [output.wallet_id for output in transaction.outputs] == ["wallet_a"]
+
+    def test_deleting_only_removes_the_current_wallets_rows(self):
+        set_current_wallet_id("wallet_a")
+        add_transaction(TXID)
+        set_current_wallet_id("wallet_b")
+        add_transaction(TXID)
+
+        Output.query.delete()
+        Transaction.query.delete()
+        DB.session.commit()
+
+        set_current_wallet_id("wallet_a")
+        assert Transaction.query.count() == 1
+        assert Output.query.count() == 1
+
+    def test_each_wallet_has_its_own_last_fetched_times(self):
+        for wallet_id in ["wallet_a", "wallet_b"]:
+            set_current_wallet_id(wallet_id)
+            DB.session.add(
+                LastFetched(type=LastFetchedType.OUTPUTS, timestamp=datetime.now())
+            )
+            DB.session.commit()
+
+        assert LastFetched.query.count() == 1
+
+    def test_change_output_positions_are_kept_up_to_date(self):
+        def sync_change_output(is_simple_change: bool):
+            WalletService.sync_local_db_with_incoming_outputs(
+                [
+                    {
+                        "txid": TXID,
+                        "vout": 1,
+                        "address": "mock_address",
+                        "value": 1000,
+                        "script": "mock_script",
+                        "is_simple_change": is_simple_change,
+                    }
+                ],
+                {},
+            )
+            DB.session.commit()
+
+        set_current_wallet_id("wallet_a")
+        sync_change_output(True)
+        # syncing the same output again does not count it twice
+        sync_change_output(True)
+        set_current_wallet_id("wallet_b")
+        sync_change_output(True)
+        sync_change_output(False)
+
+        assert WalletService.get_change_output_position_counts() == {}
+        set_current_wallet_id("wallet_a")
+        assert WalletService.get_change_output_position_counts() == {1: 1}
+        assert WalletService.get_all_change_outputs_from_db(1, "count") == 1
+
+    def test_each_wallet_has_its_own_synced_transaction_heights(self):
+        set_current_wallet_id("wallet_a")
+        transaction = add_transaction(TXID)
+        transaction.confirmed_block_height = 100
+        transaction.details = {"txid": TXID}
+        # not enriched yet, so not synced
+        add_transaction(WALLET_A_TXID)
+        set_current_wallet_id("wallet_b")
+        add_transaction(TXID)
+        DB.session.commit()
+
+        assert WalletService.get_synced_transaction_heights() == {}
+        set_current_wallet_id("wallet_a")
+        assert WalletService.get_synced_transaction_heights() == {TXID: 100}
+
+    def test_removed_transactions_are_removed_and_their_outputs_cleared(self):
+        set_current_wallet_id("wallet_a")
+        for txid in [TXID, WALLET_A_TXID]:
+            add_transaction(txid).outputs[0].script = "mock_script"
+
+        WalletService.sync_local_db_with_incoming_outputs(
+            [], {}, remove_stale_outputs=False, removed_txids={WALLET_A_TXID}
+        )
+        WalletService.remove_transactions_from_db({WALLET_A_TXID})
+        DB.session.commit()
+
+        # the outputs are kept for their labels, without their details
+        assert {output.txid: output.script for output in Output.query.all()} == {
+            TXID: "mock_script",
+            WALLET_A_TXID: None,
+        }
+        assert [transaction.txid for transaction in Transaction.query.all()] == [TXID]
@@ -0,0 +1,165 @@
+from contextlib import closing
+from os import path
+import sqlite3
+import tempfile
+import time
+from unittest.case import TestCase
+
+from sqlalchemy.exc import IntegrityError
+
+from src.database import DB, set_current_wallet_id
+from src.migrations import migrate_database
+from src.models.transaction import Transaction
+from src.services.database.database_writer import DatabaseWriter
+from src.tests.service_tests.test_database import create_database_app
+
+TXIDS = ["11" * 32, "22" * 32, "33" * 32]
+
+
+def add_transaction(txid: str) -> str:
+    DB.session.add(Transaction(txid=txid, received_amount=1000, sent_amount=0))
+    DB.session.flush()
+    return txid
+
+
+class TestDatabaseWriter(TestCase):
+    def setUp(self):
+        # a file, since the writer thread uses a connection of its own
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.database_path = path.join(self.data_dir.name, "test.db")
+        self.app = create_database_app(f"sqlite:///{self.database_path}")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        migrate_database()
+        set_current_wallet_id("wallet_a")
+
+    def tearDown(self):
+        DB.session.remove()
+        DB.engine.dispose()
+        self.app_context.pop()
+        set_current_wallet_id(None)
+        self.data_dir.cleanup()
+
+    def get_txids(self):
+        return sorted(transaction.txid for transaction in Transaction.query.all())
+
+    def test_writes_submitted_together_are_committed_at_once(self):
+        writer = DatabaseWriter(max_batch_delay_seconds=0.5)
+
+        futures = [
+            writer.submit(lambda txid=txid: add_transaction(txid)) for txid in TXIDS
+        ]
+
+        assert [future.result(5) for future in futures] == TXIDS
+        assert writer.commit_count == 1
+        assert self.get_txids() == TXIDS
+
+    def test_writes_are_not_seen_until_their_batch_is_committed(self):
+        writer = DatabaseWriter(max_batch_delay_seconds=0.5)
+
+        def count_committed_transactions() -> int:
+            with closing(sqlite3.connect(self.database_path)) as connection:
+                return connection.execute(
+                    "SELECT count(*) FROM transactions"
+                ).fetchone()[0]
+
+        futures = [
+            writer.submit(lambda: add_transaction(TXIDS[0])),
+            writer.submit(lambda: add_transaction(TXIDS[1])),
+            writer.submit(count_committed_transactions),
+        ]
+
+        # the earlier writes of the batch are not committed yet
+        assert futures[2].result(5) == 0
+        assert count_committed_transactions() == 2
+
+    def test_batch_is_committed_once_it_is_full(self):
+        writer = DatabaseWriter(max_batch_size=2, max_batch_delay_seconds=0.5)
+
+        futures = [
+            writer.submit(lambda txid=txid: add_transaction(txid)) for txid in TXIDS
+        ]
+
+        for future in futures:
+            future.result(5)
+        assert writer.commit_count == 2
+
+    def test_failing_write_does_not_roll_back_the_rest_of_its_batch(self):
+        writer = DatabaseWriter(max_batch_delay_seconds=0.5)
+
+        futures = [
+            writer.submit(lambda: add_transaction(TXIDS[0])),
+            # the txid is already in the batch
+            writer.submit(lambda: add_transaction(TXIDS[0])),
+            writer.submit(lambda: add_transaction(TXIDS[1])),
+        ]
+
+        assert futures[0].result(5) == TXIDS[0]
+        with self.assertRaises(IntegrityError):
+            futures[1].result(5)
+        assert futures[2].result(5) == TXIDS[1]
+        assert self.get_txids() == TXIDS[:2]
+
+    def test_flush_waits_for_the_submitted_writes(self):
+        writer = DatabaseWriter(max_batch_delay_seconds=10)
+        writer.submit(lambda: add_transaction(TXIDS[0]))
+
+        started_at = time.monotonic()
+        writer.flush(5)
+
+        # without waiting for the batch window to close
+        assert time.monotonic() - started_at < 5
+        assert self.get_txids() == TXIDS[:1]
+
+    def test_write_returns_once_committed(self):
+        writer = DatabaseWriter()
+        # loaded before the write
+        assert self.get_txids() == []
+
+        assert writer.write(lambda: add_transaction(TXIDS[0]), 5) == TXIDS[0]
+        assert self.get_txids() == TXIDS[:1]
+
+    def test_loaded_objects_are_reloaded_after_a_write(self):
+        writer = DatabaseWriter()
+        writer.write(lambda: add_transaction(TXIDS[0]), 5)
+        transaction = Transaction.query.one()
+
+        def update_transaction():
+            Transaction.query.one().received_amount = 2000
+            DB.session.flush()
+
+        writer.write(update_transaction, 5)
+
+        assert transaction.received_amount == 2000
+
+    def test_write_with_changes_of_the_callers_session_is_refused(self):
+        writer = DatabaseWriter()
+        DB.session.add(Transaction(txid=TXIDS[0], received_amount=1000, sent_amount=0))
+
+        with self.assertRaises(RuntimeError):
+            writer.write(lambda: add_transaction(TXIDS[1]), 5)
+        with self.assertRaises(RuntimeError):
+            writer.flush(5)
+
+        assert writer.commit_count == 0
+        DB.session.rollback()
+
+    def test_write_made_by_a_write_is_part_of_its_batch(self):
+        writer = DatabaseWriter()
+
+        def add_transactions():
+            add_transaction(TXIDS[0])
+            return writer.write(lambda: add_transaction(TXIDS[1]))
+
+        assert writer.write(add_transactions, 5) == TXIDS[1]
+        assert writer.commit_count == 1
+        assert self.get_txids() == TXIDS[:2]
+
+    def test_writes_outside_of_an_app_are_made_without_the_db(self):
+        self.app_context.pop()
+        try:
+            writer = DatabaseWriter()
+            assert writer.write(lambda: "written", 5) == "written"
+            assert writer.commit_count == 0
+        finally:
+            self.app_context.push()
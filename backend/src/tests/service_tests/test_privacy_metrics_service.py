@@ -747,15 +747,15 @@ class TestPrivacyMetricsService(TestCase):
         mock_transaction_model.outputs = [mock_output]
 
         with patch.object(
-            WalletService, "get_all_change_outputs_from_db"
-        ) as mock_get_all_change_ouotputs_from_db:
+            WalletService, "get_change_output_position_counts"
+        ) as mock_get_change_output_position_counts:
             # only 7 change outputs total
-            mock_get_all_change_ouotputs_from_db.return_value = 7
+            mock_get_change_output_position_counts.return_value = {0: 4, 1: 3}
 
             response = PrivacyMetricsService.analyze_avoid_common_change_position(
                 mock_transaction_model
             )
-            mock_get_all_change_ouotputs_from_db.assert_called()
+            mock_get_change_output_position_counts.assert_called_once()
             # since less than 8 outputs, then this metric passes
             assert response is True
 
@@ -770,19 +770,18 @@ class TestPrivacyMetricsService(TestCase):
         mock_transaction_model.outputs = [mock_output]
 
         with patch.object(
-            WalletService, "get_all_change_outputs_from_db"
-        ) as mock_get_all_change_ouotputs_from_db:
-            total_change_outputs = 10
-            change_outputs_as_vout_0 = 9
-            mock_get_all_change_ouotputs_from_db.side_effect = [
-                total_change_outputs,
-                change_outputs_as_vout_0,
-            ]
+            WalletService, "get_change_output_position_counts"
+        ) as mock_get_change_output_position_counts:
+            # 10 change outputs in total
+            mock_get_change_output_position_counts.return_value = {
+                0: 9,
+                1: 1,
+            }
 
             response = PrivacyMetricsService.analyze_avoid_common_change_position(
                 mock_transaction_model
             )
-            mock_get_all_change_ouotputs_from_db.assert_called_with(0, "count")
+            mock_get_change_output_position_counts.assert_called_once()
             # since 9 out of 10 change outputs are vout 0, then this metric fails
             assert response is False
 
@@ -797,19 +796,18 @@ class TestPrivacyMetricsService(TestCase):
         mock_transaction_model.outputs = [mock_output]
 
         with patch.object(
-            WalletService, "get_all_change_outputs_from_db"
-        ) as mock_get_all_change_ouotputs_from_db:
-            total_change_outputs = 10
-            change_outputs_as_vout_0 = 2
-            mock_get_all_change_ouotputs_from_db.side_effect = [
-                total_change_outputs,
-                change_outputs_as_vout_0,
-            ]
+            WalletService, "get_change_output_position_counts"
+        ) as mock_get_change_output_position_counts:
+            # 10 change outputs in total
+            mock_get_change_output_position_counts.return_value = {
+                0: 2,
+                1: 8,
+            }
 
             response = PrivacyMetricsService.analyze_avoid_common_change_position(
                 mock_transaction_model
             )
-            mock_get_all_change_ouotputs_from_db.assert_called_with(0, "count")
+            mock_get_change_output_position_counts.assert_called_once()
             # since only 2 out of 10 change outputs are vout 0, then this metric passes
             assert response is True
 
@@ -917,14 +915,14 @@ class TestPrivacyMetricsService(TestCase):
         ) as mock_ensure_recently_fetched_outputs, patch.object(
             WalletService, "get_transaction_details"
         ) as mock_get_transaction_details, patch.object(
-            WalletService, "get_transaction"
-        ) as mock_get_transaction:
+            WalletService, "get_decoded_transaction"
+        ) as mock_get_decoded_transaction:
             response = PrivacyMetricsService.analyze_tx_privacy(
                 mock_txid, privacy_metrics
             )
 
             mock_ensure_recently_fetched_outputs.assert_called()
-            mock_get_transaction.assert_called_with(mock_txid)
+            mock_get_decoded_transaction.assert_called_with(mock_txid)
             mock_get_transaction_details.assert_called_with(mock_txid)
 
             assert response == {}
@@ -953,8 +951,8 @@ class TestPrivacyMetricsService(TestCase):
         ) as mock_ensure_recently_fetched_outputs, patch.object(
             WalletService, "get_transaction_details"
         ) as mock_get_transaction_details, patch.object(
-            WalletService, "get_transaction"
-        ) as mock_get_transaction, patch.object(
+            WalletService, "get_decoded_transaction"
+        ) as mock_get_decoded_transaction, patch.object(
             PrivacyMetricsService, "analyze_annominity_set"
         ) as mock_analyze_annominity_set, patch.object(
             PrivacyMetricsService, "analyze_no_address_reuse"
@@ -995,14 +993,14 @@ class TestPrivacyMetricsService(TestCase):
             mock_analyze_significantly_minimal_wealth_reveal.return_value = True
             mock_analyze_minimal_tx_history_reveal.return_value = True
             mock_get_transaction_details.return_value = MagicMock()
-            mock_get_transaction.return_value = MagicMock()
+            mock_get_decoded_transaction.return_value = MagicMock()
 
             response = PrivacyMetricsService.analyze_tx_privacy(
                 mock_txid, privacy_metrics
             )
 
             mock_ensure_recently_fetched_outputs.assert_called()
-            mock_get_transaction.assert_called_with(mock_txid)
+            mock_get_decoded_transaction.assert_called_with(mock_txid)
             mock_get_transaction_details.assert_called_with(mock_txid)
 
             assert response == {
@@ -0,0 +1,101 @@
+import os
+import tempfile
+from unittest.case import TestCase
+from unittest.mock import patch
+
+from src.services.wallet.raw_transaction_cache import RawTransactionCache
+
+
+class TestRawTransactionCache(TestCase):
+    def setUp(self):
+        self.raw_transaction_cache = RawTransactionCache(":memory:")
+
+    def test_get_returns_cached_raw_transaction(self):
+        self.raw_transaction_cache.put("txid1", b"raw_tx_1", is_confirmed=True)
+
+        assert self.raw_transaction_cache.get("txid1") == b"raw_tx_1"
+        assert self.raw_transaction_cache.get("txid2") is None
+
+    def test_raw_transactions_are_stored_compressed(self):
+        raw_transaction = b"ab" * 1000
+        self.raw_transaction_cache.put("txid1", raw_transaction, is_confirmed=True)
+
+        assert self.raw_transaction_cache.total_size() < len(raw_transaction)
+
+    def test_get_many_only_returns_cached_txids(self):
+        self.raw_transaction_cache.put_many(
+            [("txid1", b"raw_tx_1", True), ("txid2", b"raw_tx_2", True)]
+        )
+
+        assert self.raw_transaction_cache.get_many(["txid1", "txid3"]) == {
+            "txid1": b"raw_tx_1"
+        }
+
+    def test_expired_unconfirmed_transaction_is_not_returned(self):
+        self.raw_transaction_cache.put_many(
+            [("confirmed_txid", b"raw_tx_1", True),
+             ("unconfirmed_txid", b"raw_tx_2", False)]
+        )
+
+        with patch(
+            "src.services.wallet.raw_transaction_cache.time.time",
+            return_value=10**12,
+        ):
+            assert self.raw_transaction_cache.get_many(
+                ["confirmed_txid", "unconfirmed_txid"]
+            ) == {"confirmed_txid": b"raw_tx_1"}
+
+    def test_mark_confirmed_keeps_transaction_after_the_unconfirmed_ttl(self):
+        self.raw_transaction_cache.put("txid1", b"raw_tx_1", is_confirmed=False)
+        self.raw_transaction_cache.mark_confirmed(["txid1"])
+
+        with patch(
+            "src.services.wallet.raw_transaction_cache.time.time",
+            return_value=10**12,
+        ):
+            assert self.raw_transaction_cache.get("txid1") == b"raw_tx_1"
+
+    def test_confirmed_transaction_stays_confirmed_when_put_again(self):
+        self.raw_transaction_cache.put("txid1", b"raw_tx_1", is_confirmed=True)
+        self.raw_transaction_cache.put("txid1", b"raw_tx_1", is_confirmed=False)
+
+        with patch(
+            "src.services.wallet.raw_transaction_cache.time.time",
+            return_value=10**12,
+        ):
+            assert self.raw_transaction_cache.get("txid1") == b"raw_tx_1"
+
+    def test_least_recently_used_transactions_are_evicted(self):
+        # each random 100 byte transaction is a little over 100 bytes compressed,
+        # therefore only two fit in the cache.
+        raw_transaction_cache = RawTransactionCache(":memory:", max_size_bytes=250)
+        with patch(
+            "src.services.wallet.raw_transaction_cache.time.time"
+        ) as mock_time:
+            for index in range(2):
+                mock_time.return_value = index
+                raw_transaction_cache.put(
+                    f"txid{index}", os.urandom(100), is_confirmed=True
+                )
+            # use txid0 so that txid1 is the least recently used
+            mock_time.return_value = 2
+            raw_transaction_cache.get("txid0")
+
+            mock_time.return_value = 3
+            raw_transaction_cache.put("txid2", os.urandom(100), is_confirmed=True)
+
+        assert raw_transaction_cache.get("txid1") is None
+        assert raw_transaction_cache.get("txid0") is not None
+        assert raw_transaction_cache.get("txid2") is not None
+        assert raw_transaction_cache.total_size() <= 250
+
+    def test_cache_persists_across_instances(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            db_path = os.path.join(data_dir, "raw_transaction_cache.db")
+            raw_transaction_cache = RawTransactionCache(db_path)
+            raw_transaction_cache.put("txid1", b"raw_tx_1", is_confirmed=True)
+            raw_transaction_cache.close()
+
+            reopened_raw_transaction_cache = RawTransactionCache(db_path)
+            assert reopened_raw_transaction_cache.get("txid1") == b"raw_tx_1"
+            reopened_raw_transaction_cache.close()
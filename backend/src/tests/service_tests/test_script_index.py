@@ -0,0 +1,119 @@
+from unittest.case import TestCase
+from unittest.mock import MagicMock
+
+import bdkpython as bdk
+
+from src.services.wallet.script_index import ScriptIndex
+from src.services.wallet.wallet_scanner import (
+    KeychainScanResult,
+    ScannedScript,
+    WalletScanResult,
+    get_scripthash,
+)
+
+EXTERNAL = bdk.KeychainKind.EXTERNAL
+INTERNAL = bdk.KeychainKind.INTERNAL
+
+
+def derive_script(keychain, index) -> bytes:
+    return f"{keychain}/{index}".encode()
+
+
+def create_scan_result(script_count: int) -> WalletScanResult:
+    return WalletScanResult(
+        keychains=tuple(
+            KeychainScanResult(
+                keychain=keychain,
+                scripts=tuple(
+                    ScannedScript(
+                        keychain=keychain,
+                        index=index,
+                        scripthash=get_scripthash(derive_script(keychain, index)),
+                        status=None,
+                        history=(),
+                    )
+                    for index in range(script_count)
+                ),
+            )
+            for keychain in [EXTERNAL, INTERNAL]
+        ),
+        birthday_height=None,
+    )
+
+
+class TestScriptIndex(TestCase):
+    def setUp(self):
+        self.script_index = ScriptIndex.from_scan_result(
+            "mock_wallet_id", create_scan_result(script_count=20)
+        )
+
+    def test_scanned_scripts_are_mine(self):
+        assert len(self.script_index) == 40
+        assert self.script_index.wallet_id == "mock_wallet_id"
+        assert self.script_index.is_mine(derive_script(EXTERNAL, 0))
+        assert self.script_index.is_mine(derive_script(INTERNAL, 19))
+        assert not self.script_index.is_mine(derive_script(EXTERNAL, 20))
+        assert not self.script_index.is_mine(b"not_my_script")
+
+    def test_get_derivation_of_a_script(self):
+        assert self.script_index.get_derivation(derive_script(INTERNAL, 7)) == (
+            INTERNAL,
+            7,
+        )
+        assert self.script_index.get_derivation(b"not_my_script") is None
+
+
+def create_wallet_mock(used_scripts):
+    def get_address(keychain):
+        def get_address_at(address_index):
+            address_info = MagicMock()
+            address_info.address.script_pubkey.return_value.to_bytes.return_value = (
+                list(derive_script(keychain, address_index.index))
+            )
+            return address_info
+
+        return get_address_at
+
+    transaction = MagicMock()
+    outputs = []
+    for script in used_scripts:
+        output = MagicMock()
+        output.script_pubkey.to_bytes.return_value = list(script)
+        outputs.append(output)
+    transaction.transaction.output.return_value = outputs
+    wallet = MagicMock()
+    wallet.list_transactions.return_value = [transaction]
+    wallet.get_address.side_effect = get_address(EXTERNAL)
+    wallet.get_internal_address.side_effect = get_address(INTERNAL)
+    return wallet
+
+
+class TestScriptIndexFromWallet(TestCase):
+    def test_scripts_are_derived_up_to_gap_past_the_last_used_one(self):
+        wallet = create_wallet_mock(
+            [derive_script(EXTERNAL, 3), derive_script(INTERNAL, 0), b"other_script"]
+        )
+
+        script_index = ScriptIndex.from_wallet(
+            "mock_wallet_id", wallet, [EXTERNAL, INTERNAL], gap=5
+        )
+
+        wallet.list_transactions.assert_called_once_with(True)
+        # indexes 0 to 8 of the external and 0 to 5 of the internal keychain
+        assert len(script_index) == 15
+        assert script_index.get_derivation(derive_script(EXTERNAL, 8)) == (
+            EXTERNAL,
+            8,
+        )
+        assert not script_index.is_mine(derive_script(EXTERNAL, 9))
+        assert script_index.is_mine(derive_script(INTERNAL, 5))
+        assert not script_index.is_mine(derive_script(INTERNAL, 6))
+        assert not script_index.is_mine(b"other_script")
+
+    def test_only_the_given_keychains_are_derived(self):
+        wallet = create_wallet_mock([])
+
+        script_index = ScriptIndex.from_wallet("mock_wallet_id", wallet, [EXTERNAL], 20)
+
+        assert len(script_index) == 20
+        wallet.get_internal_address.assert_not_called()
@@ -0,0 +1,88 @@
+import asyncio
+from unittest.case import TestCase
+
+from src.services.wallet.single_flight import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+    def test_concurrent_callers_share_one_fetch(self):
+        single_flight: SingleFlight[str, str] = SingleFlight()
+        fetched_keys = []
+
+        async def fetch_many(keys):
+            fetched_keys.append(keys)
+            await asyncio.sleep(0.01)
+            return {key: f"value_{key}" for key in keys}
+
+        async def run():
+            return await asyncio.gather(
+                single_flight.get_many(["txid1", "txid2"], fetch_many),
+                single_flight.get_many(["txid2", "txid3"], fetch_many),
+                single_flight.get_many(["txid1", "txid1"], fetch_many),
+            )
+
+        results = asyncio.run(run())
+
+        assert fetched_keys == [["txid1", "txid2"], ["txid3"]]
+        assert results == [
+            {"txid1": "value_txid1", "txid2": "value_txid2"},
+            {"txid2": "value_txid2", "txid3": "value_txid3"},
+            {"txid1": "value_txid1"},
+        ]
+
+    def test_fetched_values_are_reused(self):
+        single_flight: SingleFlight[str, str] = SingleFlight()
+        fetched_keys = []
+
+        async def fetch_many(keys):
+            fetched_keys.extend(keys)
+            return {key: f"value_{key}" for key in keys}
+
+        async def run():
+            await single_flight.get_many(["txid1"], fetch_many)
+            return await single_flight.get_many(["txid1", "txid2"], fetch_many)
+
+        result = asyncio.run(run())
+
+        assert fetched_keys == ["txid1", "txid2"]
+        assert result == {"txid1": "value_txid1", "txid2": "value_txid2"}
+
+    def test_keys_that_fail_to_fetch_are_fetched_again(self):
+        single_flight: SingleFlight[str, str] = SingleFlight()
+        fetched_keys = []
+
+        async def fetch_many(keys):
+            fetched_keys.extend(keys)
+            if len(fetched_keys) == 1:
+                return {}
+            return {key: f"value_{key}" for key in keys}
+
+        async def run():
+            first_result = await single_flight.get_many(["txid1"], fetch_many)
+            second_result = await single_flight.get_many(["txid1"], fetch_many)
+            return first_result, second_result
+
+        first_result, second_result = asyncio.run(run())
+
+        assert first_result == {}
+        assert second_result == {"txid1": "value_txid1"}
+        assert fetched_keys == ["txid1", "txid1"]
+
+    def test_waiting_callers_are_released_when_the_fetch_raises(self):
+        single_flight: SingleFlight[str, str] = SingleFlight()
+
+        async def failing_fetch_many(keys):
+            await asyncio.sleep(0.01)
+            raise ConnectionError("mock connection error")
+
+        async def run():
+            return await asyncio.gather(
+                single_flight.get_many(["txid1"], failing_fetch_many),
+                single_flight.get_many(["txid1"], failing_fetch_many),
+                return_exceptions=True,
+            )
+
+        fetching_result, waiting_result = asyncio.run(run())
+
+        assert isinstance(fetching_result, ConnectionError)
+        assert waiting_result == {}
@@ -0,0 +1,172 @@
+import asyncio
+import copy
+import threading
+from unittest.case import TestCase
+from unittest.mock import AsyncMock, MagicMock, Mock
+
+from bitcoinlib.transactions import Transaction
+
+from src.services.wallet.transaction_enrichment_pipeline import (
+    TransactionEnrichmentPipeline,
+)
+from src.tests.mocks import mock_electrum_get_transactions_response
+
+raw_transaction = bytes.fromhex(mock_electrum_get_transactions_response["result"])
+parent_txid = Transaction.parse(raw_transaction).inputs[0].as_dict()["prev_txid"]
+
+
+def create_wallet_service_mock(
+    raw_wallet_transactions: dict, inputs_in_db: bool
+) -> MagicMock:
+    wallet_service = MagicMock()
+    wallet_service.get_bdk_raw_transactions.return_value = raw_wallet_transactions
+    wallet_service.parse_raw_transactions.side_effect = lambda raw_transactions: {
+        txid: Transaction.parse(raw) for txid, raw in raw_transactions.items()
+    }
+    wallet_service.get_raw_transactions = AsyncMock(
+        side_effect=lambda txids, confirmed_txids: {
+            txid: raw_transaction for txid in txids
+        }
+    )
+
+    def update_input_values_from_db(transactions):
+        if inputs_in_db:
+            return {}
+        return {
+            txid: [(input.as_dict(), input) for input in transaction.inputs]
+            for txid, transaction in transactions.items()
+        }
+
+    wallet_service.update_input_values_from_db.side_effect = (
+        update_input_values_from_db
+    )
+    wallet_service.update_input_amount_and_is_mine_value.side_effect = (
+        lambda input_dict, input, inputs_tx: {"txid": input_dict["prev_txid"]}
+    )
+    return wallet_service
+
+
+class TestTransactionEnrichmentPipeline(TestCase):
+    def test_wallet_transactions_are_parsed_from_bdk_raw_bytes(self):
+        transactions = [Mock(txid=f"txid{index}") for index in range(5)]
+        wallet_service = create_wallet_service_mock(
+            {transaction.txid: raw_transaction for transaction in transactions},
+            inputs_in_db=True,
+        )
+
+        enriched_transactions = asyncio.run(
+            TransactionEnrichmentPipeline(wallet_service, chunk_size=2).run(
+                transactions
+            )
+        )
+
+        assert sorted(enriched_transactions.keys()) == [
+            transaction.txid for transaction in transactions
+        ]
+        wallet_service.get_raw_transactions.assert_not_called()
+        assert wallet_service.update_all_tx_details_for_tx.call_count == 5
+        written_transactions = [
+            transaction
+            for call in wallet_service.add_transactions_to_db.call_args_list
+            for transaction in call.args[0]
+        ]
+        assert sorted(
+            transaction.txid for transaction in written_transactions
+        ) == sorted(transaction.txid for transaction in transactions)
+        # along with every decoded transaction
+        decoded_transactions = [
+            transaction
+            for call in wallet_service.add_decoded_transactions_to_db.call_args_list
+            for transaction in call.args[0]
+        ]
+        assert len(decoded_transactions) == 5
+        assert all(
+            isinstance(transaction, Transaction) for transaction in decoded_transactions
+        )
+
+    def test_shared_parent_transaction_is_only_fetched_once(self):
+        # every wallet transaction spends the same parent
+        transactions = [Mock(txid=f"txid{index}") for index in range(6)]
+        wallet_service = create_wallet_service_mock(
+            {transaction.txid: raw_transaction for transaction in transactions},
+            inputs_in_db=False,
+        )
+
+        asyncio.run(
+            TransactionEnrichmentPipeline(
+                wallet_service, chunk_size=1, enrich_workers=3
+            ).run(transactions)
+        )
+
+        wallet_service.get_raw_transactions.assert_called_once()
+        assert wallet_service.get_raw_transactions.call_args.args[0] == [
+            parent_txid
+        ]
+        written_inputs = [
+            all_input
+            for call in wallet_service.add_all_inputs_to_db.call_args_list
+            for all_input in call.args[0]
+        ]
+        assert len(written_inputs) == 6
+
+    def test_transactions_without_raw_bytes_are_fetched(self):
+        transactions = [Mock(txid="txid1"), Mock(txid="txid2")]
+        wallet_service = create_wallet_service_mock(
+            {"txid1": raw_transaction}, inputs_in_db=True
+        )
+
+        enriched_transactions = asyncio.run(
+            TransactionEnrichmentPipeline(wallet_service).run(transactions)
+        )
+
+        assert sorted(enriched_transactions.keys()) == ["txid1", "txid2"]
+        wallet_service.get_raw_transactions.assert_called_once()
+        assert wallet_service.get_raw_transactions.call_args.args[0] == ["txid2"]
+
+    def test_db_writes_are_batched_off_of_the_event_loop(self):
+        transactions = [Mock(txid=f"txid{index}") for index in range(10)]
+        wallet_service = create_wallet_service_mock(
+            {transaction.txid: raw_transaction for transaction in transactions},
+            inputs_in_db=True,
+        )
+        write_threads = []
+        wallet_service.add_transactions_to_db.side_effect = (
+            lambda transactions: write_threads.append(threading.current_thread())
+        )
+
+        asyncio.run(
+            TransactionEnrichmentPipeline(
+                wallet_service, chunk_size=1, write_batch_size=100
+            ).run(transactions)
+        )
+
+        # every write happened in the writer thread, in fewer batches than chunks
+        assert 0 < len(write_threads) < 10
+        assert all(thread is not threading.main_thread() for thread in write_threads)
+
+    def test_failing_chunk_does_not_stop_the_pipeline(self):
+        transactions = [Mock(txid="txid1"), Mock(txid="txid2")]
+        wallet_service = create_wallet_service_mock(
+            {transaction.txid: raw_transaction for transaction in transactions},
+            inputs_in_db=True,
+        )
+        original_update_input_values_from_db = copy.copy(
+            wallet_service.update_input_values_from_db.side_effect
+        )
+
+        def update_input_values_from_db(wallet_transactions):
+            if "txid1" in wallet_transactions:
+                raise ValueError("mock db error")
+            return original_update_input_values_from_db(wallet_transactions)
+
+        wallet_service.update_input_values_from_db.side_effect = (
+            update_input_values_from_db
+        )
+
+        enriched_transactions = asyncio.run(
+            TransactionEnrichmentPipeline(wallet_service, chunk_size=1).run(
+                transactions
+            )
+        )
+
+        assert list(enriched_transactions.keys()) == ["txid2"]
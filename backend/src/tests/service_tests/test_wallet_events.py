@@ -0,0 +1,29 @@
+from unittest.case import TestCase
+
+from src.services.wallet.wallet_events import WalletEventStream
+
+
+class TestWalletEventStream(TestCase):
+    def setUp(self):
+        self.event_stream = WalletEventStream(max_events=3)
+
+    def test_events_are_numbered_in_the_order_they_are_published(self):
+        self.event_stream.publish("new_block", {"height": 100})
+        self.event_stream.publish("wallet_synced", {"walletId": "mock_id"})
+
+        events = self.event_stream.get_events(after_id=0)
+
+        assert [(event.id, event.type) for event in events] == [
+            (1, "new_block"),
+            (2, "wallet_synced"),
+        ]
+        assert self.event_stream.get_events(after_id=1) == events[1:]
+        assert self.event_stream.last_event_id == 2
+
+    def test_only_the_latest_events_are_kept(self):
+        for height in range(5):
+            self.event_stream.publish("new_block", {"height": height})
+
+        events = self.event_stream.get_events(after_id=0)
+
+        assert [event.id for event in events] == [3, 4, 5]
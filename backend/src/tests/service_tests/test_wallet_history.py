@@ -0,0 +1,103 @@
+import threading
+import time
+from unittest.case import TestCase
+
+from src.services.wallet.wallet_history import WalletHistory
+
+
+def create_builder(fingerprint, built_fingerprints):
+    def build():
+        built_fingerprints.append(fingerprint)
+        return fingerprint, (f"transaction_{len(built_fingerprints)}",), ()
+
+    return build
+
+
+class TestWalletHistory(TestCase):
+    def test_snapshot_is_reused_while_the_history_is_unchanged(self):
+        wallet_history = WalletHistory()
+        built_fingerprints = []
+        fingerprint = frozenset([("txid1", 100)])
+
+        first_snapshot = wallet_history.get(
+            fingerprint, create_builder(fingerprint, built_fingerprints)
+        )
+        second_snapshot = wallet_history.get(
+            fingerprint, create_builder(fingerprint, built_fingerprints)
+        )
+
+        assert second_snapshot is first_snapshot
+        assert first_snapshot.version == 1
+        assert built_fingerprints == [fingerprint]
+
+    def test_changed_history_builds_a_newer_snapshot(self):
+        wallet_history = WalletHistory()
+        built_fingerprints = []
+        first_fingerprint = frozenset([("txid1", None)])
+        second_fingerprint = frozenset([("txid1", 100)])
+
+        first_snapshot = wallet_history.get(
+            first_fingerprint, create_builder(first_fingerprint, built_fingerprints)
+        )
+        second_snapshot = wallet_history.get(
+            second_fingerprint, create_builder(second_fingerprint, built_fingerprints)
+        )
+
+        assert second_snapshot.version > first_snapshot.version
+        assert second_snapshot.transactions == ("transaction_2",)
+        # the older snapshot is left as it was
+        assert first_snapshot.transactions == ("transaction_1",)
+
+    def test_invalidated_snapshot_is_rebuilt(self):
+        wallet_history = WalletHistory()
+        built_fingerprints = []
+        fingerprint = frozenset([("txid1", 100)])
+
+        wallet_history.get(fingerprint, create_builder(fingerprint, built_fingerprints))
+        wallet_history.invalidate()
+        snapshot = wallet_history.get(
+            fingerprint, create_builder(fingerprint, built_fingerprints)
+        )
+
+        assert snapshot.version == 2
+        assert len(built_fingerprints) == 2
+
+    def test_snapshot_of_an_incompletely_synced_history_is_rebuilt(self):
+        wallet_history = WalletHistory()
+        built_fingerprints = []
+        fingerprint = frozenset([("txid1", 100)])
+
+        # the build could not sync the history, so it was built from an older one
+        wallet_history.get(fingerprint, create_builder(None, built_fingerprints))
+        wallet_history.get(fingerprint, create_builder(fingerprint, built_fingerprints))
+
+        assert built_fingerprints == [None, fingerprint]
+
+    def test_concurrent_rebuilds_are_coalesced(self):
+        wallet_history = WalletHistory()
+        fingerprint = frozenset([("txid1", 100)])
+        build_count = 0
+
+        def slow_build():
+            nonlocal build_count
+            build_count += 1
+            time.sleep(0.05)
+            return fingerprint, (), ()
+
+        snapshots = []
+        threads = [
+            threading.Thread(
+                target=lambda: snapshots.append(
+                    wallet_history.get(fingerprint, slow_build)
+                )
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert build_count == 1
+        assert len(snapshots) == 4
+        assert all(snapshot is snapshots[0] for snapshot in snapshots)
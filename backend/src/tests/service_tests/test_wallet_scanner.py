@@ -0,0 +1,193 @@
+import asyncio
+from unittest.case import TestCase
+from unittest.mock import patch
+
+import bdkpython as bdk
+import pytest
+
+from src.api.electrum import ElectrumMethod
+
+from src.services.wallet.wallet_scanner import (
+    WalletScanner,
+    get_script_status,
+    get_scripthash,
+)
+
+EXTERNAL = bdk.KeychainKind.EXTERNAL
+INTERNAL = bdk.KeychainKind.INTERNAL
+
+
+def derive_script(keychain, index) -> bytes:
+    return f"{keychain}/{index}".encode()
+
+
+def create_get_histories_mock(histories_by_script: dict, requested_batches: list):
+    """Answer every scripthash with the history, or the status of the history,
+    of its script, or an empty history if the script is unused."""
+    histories = {
+        get_scripthash(script): history
+        for script, history in histories_by_script.items()
+    }
+
+    async def get_histories(url, port, electrum_method, scripthashes):
+        requested_batches.append((electrum_method, scripthashes))
+        if electrum_method == ElectrumMethod.SUBSCRIBE_SCRIPTHASH:
+            return {
+                scripthash: get_script_status(histories.get(scripthash, []))
+                for scripthash in scripthashes
+            }
+        return {scripthash: histories.get(scripthash, []) for scripthash in scripthashes}
+
+    return get_histories
+
+
+class TestWalletScanner(TestCase):
+    def scan(self, histories_by_script, keychains, known_scripts=None, **scanner_kwargs):
+        requested_batches = []
+        with patch(
+            "src.services.wallet.wallet_scanner.electrum_scripthash_batch_request",
+            side_effect=create_get_histories_mock(histories_by_script, requested_batches),
+        ):
+            scanner = WalletScanner(
+                "127.0.0.1", 50001, derive_script, **scanner_kwargs
+            )
+            result = asyncio.run(scanner.scan(keychains, known_scripts))
+        return result, requested_batches
+
+    def test_unused_wallet_is_scanned_in_a_single_round_trip(self):
+        result, requested_batches = self.scan({}, [EXTERNAL], gap=20)
+
+        assert len(requested_batches) == 1
+        assert len(requested_batches[0][1]) == 20
+        (keychain_result,) = result.keychains
+        assert len(keychain_result.scripts) == 20
+        assert keychain_result.last_used_index is None
+        assert result.get_transaction_heights() == {}
+
+    def test_batches_grow_while_used_scripts_are_found(self):
+        histories_by_script = {
+            derive_script(EXTERNAL, index): [{"tx_hash": f"txid{index}", "height": 100}]
+            for index in range(100)
+        }
+
+        result, requested_batches = self.scan(
+            histories_by_script, [EXTERNAL], gap=10, max_batch_size=40
+        )
+
+        assert [len(batch) for _, batch in requested_batches] == [10, 20, 40, 40]
+        (keychain_result,) = result.keychains
+        assert keychain_result.last_used_index == 99
+        # the scan went at least gap scripts past the last used one
+        assert len(keychain_result.scripts) >= 110
+        assert len(result.get_transaction_heights()) == 100
+
+    def test_used_script_past_the_gap_in_a_larger_batch_is_found(self):
+        histories_by_script = {
+            derive_script(EXTERNAL, 0): [{"tx_hash": "txid0", "height": 100}],
+            derive_script(EXTERNAL, 25): [{"tx_hash": "txid25", "height": 100}],
+        }
+
+        result, _ = self.scan(histories_by_script, [EXTERNAL], gap=10)
+
+        (keychain_result,) = result.keychains
+        assert keychain_result.last_used_index == 25
+        assert keychain_result.largest_gap == 24
+        # a sync needs a large enough stop gap to also find the script at 25
+        assert result.get_required_stop_gap(min_stop_gap=20) == 25
+        assert result.get_required_stop_gap(min_stop_gap=30) == 30
+
+    def test_history_before_the_birthday_height_is_skipped(self):
+        # the first script is only used before the birthday, the next used
+        # one would not be reached if the first one were counted as unused.
+        histories_by_script = {
+            derive_script(EXTERNAL, 0): [{"tx_hash": "old_txid", "height": 100}],
+            derive_script(EXTERNAL, 5): [
+                {"tx_hash": "old_txid", "height": 100},
+                {"tx_hash": "new_txid", "height": 500},
+            ],
+            derive_script(INTERNAL, 0): [{"tx_hash": "unconfirmed_txid", "height": 0}],
+        }
+
+        result, _ = self.scan(
+            histories_by_script, [EXTERNAL, INTERNAL], gap=5, birthday_height=200
+        )
+
+        external_result, internal_result = result.keychains
+        assert [script.index for script in external_result.used_scripts] == [0, 5]
+        assert internal_result.last_used_index == 0
+        assert result.get_transaction_heights() == {
+            "new_txid": 500,
+            "unconfirmed_txid": 0,
+        }
+
+    def test_rescan_of_an_unchanged_wallet_only_checks_the_statuses(self):
+        histories_by_script = {
+            derive_script(EXTERNAL, index): [{"tx_hash": f"txid{index}", "height": 100}]
+            for index in range(30)
+        }
+        first_result, _ = self.scan(histories_by_script, [EXTERNAL], gap=10)
+
+        result, requested_batches = self.scan(
+            histories_by_script,
+            [EXTERNAL],
+            known_scripts=first_result.get_scripts(),
+            gap=10,
+        )
+
+        # a single round trip of status requests
+        assert [method for method, _ in requested_batches] == [
+            ElectrumMethod.SUBSCRIBE_SCRIPTHASH
+        ]
+        assert result.is_unchanged
+        assert result.get_scripts() == first_result.get_scripts()
+
+    def test_rescan_only_refetches_the_history_of_changed_scripts(self):
+        histories_by_script = {
+            derive_script(EXTERNAL, index): [{"tx_hash": f"txid{index}", "height": 100}]
+            for index in range(5)
+        }
+        first_result, _ = self.scan(histories_by_script, [EXTERNAL], gap=10)
+        assert not first_result.is_unchanged
+
+        # a new transaction to the script at 2, and to the next unused script
+        histories_by_script[derive_script(EXTERNAL, 2)].append(
+            {"tx_hash": "new_txid", "height": 0}
+        )
+        histories_by_script[derive_script(EXTERNAL, 5)] = [
+            {"tx_hash": "new_txid", "height": 0}
+        ]
+        result, requested_batches = self.scan(
+            histories_by_script,
+            [EXTERNAL],
+            known_scripts=first_result.get_scripts(),
+            gap=10,
+        )
+
+        history_requests = [
+            scripthash
+            for method, batch in requested_batches
+            if method == ElectrumMethod.GET_SCRIPTHASH_HISTORY
+            for scripthash in batch
+        ]
+        assert sorted(history_requests) == sorted(
+            [
+                get_scripthash(derive_script(EXTERNAL, 2)),
+                get_scripthash(derive_script(EXTERNAL, 5)),
+            ]
+        )
+        assert result.fetched_count == 2
+        assert not result.is_unchanged
+        assert result.keychains[0].last_used_index == 5
+        assert result.get_transaction_heights()["new_txid"] == 0
+
+    def test_scan_fails_if_a_history_could_not_be_fetched(self):
+        async def get_histories(url, port, electrum_method, scripthashes):
+            return {}
+
+        with patch(
+            "src.services.wallet.wallet_scanner.electrum_scripthash_batch_request",
+            side_effect=get_histories,
+        ):
+            scanner = WalletScanner("127.0.0.1", 50001, derive_script, gap=5)
+            with pytest.raises(ConnectionError):
+                asyncio.run(scanner.scan([EXTERNAL]))
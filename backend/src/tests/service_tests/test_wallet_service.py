@@ -1,5 +1,9 @@
 from unittest.case import TestCase
+import asyncio
+import tempfile
 import os
+import sqlite3
+from contextlib import closing
 import copy
 from unittest.mock import MagicMock, call, patch, Mock
 from src.models.outputs import Output as OutputModel
@@ -10,6 +14,8 @@ from src.api.electrum import (
     GetTransactionsRequestParams,
     GetTransactionsResponse,
 )
+from src.models.last_fetched import LastFetched
+from src.models.script_status import ScriptStatus
 from src.models.wallet import Wallet
 from src.my_types.controller_types.utxos_dtos import (
     OutputLabelDto,
@@ -22,6 +28,14 @@ from src.services.wallet.wallet import (
     GetFeeEstimateForUtxoResponseType,
     BuildTransactionResponseType,
 )
+from src.services.wallet.script_index import ScriptIndex
+from src.services.wallet.transaction_enrichment_pipeline import (
+    TransactionEnrichmentPipeline,
+)
+from src.services.wallet.raw_transaction_cache import RawTransactionCache
+from src.services.wallet.wallet_history import WalletHistory, WalletHistorySnapshot
+from src.services.wallet.wallet_events import get_wallet_event_stream
+from src.services.wallet.wallet_sync import WalletSyncProgress, get_wallet_sync_worker
 import bdkpython as bdk
 from src.my_types import (
     FeeDetails,
@@ -59,12 +73,16 @@ class TestWalletService(TestCase):
         ):
             WalletService.wallet = None
             WalletService.wallet_id = None
+            WalletService.script_index = None
+            WalletService.wallet_database_path = None
+            WalletService.syncing_wallet_database_path = None
+            get_wallet_sync_worker().clear_wallet()
             self.wallet_service = WalletService()
 
     def test_connect_wallet(self):
         descriptor_mock = MagicMock(spec=bdk.Descriptor)
 
-        memory_mock = MagicMock()
+        database_config_mock = MagicMock()
         block_chain_config_mock = MagicMock(spec=bdk.BlockchainConfig)
         electrum_config_mock = MagicMock(spec=bdk.ElectrumConfig)
         block_chain_mock = MagicMock(spec=bdk.Blockchain)
@@ -78,14 +96,17 @@ class TestWalletService(TestCase):
         wallet_details_mock.electrum_url = "mock_url"
         wallet_details_mock.id = "mock_id"
         wallet_details_mock.stop_gap = 100
+        wallet_details_mock.fast_import = False
 
         with (
             patch.object(
                 bdk, "Descriptor", return_value=descriptor_mock
             ) as descriptor_patch,
             patch.object(
-                bdk.DatabaseConfig, "MEMORY", return_value=memory_mock
-            ) as database_config_memory_patch,
+                WalletService,
+                "get_wallet_database_config",
+                return_value=database_config_mock,
+            ) as get_wallet_database_config_patch,
             patch.object(
                 bdk.BlockchainConfig, "ELECTRUM", return_value=block_chain_config_mock
             ) as block_chain_config_electrum_mock,
@@ -117,7 +138,11 @@ class TestWalletService(TestCase):
             ]
             descriptor_patch.assert_has_calls(expected_calls)
 
-            database_config_memory_patch.assert_called()
+            get_wallet_database_config_patch.assert_called_with(
+                wallet_details_mock.descriptor,
+                wallet_details_mock.change_descriptor,
+                wallet_details_mock.network,
+            )
             block_chain_config_electrum_mock.assert_called_with(
                 electrum_config_mock)
             electrum_config_patch.assert_called_with(
@@ -129,18 +154,22 @@ class TestWalletService(TestCase):
                 descriptor=descriptor_mock,
                 change_descriptor=descriptor_mock,
                 network=bdk.Network.TESTNET,
-                database_config=memory_mock,
+                database_config=database_config_mock,
             )
 
             assert WalletService.wallet == wallet_mock
 
             assert response == wallet_mock
-            wallet_sync_mock.assert_called_with(block_chain_mock, None)
+            wallet_sync_mock.assert_called_once()
+            sync_blockchain, sync_progress = wallet_sync_mock.call_args.args
+            assert sync_blockchain == block_chain_mock
+            # the sync reports its progress to the sync worker
+            assert isinstance(sync_progress, WalletSyncProgress)
 
     def test_connect_wallet_with_wallet_without_change_descriptor(self):
         descriptor_mock = MagicMock(spec=bdk.Descriptor)
 
-        memory_mock = MagicMock()
+        database_config_mock = MagicMock()
         block_chain_config_mock = MagicMock(spec=bdk.BlockchainConfig)
         electrum_config_mock = MagicMock(spec=bdk.ElectrumConfig)
         block_chain_mock = MagicMock(spec=bdk.Blockchain)
@@ -154,14 +183,17 @@ class TestWalletService(TestCase):
         wallet_details_mock.electrum_url = "mock_url"
         wallet_details_mock.id = "mock_id"
         wallet_details_mock.stop_gap = 100
+        wallet_details_mock.fast_import = False
 
         with (
             patch.object(
                 bdk, "Descriptor", return_value=descriptor_mock
             ) as descriptor_patch,
             patch.object(
-                bdk.DatabaseConfig, "MEMORY", return_value=memory_mock
-            ) as database_config_memory_patch,
+                WalletService,
+                "get_wallet_database_config",
+                return_value=database_config_mock,
+            ) as get_wallet_database_config_patch,
             patch.object(
                 bdk.BlockchainConfig, "ELECTRUM", return_value=block_chain_config_mock
             ) as block_chain_config_electrum_mock,
@@ -189,7 +221,11 @@ class TestWalletService(TestCase):
             ]
             descriptor_patch.assert_has_calls(expected_calls)
 
-            database_config_memory_patch.assert_called()
+            get_wallet_database_config_patch.assert_called_with(
+                wallet_details_mock.descriptor,
+                wallet_details_mock.change_descriptor,
+                wallet_details_mock.network,
+            )
             block_chain_config_electrum_mock.assert_called_with(
                 electrum_config_mock)
             electrum_config_patch.assert_called_with(
@@ -201,13 +237,17 @@ class TestWalletService(TestCase):
                 descriptor=descriptor_mock,
                 change_descriptor=None,
                 network=bdk.Network.TESTNET,
-                database_config=memory_mock,
+                database_config=database_config_mock,
             )
 
             assert WalletService.wallet == wallet_mock
 
             assert response == wallet_mock
-            wallet_sync_mock.assert_called_with(block_chain_mock, None)
+            wallet_sync_mock.assert_called_once()
+            sync_blockchain, sync_progress = wallet_sync_mock.call_args.args
+            assert sync_blockchain == block_chain_mock
+            # the sync reports its progress to the sync worker
+            assert isinstance(sync_progress, WalletSyncProgress)
 
     def test_connect_wallet_with_existing_wallet(
         self,
@@ -221,6 +261,7 @@ class TestWalletService(TestCase):
         wallet_details_mock.electrum_url = "mock_url"
         wallet_details_mock.id = "mock_id"
         wallet_details_mock.stop_gap = 100
+        wallet_details_mock.fast_import = False
 
         with (
             patch.object(bdk, "Wallet", return_value=wallet_mock) as bdk_wallet_patch,
@@ -241,7 +282,7 @@ class TestWalletService(TestCase):
     ):
         descriptor_mock = MagicMock(spec=bdk.Descriptor)
 
-        memory_mock = MagicMock()
+        database_config_mock = MagicMock()
         block_chain_config_mock = MagicMock(spec=bdk.BlockchainConfig)
         electrum_config_mock = MagicMock(spec=bdk.ElectrumConfig)
         block_chain_mock = MagicMock(spec=bdk.Blockchain)
@@ -255,14 +296,17 @@ class TestWalletService(TestCase):
         wallet_details_mock.network = bdk.Network.TESTNET.value
         wallet_details_mock.electrum_url = "mock_url"
         wallet_details_mock.stop_gap = 100
+        wallet_details_mock.fast_import = False
 
         with (
             patch.object(
                 bdk, "Descriptor", return_value=descriptor_mock
             ) as descriptor_patch,
             patch.object(
-                bdk.DatabaseConfig, "MEMORY", return_value=memory_mock
-            ) as database_config_memory_patch,
+                WalletService,
+                "get_wallet_database_config",
+                return_value=database_config_mock,
+            ) as get_wallet_database_config_patch,
             patch.object(
                 bdk.BlockchainConfig, "ELECTRUM", return_value=block_chain_config_mock
             ) as block_chain_config_electrum_mock,
@@ -294,7 +338,11 @@ class TestWalletService(TestCase):
             ]
             descriptor_patch.assert_has_calls(expected_calls)
 
-            database_config_memory_patch.assert_called()
+            get_wallet_database_config_patch.assert_called_with(
+                wallet_details_mock.descriptor,
+                wallet_details_mock.change_descriptor,
+                wallet_details_mock.network,
+            )
             block_chain_config_electrum_mock.assert_called_with(
                 electrum_config_mock)
             electrum_config_patch.assert_called_with(
@@ -306,13 +354,17 @@ class TestWalletService(TestCase):
                 descriptor=descriptor_mock,
                 change_descriptor=descriptor_mock,
                 network=bdk.Network.TESTNET,
-                database_config=memory_mock,
+                database_config=database_config_mock,
             )
 
             assert WalletService.wallet == wallet_mock
 
             assert response == wallet_mock
-            wallet_sync_mock.assert_called_with(block_chain_mock, None)
+            wallet_sync_mock.assert_called_once()
+            sync_blockchain, sync_progress = wallet_sync_mock.call_args.args
+            assert sync_blockchain == block_chain_mock
+            # the sync reports its progress to the sync worker
+            assert isinstance(sync_progress, WalletSyncProgress)
 
     def test_connect_wallet_without_wallet_in_db(
         self,
@@ -335,6 +387,354 @@ class TestWalletService(TestCase):
             with pytest.raises(Exception, match="No wallet details in the database"):
                 WalletService.connect_wallet()
 
+    def test_start_wallet_sync_with_fast_import_sizes_the_stop_gap_from_a_scan(self):
+        wallet_details_mock = MagicMock()
+        wallet_details_mock.id = "mock_id"
+        wallet_details_mock.descriptor = "mock_descriptor"
+        wallet_details_mock.change_descriptor = "mock_change_descriptor"
+        wallet_details_mock.network = bdk.Network.TESTNET.value
+        wallet_details_mock.electrum_url = "mock_url"
+        wallet_details_mock.stop_gap = 100
+        wallet_details_mock.birthday_height = 800000
+        wallet_details_mock.fast_import = True
+        wallet_mock = MagicMock()
+        block_chain_mock = MagicMock()
+        scan_result_mock = MagicMock()
+        scan_result_mock.get_required_stop_gap.return_value = 25
+
+        scan_result_mock.is_unchanged = False
+
+        with (
+            patch.object(
+                WalletService, "refresh_scanned_scripts", return_value=scan_result_mock
+            ) as refresh_scanned_scripts_patch,
+            patch.object(
+                WalletService,
+                "open_wallet",
+                return_value=(wallet_mock, block_chain_mock),
+            ) as open_wallet_patch,
+        ):
+            job = WalletService.start_wallet_sync(wallet_details_mock)
+            finished_job = get_wallet_sync_worker().wait(job.id, timeout=5)
+
+            assert finished_job.state == "succeeded"
+            refresh_scanned_scripts_patch.assert_called_once_with(
+                "mock_id",
+                "mock_descriptor",
+                "mock_change_descriptor",
+                bdk.Network.TESTNET.value,
+                "mock_url",
+                100,
+                800000,
+            )
+            open_wallet_patch.assert_called_once_with(
+                "mock_descriptor",
+                "mock_change_descriptor",
+                bdk.Network.TESTNET.value,
+                "mock_url",
+                25,
+            )
+            assert WalletService.wallet == wallet_mock
+            assert WalletService.wallet_id == "mock_id"
+
+    def test_start_wallet_sync_without_fast_import_does_not_scan(self):
+        wallet_details_mock = MagicMock()
+        wallet_details_mock.id = "mock_id"
+        wallet_details_mock.descriptor = "mock_descriptor"
+        wallet_details_mock.change_descriptor = "mock_change_descriptor"
+        wallet_details_mock.network = bdk.Network.TESTNET.value
+        wallet_details_mock.electrum_url = "mock_url"
+        wallet_details_mock.stop_gap = 100
+        wallet_details_mock.fast_import = False
+        wallet_mock = MagicMock()
+        block_chain_mock = MagicMock()
+
+        with (
+            patch.object(
+                WalletService, "refresh_scanned_scripts"
+            ) as refresh_scanned_scripts_patch,
+            patch.object(
+                WalletService,
+                "open_wallet",
+                return_value=(wallet_mock, block_chain_mock),
+            ) as open_wallet_patch,
+        ):
+            job = WalletService.start_wallet_sync(wallet_details_mock)
+            finished_job = get_wallet_sync_worker().wait(job.id, timeout=5)
+
+            assert finished_job.state == "succeeded"
+            refresh_scanned_scripts_patch.assert_not_called()
+            open_wallet_patch.assert_called_once_with(
+                "mock_descriptor",
+                "mock_change_descriptor",
+                bdk.Network.TESTNET.value,
+                "mock_url",
+                100,
+            )
+            assert WalletService.wallet == wallet_mock
+
+    def test_start_wallet_sync_without_fast_import_indexes_the_wallets_scripts(self):
+        wallet_details_mock = MagicMock()
+        wallet_details_mock.id = "mock_id"
+        wallet_details_mock.change_descriptor = "mock_change_descriptor"
+        wallet_details_mock.stop_gap = 100
+        wallet_details_mock.fast_import = False
+        wallet_mock = MagicMock()
+        script_index_mock = MagicMock()
+        script_index_mock.wallet_id = "mock_id"
+        script_index_mock.is_mine.return_value = True
+
+        with (
+            patch.object(
+                WalletService, "open_wallet", return_value=(wallet_mock, MagicMock())
+            ),
+            patch.object(
+                ScriptIndex, "from_wallet", return_value=script_index_mock
+            ) as from_wallet_patch,
+        ):
+            job = WalletService.start_wallet_sync(wallet_details_mock)
+            finished_job = get_wallet_sync_worker().wait(job.id, timeout=5)
+
+            assert finished_job.state == "succeeded"
+            from_wallet_patch.assert_called_once_with(
+                "mock_id",
+                wallet_mock,
+                [bdk.KeychainKind.EXTERNAL, bdk.KeychainKind.INTERNAL],
+                100,
+            )
+            assert WalletService.is_mine(b"mock_script") is True
+            script_index_mock.is_mine.assert_called_once_with(b"mock_script")
+            wallet_mock.is_mine.assert_not_called()
+
+    def test_start_wallet_sync_is_skipped_if_no_script_changed(self):
+        wallet_details_mock = MagicMock()
+        wallet_details_mock.id = "mock_id"
+        wallet_details_mock.fast_import = True
+        scan_result_mock = MagicMock()
+        scan_result_mock.is_unchanged = True
+        wallet_mock = MagicMock()
+        WalletService.wallet = wallet_mock
+        WalletService.wallet_id = "mock_id"
+
+        with (
+            patch.object(
+                WalletService, "refresh_scanned_scripts", return_value=scan_result_mock
+            ),
+            patch.object(WalletService, "open_wallet") as open_wallet_patch,
+        ):
+            job = WalletService.start_wallet_sync(wallet_details_mock)
+            finished_job = get_wallet_sync_worker().wait(job.id, timeout=5)
+
+            assert finished_job.state == "succeeded"
+            assert (
+                finished_job.message
+                == "The wallet has not changed since the last sync"
+            )
+            open_wallet_patch.assert_not_called()
+            assert WalletService.wallet == wallet_mock
+
+    def test_is_mine_uses_the_script_index_of_the_connected_wallet(self):
+        script_index_mock = MagicMock()
+        script_index_mock.wallet_id = "mock_id"
+        script_index_mock.is_mine.return_value = True
+        WalletService.wallet = self.bdk_wallet_mock
+        WalletService.wallet_id = "mock_id"
+        WalletService.script_index = script_index_mock
+
+        assert WalletService.is_mine(b"mock_script") is True
+        script_index_mock.is_mine.assert_called_once_with(b"mock_script")
+        self.bdk_wallet_mock.is_mine.assert_not_called()
+
+        # the index of another wallet is not used
+        script_index_mock.wallet_id = "different_id"
+        self.bdk_wallet_mock.is_mine.return_value = False
+        with patch.object(bdk, "Script") as script_patch:
+            assert WalletService.is_mine(b"mock_script") is False
+            script_patch.assert_called_once_with(b"mock_script")
+        self.bdk_wallet_mock.is_mine.assert_called_once()
+
+    def test_subscribe_to_wallet_changes_subscribes_to_the_scanned_scripts(self):
+        script_mock = MagicMock()
+        script_mock.scripthash = "mock_scripthash"
+        script_mock.status = "mock_status"
+        scan_result_mock = MagicMock()
+        scan_result_mock.get_scripts.return_value = [script_mock]
+
+        with patch(
+            "src.services.wallet.wallet.get_wallet_subscriber"
+        ) as get_wallet_subscriber_patch:
+            WalletService.subscribe_to_wallet_changes("127.0.0.1:50001", scan_result_mock)
+            # without a port there is no electrum server to subscribe to
+            WalletService.subscribe_to_wallet_changes("mock_url", scan_result_mock)
+
+            get_wallet_subscriber_patch.return_value.subscribe.assert_called_once_with(
+                "127.0.0.1",
+                50001,
+                {"mock_scripthash": "mock_status"},
+                WalletService.handle_wallet_change,
+            )
+
+    def test_set_synced_wallet_only_publishes_changed_wallets(self):
+        def create_synced_wallet(height):
+            wallet = MagicMock()
+            wallet.list_transactions.return_value = [
+                Mock(txid="txid1", confirmation_time=Mock(height=height))
+            ]
+            return wallet
+
+        blockchain_mock = MagicMock()
+        last_event_id = get_wallet_event_stream().last_event_id
+
+        WalletService.set_synced_wallet(
+            "mock_id", create_synced_wallet(100), blockchain_mock
+        )
+        # nothing changed since the last sync
+        WalletService.set_synced_wallet(
+            "mock_id", create_synced_wallet(100), blockchain_mock
+        )
+        WalletService.set_synced_wallet(
+            "mock_id", create_synced_wallet(101), blockchain_mock
+        )
+
+        events = get_wallet_event_stream().get_events(last_event_id)
+        assert [(event.type, event.data) for event in events] == [
+            ("wallet_synced", {"walletId": "mock_id"}),
+            ("wallet_synced", {"walletId": "mock_id"}),
+        ]
+
+    def test_handle_wallet_change_publishes_new_blocks_and_requests_a_sync(self):
+        last_event_id = get_wallet_event_stream().last_event_id
+
+        with patch(
+            "src.services.wallet.wallet.get_wallet_sync_worker"
+        ) as get_wallet_sync_worker_patch:
+            WalletService.handle_wallet_change(800001)
+            WalletService.handle_wallet_change(None)
+
+            assert get_wallet_sync_worker_patch.return_value.request_sync.call_count == 2
+            events = get_wallet_event_stream().get_events(last_event_id)
+            assert [(event.type, event.data) for event in events] == [
+                ("new_block", {"height": 800001})
+            ]
+
+    def test_get_wallet_database_config_uses_a_file_per_wallet(self):
+        sqlite_config_mock = MagicMock()
+        with (
+            tempfile.TemporaryDirectory() as data_dir,
+            patch.dict(os.environ, {"LIVE_WALLET_DATA_DIR": data_dir}),
+            patch(
+                "src.services.wallet.wallet.is_testing_environment",
+                return_value=False,
+            ),
+            patch.object(
+                bdk.DatabaseConfig, "SQLITE", return_value=sqlite_config_mock
+            ) as database_config_sqlite_patch,
+            patch.object(bdk, "SqliteDbConfiguration") as sqlite_db_configuration_patch,
+        ):
+            response = WalletService.get_wallet_database_config(
+                "mock_descriptor", "mock_change_descriptor", "TESTNET"
+            )
+
+            assert response == sqlite_config_mock
+            database_config_sqlite_patch.assert_called_with(
+                sqlite_db_configuration_patch.return_value
+            )
+            database_path = sqlite_db_configuration_patch.call_args.kwargs["path"]
+            assert os.path.dirname(database_path) == os.path.join(
+                data_dir, "bdk_wallets"
+            )
+            assert "mock_descriptor" not in database_path
+
+            # the same wallet reopens the same file
+            assert database_path == WalletService.get_wallet_database_path(
+                "mock_descriptor", "mock_change_descriptor", "TESTNET"
+            )
+            assert database_path != WalletService.get_wallet_database_path(
+                "other_descriptor", "mock_change_descriptor", "TESTNET"
+            )
+            assert database_path != WalletService.get_wallet_database_path(
+                "mock_descriptor", "mock_change_descriptor", "REGTEST"
+            )
+
+    def test_get_wallet_database_config_syncs_a_copy_of_the_connected_wallet(self):
+        with (
+            tempfile.TemporaryDirectory() as data_dir,
+            patch.dict(os.environ, {"LIVE_WALLET_DATA_DIR": data_dir}),
+            patch(
+                "src.services.wallet.wallet.is_testing_environment",
+                return_value=False,
+            ),
+            patch.object(bdk.DatabaseConfig, "SQLITE"),
+            patch.object(bdk, "SqliteDbConfiguration") as sqlite_db_configuration_patch,
+        ):
+            database_path, spare_database_path = [
+                WalletService.get_wallet_database_path(
+                    "mock_descriptor", None, bdk.Network.TESTNET.value, is_spare
+                )
+                for is_spare in [False, True]
+            ]
+
+            def sync_wallet() -> str:
+                WalletService.get_wallet_database_config(
+                    "mock_descriptor", None, bdk.Network.TESTNET.value
+                )
+                WalletService.set_synced_wallet("mock_id", MagicMock(), MagicMock())
+                return sqlite_db_configuration_patch.call_args.kwargs["path"]
+
+            # nothing is using the wallet's file yet
+            assert sync_wallet() == database_path
+            assert WalletService.wallet_database_path == database_path
+            with closing(sqlite3.connect(database_path)) as connection:
+                connection.execute("CREATE TABLE synced (height INTEGER)")
+
+            # the file of the connected wallet is copied and the copy synced
+            assert sync_wallet() == spare_database_path
+            assert WalletService.wallet_database_path == spare_database_path
+            with closing(sqlite3.connect(spare_database_path)) as connection:
+                assert connection.execute("SELECT * FROM synced").fetchall() == []
+
+            assert sync_wallet() == database_path
+
+    def test_get_wallet_database_config_with_a_bdk_network(self):
+        with (
+            tempfile.TemporaryDirectory() as data_dir,
+            patch.dict(os.environ, {"LIVE_WALLET_DATA_DIR": data_dir}),
+            patch(
+                "src.services.wallet.wallet.is_testing_environment",
+                return_value=False,
+            ),
+        ):
+            database_path = WalletService.get_wallet_database_path(
+                "mock_descriptor", None, bdk.Network.TESTNET.value
+            )
+            response = WalletService.get_wallet_database_config(
+                "mock_descriptor", None, bdk.Network.TESTNET.value
+            )
+
+            assert isinstance(response, bdk.DatabaseConfig.SQLITE)
+            assert response.config.path == database_path
+            assert database_path != WalletService.get_wallet_database_path(
+                "mock_descriptor", None, bdk.Network.REGTEST.value
+            )
+
+    def test_get_wallet_database_config_while_testing(self):
+        memory_mock = MagicMock()
+        with (
+            patch(
+                "src.services.wallet.wallet.is_testing_environment",
+                return_value=True,
+            ),
+            patch.object(
+                bdk.DatabaseConfig, "MEMORY", return_value=memory_mock
+            ) as database_config_memory_patch,
+        ):
+            response = WalletService.get_wallet_database_config(
+                "mock_descriptor", None, "TESTNET"
+            )
+
+            database_config_memory_patch.assert_called()
+            assert response == memory_mock
+
     def test_create_wallet(self):
         with (
             patch("src.services.wallet.wallet.Wallet") as wallet_model_patch,
@@ -342,6 +742,9 @@ class TestWalletService(TestCase):
             patch.object(
                 WalletService, "remove_global_wallet_and_details"
             ) as remove_global_wallet_and_details_patch,
+            patch(
+                "src.services.wallet.wallet.set_current_wallet_id"
+            ) as set_current_wallet_id_patch,
         ):
             mock_wallet = MagicMock()
             wallet_model_patch.return_value = mock_wallet
@@ -365,16 +768,23 @@ class TestWalletService(TestCase):
             wallet_model_patch.get_current_wallet.assert_called()
             remove_global_wallet_and_details_patch.assert_not_called()
 
+            wallet_model_patch.get_wallet_id.assert_called_with(
+                descriptor, change_descriptor, network.value
+            )
             wallet_model_patch.assert_called_with(
+                id=wallet_model_patch.get_wallet_id.return_value,
                 descriptor=descriptor,
                 change_descriptor=change_descriptor,
                 network=network.value,
                 electrum_url=electrum_url,
                 stop_gap=stop_gap,
+                birthday_height=None,
+                fast_import=False,
             )
 
             db_patch.session.add.assert_called_with(mock_wallet)
             db_patch.session.commit.assert_called()
+            set_current_wallet_id_patch.assert_called_with(mock_wallet.id)
 
     def test_create_wallet_with_no_change_descriptor(self):
         with (
@@ -383,6 +793,9 @@ class TestWalletService(TestCase):
             patch.object(
                 WalletService, "remove_global_wallet_and_details"
             ) as remove_global_wallet_and_details_patch,
+            patch(
+                "src.services.wallet.wallet.set_current_wallet_id"
+            ) as set_current_wallet_id_patch,
         ):
             mock_wallet = MagicMock()
             wallet_model_patch.return_value = mock_wallet
@@ -406,16 +819,23 @@ class TestWalletService(TestCase):
             wallet_model_patch.get_current_wallet.assert_called()
             remove_global_wallet_and_details_patch.assert_not_called()
 
+            wallet_model_patch.get_wallet_id.assert_called_with(
+                descriptor, change_descriptor, network.value
+            )
             wallet_model_patch.assert_called_with(
+                id=wallet_model_patch.get_wallet_id.return_value,
                 descriptor=descriptor,
                 change_descriptor=change_descriptor,
                 network=network.value,
                 electrum_url=electrum_url,
                 stop_gap=stop_gap,
+                birthday_height=None,
+                fast_import=False,
             )
 
             db_patch.session.add.assert_called_with(mock_wallet)
             db_patch.session.commit.assert_called()
+            set_current_wallet_id_patch.assert_called_with(mock_wallet.id)
 
     def test_create_wallet_with_existing_current_wallet_in_db(self):
         with (
@@ -424,6 +844,9 @@ class TestWalletService(TestCase):
             patch.object(
                 WalletService, "remove_global_wallet_and_details"
             ) as remove_global_wallet_and_details_patch,
+            patch(
+                "src.services.wallet.wallet.set_current_wallet_id"
+            ) as set_current_wallet_id_patch,
         ):
             mock_wallet = MagicMock()
             wallet_model_patch.return_value = mock_wallet
@@ -447,16 +870,23 @@ class TestWalletService(TestCase):
             wallet_model_patch.get_current_wallet.assert_called()
             remove_global_wallet_and_details_patch.assert_called()
 
+            wallet_model_patch.get_wallet_id.assert_called_with(
+                descriptor, change_descriptor, network.value
+            )
             wallet_model_patch.assert_called_with(
+                id=wallet_model_patch.get_wallet_id.return_value,
                 descriptor=descriptor,
                 change_descriptor=change_descriptor,
                 network=network.value,
                 electrum_url=electrum_url,
                 stop_gap=stop_gap,
+                birthday_height=None,
+                fast_import=False,
             )
 
             db_patch.session.add.assert_called_with(mock_wallet)
             db_patch.session.commit.assert_called()
+            set_current_wallet_id_patch.assert_called_with(mock_wallet.id)
 
     def test_remove_global_wallet_and_details(self):
         with patch("src.services.wallet.wallet.DB") as db_patch:
@@ -474,6 +904,33 @@ class TestWalletService(TestCase):
             assert WalletService.wallet == None
             assert WalletService.wallet_id == None
 
+    def test_remove_wallet_removes_the_wallets_data(self):
+        wallet_details = Wallet(
+            id="mock_wallet_id",
+            descriptor="mock_descriptor",
+            change_descriptor=None,
+            network=bdk.Network.TESTNET.value,
+        )
+        with (
+            patch("src.services.wallet.wallet.DB") as db_patch,
+            patch.object(Wallet, "get_current_wallet", return_value=wallet_details),
+            patch.object(
+                WalletService, "remove_output_and_related_label_data"
+            ) as remove_output_and_related_label_data_patch,
+            patch.object(
+                WalletService, "remove_global_wallet_and_details"
+            ) as remove_global_wallet_and_details_patch,
+        ):
+            WalletService.remove_wallet()
+
+            remove_output_and_related_label_data_patch.assert_called_once()
+            remove_global_wallet_and_details_patch.assert_called_once()
+            queried_models = [
+                query_call.args[0] for query_call in db_patch.session.query.call_args_list
+            ]
+            assert queried_models == [LastFetched, ScriptStatus]
+            db_patch.session.commit.assert_called()
+
     def test_create_spenable_wallet_creates_P2PKH_descriptor(self):
         network = bdk.Network.TESTNET
         script_type = ScriptType.P2PKH
@@ -895,75 +1352,211 @@ class TestWalletService(TestCase):
         with (
             patch("src.services.wallet.wallet.Wallet") as wallet_model_patch,
             patch(
-                "src.services.wallet.wallet.electrum_request"
-            ) as mock_electrum_request,
+                "src.services.wallet.wallet.get_raw_transaction_cache",
+                return_value=RawTransactionCache(":memory:"),
+            ),
+            patch(
+                "src.services.wallet.wallet.electrum_raw_batch_request"
+            ) as mock_electrum_raw_batch_request,
             patch.object(WalletService, "wallet") as mock_wallet,
             patch.object(
-                WalletService, "add_transaction_to_db"
-            ) as mock_add_transaction_to_db,
+                WalletService, "add_transactions_to_db"
+            ) as mock_add_transactions_to_db,
+            patch.object(
+                WalletService, "get_all_inputs_from_db", return_value=MagicMock()
+            ),
+            patch.object(
+                WalletService, "update_outputs_from_transactions"
+            ) as mock_update_outputs_from_transactions,
+            patch.object(
+                WalletService, "get_synced_transaction_heights", return_value={}
+            ),
             patch.object(
                 LastFetchedService, "update_last_fetched_transaction_type"
             ) as mock_update_last_fetched_transaction_type,
         ):
-            # mock the transactions that bdk fetches from the wallet
+            raw_transaction = all_transactions_mock[0].rawtx
+            # mock the transactions, including their raw bytes,
+            # that bdk has for the wallet
             mock_wallet.list_transactions.return_value = [
                 Mock(txid="txid1"),
                 Mock(txid="txid2"),
             ]
+            for transaction in mock_wallet.list_transactions.return_value:
+                transaction.transaction.serialize.return_value = list(
+                    raw_transaction)
 
             wallet_details_mock = MagicMock()
             wallet_details_mock.electrum_url = "blockstream:1234"
 
-            all_transactions_from_electrum = [
-                all_transactions_mock[0],
-                all_transactions_mock[0],
-            ]
-            all_transactions_from_electrum[1].txid = "txid2"
-
-            mock_electrum_request.side_effect = [
-                ElectrumResponse(
-                    status="success", data=all_transactions_from_electrum[0]
-                ),
-                ElectrumResponse(
-                    status="success", data=all_transactions_from_electrum[1]
-                ),
-            ]
             wallet_model_patch.get_current_wallet.return_value = wallet_details_mock
             self.wallet_service.wallet = mock_wallet
 
             # call the method we are testing
-            get_all_transactions_response = (
-                await self.wallet_service.get_all_transactions()
+            get_all_transactions_response = asyncio.run(
+                self.wallet_service.get_all_transactions()
             )
 
-            mock_wallet.list_transactions.assert_called_with(False)
-            mock_add_transaction_to_db.assert_called()
+            mock_wallet.list_transactions.assert_called_with(True)
+            mock_add_transactions_to_db.assert_called()
+            mock_update_outputs_from_transactions.assert_called_once_with(
+                get_all_transactions_response, set()
+            )
             mock_update_last_fetched_transaction_type.assert_called()
 
-            assert mock_electrum_request.call_count == 2
-            mock_electrum_request.assert_any_call(
-                "blockstream",
-                1234,
-                ElectrumMethod.GET_TRANSACTIONS,
-                GetTransactionsRequestParams("txid1", False),
-                0,
+            # the wallet's transactions are parsed from bdk's raw bytes
+            # and every input is already in the db, therefore nothing is fetched.
+            mock_electrum_raw_batch_request.assert_not_called()
+
+            assert [
+                transaction.txid for transaction, _ in get_all_transactions_response
+            ] == [all_transactions_mock[0].txid, all_transactions_mock[0].txid]
+
+    def test_get_all_transactions_only_fetches_foreign_parent_transactions(self):
+        with (
+            patch("src.services.wallet.wallet.Wallet") as wallet_model_patch,
+            patch(
+                "src.services.wallet.wallet.get_raw_transaction_cache",
+                return_value=RawTransactionCache(":memory:"),
+            ),
+            patch(
+                "src.services.wallet.wallet.electrum_raw_batch_request"
+            ) as mock_electrum_raw_batch_request,
+            patch.object(WalletService, "wallet") as mock_wallet,
+            patch.object(WalletService, "add_transactions_to_db"),
+            patch.object(WalletService, "add_all_inputs_to_db"),
+            patch.object(
+                WalletService, "get_all_inputs_from_db", return_value={}
+            ),
+            patch.object(
+                WalletService, "update_outputs_from_transactions"
+            ) as mock_update_outputs_from_transactions,
+            patch.object(
+                WalletService, "get_synced_transaction_heights", return_value={}
+            ),
+            patch.object(
+                LastFetchedService, "update_last_fetched_transaction_type"
+            ),
+        ):
+            wallet_transaction = all_transactions_mock[0]
+            parent_txid = wallet_transaction.inputs[0].prev_txid.hex()
+            mock_wallet.list_transactions.return_value = [
+                Mock(txid=wallet_transaction.txid, confirmation_time=None)
+            ]
+            mock_wallet.list_transactions.return_value[
+                0
+            ].transaction.serialize.return_value = list(wallet_transaction.rawtx)
+            mock_electrum_raw_batch_request.return_value = {}
+            wallet_model_patch.get_current_wallet.return_value = Mock(
+                electrum_url="blockstream:1234"
             )
+            self.wallet_service.wallet = mock_wallet
+
+            asyncio.run(self.wallet_service.get_all_transactions())
 
-            mock_electrum_request.assert_any_call(
+            mock_electrum_raw_batch_request.assert_called_once_with(
                 "blockstream",
                 1234,
-                ElectrumMethod.GET_TRANSACTIONS,
-                GetTransactionsRequestParams("txid2", False),
-                1,
+                [GetTransactionsRequestParams(parent_txid, False)],
+            )
+            # the wallet transaction was enriched, so its outputs are synced
+            enriched_transactions = (
+                mock_update_outputs_from_transactions.call_args.args[0]
+            )
+            assert [transaction.txid for transaction, _ in enriched_transactions] == [
+                wallet_transaction.txid
+            ]
+
+    def test_get_all_transactions_only_enriches_new_and_changed_transactions(self):
+        with (
+            patch("src.services.wallet.wallet.Wallet") as wallet_model_patch,
+            patch.object(WalletService, "wallet") as mock_wallet,
+            patch.object(
+                WalletService,
+                "get_synced_transaction_heights",
+                return_value={
+                    "unchanged_txid": 100,
+                    "confirmed_txid": None,
+                    "replaced_txid": None,
+                },
+            ),
+            patch.object(
+                TransactionEnrichmentPipeline, "run", return_value={}
+            ) as mock_run,
+            patch.object(
+                WalletService, "update_outputs_from_transactions"
+            ) as mock_update_outputs_from_transactions,
+            patch.object(
+                LastFetchedService, "update_last_fetched_transaction_type"
+            ),
+        ):
+            unchanged_transaction = Mock(
+                txid="unchanged_txid", confirmation_time=Mock(height=100)
+            )
+            confirmed_transaction = Mock(
+                txid="confirmed_txid", confirmation_time=Mock(height=101)
+            )
+            new_transaction = Mock(txid="new_txid", confirmation_time=None)
+            mock_wallet.list_transactions.return_value = [
+                unchanged_transaction,
+                confirmed_transaction,
+                new_transaction,
+            ]
+            wallet_model_patch.get_current_wallet.return_value = Mock(
+                electrum_url="blockstream:1234"
+            )
+            self.wallet_service.wallet = mock_wallet
+
+            asyncio.run(self.wallet_service.get_all_transactions())
+
+            mock_run.assert_called_once_with(
+                [confirmed_transaction, new_transaction]
+            )
+            mock_update_outputs_from_transactions.assert_called_once_with(
+                [], {"replaced_txid"}
+            )
+
+    def test_update_input_values_from_db_queries_every_prevout_at_once(self):
+        transaction = copy.deepcopy(all_transactions_mock[0])
+        input_dict = transaction.inputs[0].as_dict()
+        prevout = (input_dict["prev_txid"], input_dict["output_n"])
+        with patch.object(
+            WalletService,
+            "get_all_inputs_from_db",
+            return_value={prevout: Mock(value=1000, is_mine=True)},
+        ) as mock_get_all_inputs_from_db:
+            inputs_that_need_to_be_fetched = (
+                self.wallet_service.update_input_values_from_db(
+                    {"txid1": transaction,
+                        "txid2": copy.deepcopy(all_transactions_mock[0])}
+                )
+            )
+
+            mock_get_all_inputs_from_db.assert_called_once_with([prevout, prevout])
+            assert transaction.inputs[0].value == 1000
+            assert transaction.inputs[0].sort is True
+            assert inputs_that_need_to_be_fetched == {}
+
+    def test_update_input_values_from_db_returns_inputs_missing_from_db(self):
+        transaction = copy.deepcopy(all_transactions_mock[0])
+        with patch.object(
+            WalletService, "get_all_inputs_from_db", return_value={}
+        ):
+            inputs_that_need_to_be_fetched = (
+                self.wallet_service.update_input_values_from_db(
+                    {"txid1": transaction})
             )
 
-            assert get_all_transactions_response == all_transactions_from_electrum
+            assert list(inputs_that_need_to_be_fetched.keys()) == ["txid1"]
+            assert [
+                input for _, input in inputs_that_need_to_be_fetched["txid1"]
+            ] == transaction.inputs
 
     async def test_get_all_transactions_without_url(self):
         with (
             patch("src.services.wallet.wallet.Wallet") as wallet_model_patch,
             patch(
-                "src.services.wallet.wallet.electrum_request"
+                "src.services.wallet.wallet.electrum_raw_batch_request"
             ) as mock_electrum_request,
         ):
             mock_wallet = MagicMock()
@@ -988,7 +1581,7 @@ class TestWalletService(TestCase):
         with (
             patch("src.services.wallet.wallet.Wallet") as wallet_model_patch,
             patch(
-                "src.services.wallet.wallet.electrum_request"
+                "src.services.wallet.wallet.electrum_raw_batch_request"
             ) as mock_electrum_request,
         ):
             mock_wallet = MagicMock()
@@ -1009,123 +1602,206 @@ class TestWalletService(TestCase):
             assert mock_electrum_request.call_count == 0
             assert get_all_transactions_response == []
 
-    def test_get_all_outputs(self):
+    def test_get_all_outputs_is_served_from_the_wallet_history_snapshot(self):
+        output_mock = Mock()
+        with patch.object(
+            WalletService,
+            "get_wallet_history_snapshot",
+            return_value=WalletHistorySnapshot(
+                version=1, fingerprint=frozenset(), transactions=(), outputs=(output_mock,)
+            ),
+        ):
+            assert self.wallet_service.get_all_outputs() == [output_mock]
+
+    def test_get_all_transaction_details_is_served_from_the_wallet_history_snapshot(
+        self,
+    ):
+        transaction_details_mock = Mock()
+        with patch.object(
+            WalletService,
+            "get_wallet_history_snapshot",
+            return_value=WalletHistorySnapshot(
+                version=1,
+                fingerprint=frozenset(),
+                transactions=(transaction_details_mock,),
+                outputs=(),
+            ),
+        ):
+            assert self.wallet_service.get_all_transaction_details() == [
+                transaction_details_mock
+            ]
+
+    def test_wallet_history_snapshot_is_reused_for_a_synced_history(self):
+        with (
+            patch.object(WalletService, "wallet") as mock_wallet,
+            patch(
+                "src.services.wallet.wallet.get_wallet_history",
+                return_value=WalletHistory(),
+            ),
+            patch.object(
+                WalletService, "get_all_transactions"
+            ) as mock_get_all_transactions,
+            patch.object(
+                WalletService, "get_all_transaction_details_from_db", return_value=[]
+            ) as mock_get_all_transaction_details_from_db,
+            patch.object(WalletService, "get_all_outputs_from_db", return_value=[]),
+            patch.object(
+                WalletService,
+                "get_synced_transaction_heights",
+                return_value={"txid1": 100},
+            ),
+        ):
+            mock_wallet.list_transactions.return_value = [
+                Mock(txid="txid1", confirmation_time=Mock(height=100))
+            ]
+
+            first_snapshot = self.wallet_service.get_wallet_history_snapshot()
+            second_snapshot = self.wallet_service.get_wallet_history_snapshot()
+
+            mock_wallet.list_transactions.assert_called_with(False)
+            # the db is already synced with the wallet's transactions
+            mock_get_all_transactions.assert_not_called()
+            # and the snapshot is only built once
+            mock_get_all_transaction_details_from_db.assert_called_once()
+            assert second_snapshot is first_snapshot
+            assert first_snapshot.fingerprint == frozenset([("txid1", 100)])
+
+    def test_wallet_history_snapshot_syncs_a_changed_history(self):
         with (
             patch.object(WalletService, "wallet") as mock_wallet,
+            patch(
+                "src.services.wallet.wallet.get_wallet_history",
+                return_value=WalletHistory(),
+            ),
             patch.object(
                 WalletService, "get_all_transactions"
             ) as mock_get_all_transactions,
+            patch.object(
+                WalletService, "get_all_transaction_details_from_db", return_value=[]
+            ),
+            patch.object(WalletService, "get_all_outputs_from_db", return_value=[]),
+            patch.object(
+                WalletService,
+                "get_synced_transaction_heights",
+                return_value={"txid1": None},
+            ),
+        ):
+            # txid1 has been confirmed since the last sync
+            mock_wallet.list_transactions.return_value = [
+                Mock(txid="txid1", confirmation_time=Mock(height=100))
+            ]
+
+            self.wallet_service.get_wallet_history_snapshot()
+
+            mock_get_all_transactions.assert_called_once()
+
+    def test_update_outputs_from_transactions(self):
+        with (
+            patch.object(WalletService, "wallet") as mock_wallet,
             patch.object(
                 WalletService, "calculate_output_annominity_sets"
             ) as mock_calculate_output_annominity_sets,
             patch.object(
-                WalletService, "sync_local_db_with_incoming_output"
-            ) as mock_sync_local_db_with_incoming_output,
+                WalletService, "sync_local_db_with_incoming_outputs"
+            ) as mock_sync_local_db_with_incoming_outputs,
             patch.object(
                 LastFetchedService, "update_last_fetched_outputs_type"
             ) as mock_update_last_fetched_outputs_type,
-            patch.object(
-                WalletService, "add_spend_tx_to_output"
-            ) as mock_add_spend_tx_to_output,
-            patch.object(
-                WalletService, "get_output_from_db"
-            ) as mock_get_output_from_db,
         ):
             mock_wallet.is_mine = Mock()
             # mark first output as mine and the second as not
             annominity_set_count_mock = 2
             mock_wallet.is_mine.side_effect = [True, False]
-            mock_get_all_transactions.return_value = all_transactions_with_details_mock
             mock_annominity_sets = {
                 all_transactions_mock[0].outputs[0].value: annominity_set_count_mock,
                 all_transactions_mock[0].outputs[1].value: annominity_set_count_mock,
             }
             mock_calculate_output_annominity_sets.return_value = mock_annominity_sets
-            mock_db_output_1 = Mock()
-            mock_db_output_1.id = 1
-            mock_db_output_1.txid = all_transactions_mock[0].txid
-            mock_db_output_1.vout = all_transactions_mock[0].outputs[0].output_n
-            mock_db_output_1.labels = []
-
-            # This db output is ignored because of the is_mine call therefore we don't
-            # need to bother mocking all the values
-            mock_db_output_2 = Mock()
-
-            mock_db_output_synced = [mock_db_output_1, mock_db_output_2]
-            mock_sync_local_db_with_incoming_output.side_effect = mock_db_output_synced
 
             # call the method we are testing
-            get_all_outputs_response = self.wallet_service.get_all_outputs()
+            self.wallet_service.update_outputs_from_transactions(
+                all_transactions_with_details_mock
+            )
 
-            mock_get_all_transactions.assert_called()
             mock_calculate_output_annominity_sets.assert_called()
-            mock_sync_local_db_with_incoming_output.assert_called()
-            mock_update_last_fetched_outputs_type.assert_called()
-            mock_add_spend_tx_to_output.assert_called()
-            mock_get_output_from_db.assert_called()
-
-            # the returned outputs should only be the first one since we mocked out that the second output would return False when checking if it is mine
-
+            # every output and spend is synced with the db at once,
+            # only the first output is synced since we mocked out that
+            # the second output would return False when checking if it is mine
+            output = all_transactions_mock[0].outputs[0]
+            input_dict = all_transactions_mock[0].inputs[0].as_dict()
+            mock_sync_local_db_with_incoming_outputs.assert_called_once_with(
+                [
+                    {
+                        "txid": all_transactions_mock[0].txid,
+                        "vout": output.output_n,
+                        "address": output.address,
+                        "value": output.value,
+                        "script": output.lock_script.hex(),
+                        "script_type": output.script_type,
+                        "public_key": output.public_key.hex(),
+                        "public_hash": output.public_hash.hex(),
+                        "annominity_set": annominity_set_count_mock,
+                        # the wallet sent and received in the transaction
+                        "is_simple_change": True,
+                    }
+                ],
+                {
+                    (input_dict["prev_txid"], input_dict["output_n"]): (
+                        all_transactions_mock[0].txid,
+                        input_dict["index_n"],
+                    )
+                },
+                remove_stale_outputs=False,
+                removed_txids=None,
+            )
+            mock_update_last_fetched_outputs_type.assert_called_once()
             assert mock_wallet.is_mine.call_count == 2
-            assert len(get_all_outputs_response) == 1
 
-            assert get_all_outputs_response[0].annominity_set == 2
-            assert get_all_outputs_response[0].txid == all_transactions_mock[0].txid
-            assert get_all_outputs_response[0].labels == []
-
-    def test_get_all_outputs_if_none_are_mine(self):
+    def test_update_outputs_from_transactions_if_none_are_mine(self):
         with (
             patch.object(WalletService, "wallet") as mock_wallet,
             patch.object(
-                WalletService, "get_all_transactions"
-            ) as mock_get_all_transactions,
-            patch.object(
-                WalletService, "calculate_output_annominity_sets"
-            ) as mock_calculate_output_annominity_sets,
-            patch.object(
-                WalletService, "sync_local_db_with_incoming_output"
-            ) as mock_sync_local_db_with_incoming_output,
+                WalletService, "sync_local_db_with_incoming_outputs", return_value={}
+            ) as mock_sync_local_db_with_incoming_outputs,
             patch.object(
                 LastFetchedService, "update_last_fetched_outputs_type"
             ) as mock_update_last_fetched_outputs_type,
-            patch.object(
-                WalletService, "add_spend_tx_to_output"
-            ) as mock_add_spend_tx_to_output,
-            patch.object(
-                WalletService, "get_output_from_db", return_value=None
-            ) as mock_get_output_from_db,
         ):
-            mock_wallet.is_mine = Mock(return_value=False)
             # mark No outputs as mine
-            annominity_set_count_mock = 2
-            mock_get_all_transactions.return_value = all_transactions_with_details_mock
-
-            mock_annominity_sets = {
-                all_transactions_mock[0].outputs[0].value: annominity_set_count_mock,
-                all_transactions_mock[0].outputs[1].value: annominity_set_count_mock,
-            }
-            mock_calculate_output_annominity_sets.return_value = mock_annominity_sets
-
-            # These db outputs are ignored because of the is_mine call therefore we don't
-            # need to bother mocking all the values
-            mock_db_output_1 = Mock()
-            mock_db_output_2 = Mock()
-
-            mock_db_output_synced = [mock_db_output_1, mock_db_output_2]
-            mock_sync_local_db_with_incoming_output.side_effect = mock_db_output_synced
+            mock_wallet.is_mine = Mock(return_value=False)
 
             # call the method we are testing
-            get_all_outputs_response = self.wallet_service.get_all_outputs()
+            self.wallet_service.update_outputs_from_transactions(
+                all_transactions_with_details_mock
+            )
 
-            mock_get_all_transactions.assert_called()
-            mock_calculate_output_annominity_sets.assert_called()
-            mock_sync_local_db_with_incoming_output.assert_not_called()
+            # no new outputs are added but the spends are still synced
+            assert mock_sync_local_db_with_incoming_outputs.call_args.args[0] == []
             mock_update_last_fetched_outputs_type.assert_not_called()
-            mock_get_output_from_db.assert_called()
-            mock_add_spend_tx_to_output.assert_not_called()
-
             assert mock_wallet.is_mine.call_count == 2
-            assert get_all_outputs_response == []
+
+    def test_update_outputs_from_transactions_removes_the_removed_transactions(self):
+        with (
+            patch.object(WalletService, "wallet") as mock_wallet,
+            patch.object(
+                WalletService, "sync_local_db_with_incoming_outputs", return_value={}
+            ) as mock_sync_local_db_with_incoming_outputs,
+            patch.object(
+                WalletService, "remove_transactions_from_db"
+            ) as mock_remove_transactions_from_db,
+            patch.object(LastFetchedService, "update_last_fetched_outputs_type"),
+        ):
+            mock_wallet.is_mine = Mock(return_value=True)
+
+            self.wallet_service.update_outputs_from_transactions(
+                all_transactions_with_details_mock, {"replaced_txid"}
+            )
+
+            assert mock_sync_local_db_with_incoming_outputs.call_args.kwargs == {
+                "remove_stale_outputs": False,
+                "removed_txids": {"replaced_txid"},
+            }
+            mock_remove_transactions_from_db.assert_called_once_with({"replaced_txid"})
 
     def test_calculate_output_annominity_sets(self):
         first_output_value = tx_mock.outputs[0].value
@@ -1242,25 +1918,32 @@ class TestWalletService(TestCase):
                 response["txid_one-0-mockaddress1"][1], OutputLabelDto)
 
     def test_populate_outputs_and_labels(self):
+        mock_label_one = dict(
+            label="label_one",
+            display_name="display_one",
+            description="description_one",
+        )
+        mock_label_two = dict(
+            label="label_two",
+            display_name="display_two",
+            description="description_two",
+        )
+        label_one = Mock(display_name="display_one")
+        label_two = Mock(display_name="display_two")
+        db_outputs = {
+            ("txidone", 0): Mock(labels=[]),
+            ("txidone", 1): Mock(labels=[label_one]),
+            ("txidtwo", 0): Mock(labels=[]),
+        }
         with (
             patch.object(
-                WalletService, "add_label_to_output"
-            ) as mock_add_label_to_output,
-            patch.object(
-                WalletService, "sync_local_db_with_incoming_output"
-            ) as mock_sync_local_db_with_incoming_output,
+                WalletService,
+                "sync_local_db_with_incoming_outputs",
+                return_value=db_outputs,
+            ) as mock_sync_local_db_with_incoming_outputs,
+            patch("src.services.wallet.wallet.Label") as mock_label_model,
         ):
-            mock_label_one = dict(
-                label="label_one",
-                display_name="display_one",
-                description="description_one",
-            )
-
-            mock_label_two = dict(
-                label="label_two",
-                display_name="display_two",
-                description="description_two",
-            )
+            mock_label_model.query.all.return_value = [label_one, label_two]
 
             output_labels_in_populate_format = (
                 PopulateOutputLabelsRequestDto.model_validate(
@@ -1271,8 +1954,6 @@ class TestWalletService(TestCase):
                     }
                 )
             )
-            mock_add_label_to_output.return_value = None
-            # self.wallet_service.add_label_to_output = mock_add_label_to_output
 
             # call the method we are testing
             populate_outputs_and_labels_response = (
@@ -1281,29 +1962,20 @@ class TestWalletService(TestCase):
                 )
             )
 
-            # called once for each output
-            assert mock_sync_local_db_with_incoming_output.call_count == 3
-            mock_sync_local_db_with_incoming_output.assert_any_call(
-                "txidone", 0, "mockaddress1"
-            )
-            mock_sync_local_db_with_incoming_output.assert_any_call(
-                "txidone", 1, "mockaddress2"
-            )
-
-            mock_sync_local_db_with_incoming_output.assert_any_call(
-                "txidtwo", 0, "mockaddress3"
-            )
-
-            mock_add_label_to_output.assert_any_call(
-                "txidone", 0, mock_label_one["display_name"]
-            )
-
-            mock_add_label_to_output.assert_any_call(
-                "txidone", 1, mock_label_two["display_name"]
-            )
-            mock_add_label_to_output.assert_any_call(
-                "txidtwo", 0, mock_label_one["display_name"]
-            )
+            # every output is synced at once
+            mock_sync_local_db_with_incoming_outputs.assert_called_once_with(
+                [
+                    {"txid": "txidone", "vout": 0, "address": "mockaddress1"},
+                    {"txid": "txidone", "vout": 1, "address": "mockaddress2"},
+                    {"txid": "txidtwo", "vout": 0, "address": "mockaddress3"},
+                ],
+                {},
+                remove_stale_outputs=False,
+            )
+            assert db_outputs[("txidone", 0)].labels == [label_one, label_two]
+            # the output already had the first label
+            assert db_outputs[("txidone", 1)].labels == [label_one, label_two]
+            assert db_outputs[("txidtwo", 0)].labels == [label_one]
 
             assert populate_outputs_and_labels_response == None
 
@@ -1336,45 +2008,6 @@ class TestWalletService(TestCase):
         )
         assert response[0] == mock_all_utxos_one
 
-    def test_sync_local_db_with_incoming_output_for_new_output(self):
-        with (
-            patch("src.services.wallet.wallet.OutputModel") as mock_output_model,
-            patch.object(WalletService, "add_output_to_db") as mock_add_output_to_db,
-        ):
-            mock_new_output_model = Mock()
-            mock_new_last_fetched_model = Mock()
-            # return None, as if we did not find this OutputModel in the db
-            mock_output_model.query.filter_by.return_value.first.return_value = None
-            mock_add_output_to_db.return_value = mock_new_output_model
-            mock_new_last_fetched_model = Mock(
-                return_value=mock_new_last_fetched_model)
-            response = self.wallet_service.sync_local_db_with_incoming_output(
-                "txid", 0, "mock_address", 10
-            )
-            mock_add_output_to_db.assert_called_with(
-                txid="txid", vout=0, address="mock_address", value=10
-            )
-            assert response == mock_new_output_model
-
-    def test_sync_local_db_with_incoming_output_for_existing_output(self):
-        with (
-            patch("src.services.wallet.wallet.OutputModel") as mock_output_model,
-            patch.object(WalletService, "add_output_to_db") as mock_add_output_to_db,
-        ):
-            mock_existing_output_model = Mock()
-            # return None, as if we did not find this OutputModel in the db
-            mock_output_model.query.filter_by.return_value.first.return_value = (
-                mock_existing_output_model
-            )
-            mock_add_output_to_db = Mock()
-
-            response = self.wallet_service.sync_local_db_with_incoming_output(
-                "txid", 0, "mock_address"
-            )
-            # since the output already exists in the db we should not call add_output_to_db
-            mock_add_output_to_db.assert_not_called()
-            assert response == mock_existing_output_model
-
     def test_is_address_reused_False(self):
         with patch("src.services.wallet.wallet.OutputModel") as mock_outputmodel_query:
             mock_outputmodel_query.query.filter_by.return_value.all.return_value = [
@@ -1397,6 +2030,10 @@ class TestWalletService(TestCase):
     async def test_get_transaction(self):
         with (
             patch("src.services.wallet.wallet.Wallet") as wallet_model_patch,
+            patch(
+                "src.services.wallet.wallet.get_raw_transaction_cache",
+                return_value=RawTransactionCache(":memory:"),
+            ),
             patch(
                 "src.services.wallet.wallet.electrum_request"
             ) as mock_electrum_request,
@@ -1413,20 +2050,82 @@ class TestWalletService(TestCase):
                 1234,
                 ElectrumMethod.GET_TRANSACTIONS,
                 GetTransactionsRequestParams("mock_txid", False),
-                1,
             )
 
             assert response == all_transactions_mock[0]
 
+    def test_get_decoded_transaction_caches_the_wallets_confirmed_transactions(self):
+        self.bdk_wallet_mock.list_transactions.return_value = [
+            Mock(txid="confirmed_txid", confirmation_time=Mock(height=100)),
+            Mock(txid="unconfirmed_txid", confirmation_time=None),
+        ]
+        WalletService.wallet = self.bdk_wallet_mock
+        with (
+            patch.object(
+                WalletService, "get_decoded_transaction_from_db", return_value=None
+            ),
+            patch.object(
+                WalletService, "get_transaction", return_value=all_transactions_mock[0]
+            ) as mock_get_transaction,
+        ):
+            for txid in ["confirmed_txid", "unconfirmed_txid", "foreign_txid"]:
+                assert (
+                    WalletService.get_decoded_transaction(txid)
+                    == all_transactions_mock[0]
+                )
+
+            assert mock_get_transaction.call_args_list == [
+                call("confirmed_txid", True),
+                call("unconfirmed_txid", False),
+                call("foreign_txid", False),
+            ]
+
+    def test_get_transactions_only_fetches_transactions_missing_from_the_cache(self):
+        raw_transaction_cache = RawTransactionCache(":memory:")
+        cached_transaction = all_transactions_mock[0]
+        raw_transaction_cache.put(
+            "cached_txid", cached_transaction.rawtx, is_confirmed=True
+        )
+        with (
+            patch("src.services.wallet.wallet.Wallet") as wallet_model_patch,
+            patch(
+                "src.services.wallet.wallet.get_raw_transaction_cache",
+                return_value=raw_transaction_cache,
+            ),
+            patch(
+                "src.services.wallet.wallet.electrum_raw_batch_request"
+            ) as mock_electrum_raw_batch_request,
+        ):
+            wallet_model_patch.get_current_wallet.return_value = Mock(
+                electrum_url="blockstream:1234"
+            )
+            mock_electrum_raw_batch_request.return_value = {
+                "missing_txid": all_transactions_mock[0].rawtx
+            }
+
+            response = asyncio.run(
+                self.wallet_service.get_transactions(
+                    ["cached_txid", "missing_txid"], {"missing_txid"}
+                )
+            )
+
+            mock_electrum_raw_batch_request.assert_called_once_with(
+                "blockstream",
+                1234,
+                [GetTransactionsRequestParams("missing_txid", False)],
+            )
+            assert response["cached_txid"].txid == cached_transaction.txid
+            assert response["missing_txid"].txid == all_transactions_mock[0].txid
+            # the fetched transaction is now cached
+            assert raw_transaction_cache.get("missing_txid") == (
+                all_transactions_mock[0].rawtx
+            )
 
 # TODO do database testing for
 # get_all_unspent_outputs_from_db_before_blockheight
 # get_transaction_inputs_from_db
 # get_transaction_outputs_from_db
 # get_output_from_db
-# add_output_to_db
-# add_spend_tx_to_output
 # get_all_change_outputs_from_db
-# add_transaction_to_db
 # get_transaction_details
 # remove_output_and_related_label_data
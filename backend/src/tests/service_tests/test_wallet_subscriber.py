@@ -0,0 +1,114 @@
+import asyncio
+import queue
+import threading
+from unittest.case import TestCase
+
+from src.services.wallet.wallet_subscriber import WalletSubscriber
+from src.tests.api_tests.mock_electrum_server import MockElectrumServer
+
+
+class TestWalletSubscriber(TestCase):
+    def setUp(self):
+        self.tip_height = 100
+        self.statuses = {"scripthash_a": "status_a", "scripthash_b": None}
+
+        def respond(method, params):
+            if method == "blockchain.headers.subscribe":
+                return {"height": self.tip_height, "hex": "00"}
+            if method == "blockchain.scripthash.subscribe":
+                return self.statuses[params[0]]
+            raise Exception(f"unexpected method {method}")
+
+        # the subscriber runs its own event loop in a thread,
+        # therefore the server needs to run in a loop of its own as well.
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+        self.server = self.run_in_server_loop(MockElectrumServer(respond).start())
+
+        self.changes = queue.Queue()
+        self.subscriber = WalletSubscriber(debounce_seconds=0.01)
+
+    def tearDown(self):
+        self.subscriber.clear()
+        self.run_in_server_loop(self.server.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(5)
+
+    def run_in_server_loop(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(5)
+
+    def subscribe(self, statuses):
+        self.subscriber.subscribe(
+            "127.0.0.1", self.server.port, statuses, self.changes.put
+        )
+
+    def wait_for_subscriptions(self, count):
+        for _ in range(500):
+            subscriptions = [
+                request
+                for message in self.server.received_messages
+                for request in (message if isinstance(message, list) else [message])
+                if request["method"] == "blockchain.scripthash.subscribe"
+            ]
+            if len(subscriptions) >= count:
+                return subscriptions
+            threading.Event().wait(0.01)
+        raise AssertionError("the scripts were not subscribed to")
+
+    def test_unchanged_scripts_do_not_notify(self):
+        self.subscribe(dict(self.statuses))
+
+        subscriptions = self.wait_for_subscriptions(2)
+
+        assert sorted(request["params"][0] for request in subscriptions) == [
+            "scripthash_a",
+            "scripthash_b",
+        ]
+        assert self.subscriber.tip_height == 100
+        with self.assertRaises(queue.Empty):
+            self.changes.get(timeout=0.1)
+
+    def test_script_that_changed_since_its_scan_notifies(self):
+        self.subscribe({"scripthash_a": "old_status_a", "scripthash_b": None})
+
+        assert self.changes.get(timeout=5) is None
+
+    def test_script_notification_with_a_new_status_notifies(self):
+        self.subscribe(dict(self.statuses))
+        self.wait_for_subscriptions(2)
+
+        self.run_in_server_loop(
+            self.server.notify(
+                "blockchain.scripthash.subscribe", ["scripthash_b", "status_b"]
+            )
+        )
+
+        assert self.changes.get(timeout=5) is None
+
+    def test_new_block_notifies_with_its_height(self):
+        self.subscribe(dict(self.statuses))
+        self.wait_for_subscriptions(2)
+
+        self.run_in_server_loop(
+            self.server.notify(
+                "blockchain.headers.subscribe", [{"height": 101, "hex": "00"}]
+            )
+        )
+
+        assert self.changes.get(timeout=5) == 101
+        assert self.subscriber.tip_height == 101
+
+    def test_cleared_subscriber_does_not_notify(self):
+        self.subscribe(dict(self.statuses))
+        self.wait_for_subscriptions(2)
+        self.subscriber.clear()
+
+        self.run_in_server_loop(
+            self.server.notify(
+                "blockchain.headers.subscribe", [{"height": 101, "hex": "00"}]
+            )
+        )
+
+        with self.assertRaises(queue.Empty):
+            self.changes.get(timeout=0.1)
@@ -0,0 +1,133 @@
+import threading
+from unittest.case import TestCase
+from unittest.mock import MagicMock
+
+from src.services.wallet.wallet_sync import WalletSyncWorker
+
+
+def create_open_wallet_mock(sync_started=None, release_sync=None, progress=None):
+    wallet = MagicMock()
+    blockchain = MagicMock()
+
+    def sync(sync_blockchain, sync_progress):
+        if progress is not None:
+            sync_progress.update(progress, "mock progress")
+        if sync_started is not None:
+            sync_started.set()
+        if release_sync is not None:
+            release_sync.wait(5)
+
+    wallet.sync.side_effect = sync
+    return MagicMock(return_value=(wallet, blockchain)), wallet, blockchain
+
+
+class TestWalletSyncWorker(TestCase):
+    def setUp(self):
+        self.worker = WalletSyncWorker(sync_interval_seconds=60)
+
+    def tearDown(self):
+        self.worker.clear_wallet()
+
+    def test_synced_wallet_is_published(self):
+        open_wallet, wallet, blockchain = create_open_wallet_mock(progress=50.0)
+        on_synced = MagicMock()
+
+        job = self.worker.set_wallet("wallet_id", open_wallet, on_synced)
+        finished_job = self.worker.wait(job.id, timeout=5)
+
+        assert finished_job.id == job.id
+        assert finished_job.state == "succeeded"
+        assert finished_job.progress == 100.0
+        assert finished_job.message == "mock progress"
+        on_synced.assert_called_once_with("wallet_id", wallet, blockchain)
+        assert self.worker.last_synced_at is not None
+        assert self.worker.get_job() == finished_job
+
+    def test_running_sync_reports_its_progress_before_publishing(self):
+        sync_started = threading.Event()
+        release_sync = threading.Event()
+        open_wallet, _, _ = create_open_wallet_mock(
+            sync_started, release_sync, progress=25.0
+        )
+        on_synced = MagicMock()
+
+        job = self.worker.set_wallet("wallet_id", open_wallet, on_synced)
+        assert sync_started.wait(5)
+
+        running_job = self.worker.get_job()
+        assert running_job.id == job.id
+        assert running_job.state == "running"
+        assert running_job.progress == 25.0
+        # the previously published wallet keeps being served until the sync is done
+        on_synced.assert_not_called()
+
+        release_sync.set()
+        assert self.worker.wait(job.id, timeout=5).state == "succeeded"
+        on_synced.assert_called_once()
+
+    def test_requests_while_a_sync_is_queued_share_the_job(self):
+        sync_started = threading.Event()
+        release_sync = threading.Event()
+        open_wallet, _, _ = create_open_wallet_mock(sync_started, release_sync)
+
+        first_job = self.worker.set_wallet("wallet_id", open_wallet, MagicMock())
+        assert sync_started.wait(5)
+
+        queued_job = self.worker.request_sync()
+        assert queued_job.id != first_job.id
+        assert self.worker.request_sync() == queued_job
+        # connecting the same wallet again does not queue another sync
+        assert self.worker.set_wallet("wallet_id", open_wallet, MagicMock()) == (
+            self.worker.get_job()
+        )
+
+        release_sync.set()
+        assert self.worker.wait(queued_job.id, timeout=5).id == queued_job.id
+        assert open_wallet.call_count == 2
+
+    def test_sync_is_skipped_if_the_wallet_is_up_to_date(self):
+        on_synced = MagicMock()
+
+        job = self.worker.set_wallet("wallet_id", MagicMock(return_value=None), on_synced)
+        finished_job = self.worker.wait(job.id, timeout=5)
+
+        assert finished_job.state == "succeeded"
+        assert finished_job.message == "The wallet has not changed since the last sync"
+        on_synced.assert_not_called()
+        assert self.worker.last_synced_at is not None
+
+    def test_failed_sync_is_not_published(self):
+        open_wallet = MagicMock(side_effect=ConnectionError("mock connection error"))
+        on_synced = MagicMock()
+
+        job = self.worker.set_wallet("wallet_id", open_wallet, on_synced)
+        finished_job = self.worker.wait(job.id, timeout=5)
+
+        assert finished_job.state == "failed"
+        assert finished_job.error == "mock connection error"
+        on_synced.assert_not_called()
+        assert self.worker.last_synced_at is None
+
+    def test_sync_of_a_previous_wallet_is_not_published(self):
+        sync_started = threading.Event()
+        release_sync = threading.Event()
+        open_wallet, _, _ = create_open_wallet_mock(sync_started, release_sync)
+        on_synced = MagicMock()
+
+        job = self.worker.set_wallet("wallet_id", open_wallet, on_synced)
+        assert sync_started.wait(5)
+        self.worker.clear_wallet()
+        release_sync.set()
+
+        assert self.worker.wait(job.id, timeout=5).state == "failed"
+        on_synced.assert_not_called()
+        assert self.worker.request_sync() is None
+
+    def test_wallet_is_synced_on_a_schedule(self):
+        self.worker.sync_interval_seconds = 0.01
+        open_wallet, _, _ = create_open_wallet_mock()
+
+        job = self.worker.set_wallet("wallet_id", open_wallet, MagicMock())
+
+        assert self.worker.wait(job.id + 2, timeout=5) is not None
+        assert open_wallet.call_count >= 3
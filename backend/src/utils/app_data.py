@@ -0,0 +1,18 @@
+from os import environ, makedirs, path
+
+# set LIVE_WALLET_DATA_DIR to store the app's persistent files somewhere else,
+# for example a temporary directory while testing.
+DATA_DIR_ENV_VARIABLE = "LIVE_WALLET_DATA_DIR"
+DEFAULT_DATA_DIR = path.join(path.expanduser("~"), ".live_wallet")
+
+
+def get_app_data_dir() -> str:
+    """Get the directory for files that should survive an app restart,
+    creating it if it does not exist yet."""
+    data_dir = environ.get(DATA_DIR_ENV_VARIABLE, DEFAULT_DATA_DIR)
+    makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+
+def is_testing_environment() -> bool:
+    return environ.get("ENVIRONMENT") == "TESTING"
@@ -1,5 +1,9 @@
-import { useMutation, useQuery } from 'react-query';
+import { useEffect } from 'react';
+import { useMutation, useQuery, useQueryClient } from 'react-query';
 import { ApiClient } from '../api/api';
+import { configs } from '../configs';
+import { uxtoQueryKeys as utxoQueryKeys } from './utxos';
+import { uxtoQueryKeys as transactionQueryKeys } from './transactions';
 import { Network } from '../types/network';
 import { WalletTypes } from '../types/scriptTypes';
 import { CreateMockWalletResponseType } from '../api/types';
@@ -93,3 +97,35 @@ export function useDeleteCurrentWallet(
     },
   });
 }
+
+// refetch the wallet whenever the backend reports that it changed,
+// instead of polling for it.
+export function useWalletEvents() {
+  const queryClient = useQueryClient();
+
+  useEffect(() => {
+    // EventSource is not available in the test environment
+    if (typeof EventSource === 'undefined') {
+      return;
+    }
+
+    const eventSource = new EventSource(
+      `${configs.backendServerBaseUrl}/wallet/events`,
+    );
+    const refetchWallet = () => {
+      queryClient.invalidateQueries(utxoQueryKeys.getBalance);
+      queryClient.invalidateQueries(utxoQueryKeys.getUtxos);
+      queryClient.invalidateQueries(transactionQueryKeys.getTransactions);
+      queryClient.invalidateQueries(transactionQueryKeys.getOutputs);
+    };
+    const refetchFees = () => {
+      queryClient.invalidateQueries(utxoQueryKeys.getCurrentFees);
+    };
+
+    eventSource.addEventListener('wallet_synced', refetchWallet);
+    eventSource.addEventListener('new_block', refetchFees);
+    return () => {
+      eventSource.close();
+    };
+  }, [queryClient]);
+}
@@ -17,7 +17,11 @@ import {
   NumberInput,
   Collapse,
 } from '@mantine/core';
-import { useDeleteCurrentWallet, useGetWalletType } from '../hooks/wallet';
+import {
+  useDeleteCurrentWallet,
+  useGetWalletType,
+  useWalletEvents,
+} from '../hooks/wallet';
 import { useQueryClient } from 'react-query';
 import { BtcMetric, btcSatHandler } from '../types/btcSatHandler';
 import { SettingsSlideout } from '../components/SettingsSlideout';
@@ -58,6 +62,7 @@ function Home() {
   const deleteCurrentWalletMutation = useDeleteCurrentWallet();
 
   const getCurrentFeesQueryRequest = useGetCurrentFees();
+  useWalletEvents();
 
   const [currentBatchedTxData, setCurrentBatchedTxData] = useState<
     CreateTxFeeEstimationResponseType | undefined | null